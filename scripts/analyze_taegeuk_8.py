@@ -1,14 +1,13 @@
 #!/usr/bin/env python3
-import json
 import os
 from pathlib import Path
+from pose_io import load_pose_data, resolve_pose_file
 
 def main():
     # Load Taegeuk 8 pose data
     json_file = Path(__file__).parent.parent / "client/public/pose-data/taegeuk-8-full.json"
     
-    with open(json_file, 'r') as f:
-        data = json.load(f)
+    data = load_pose_data(resolve_pose_file(json_file))
 
     print('🎯 TAEGEUK 8 PAL JANG - ANALYSIS SUMMARY')
     print('=' * 50)
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Adaptive batch sizing for database writers
+
+The cost of a batch is roughly a fixed part (round trips: a few
+milliseconds on localhost, 80 ms or more each to a hosted database) plus a
+per-frame part. No single fixed batch size suits both: small batches spend
+most of their time waiting on the network to a remote server, large ones
+hold more frames in memory and make progress lumpier than they need to
+locally.
+
+AdaptiveBatchSize picks the next batch size from the measured latency of
+the previous ones. It keeps a moving average of seconds per frame, fixed
+cost included, and sizes the next batch to take target_seconds; since
+the fixed cost is spread over the batch, the size converges on the point
+where a whole batch takes that long. Each step at most doubles or halves
+the size, within [minimum, maximum], so one slow batch (a checkpoint, a
+lock wait) backs the writer off quickly without collapsing it.
+
+A writer that calls calibrate() has the server round trip measured once;
+the target is then raised, if need be, until the batch's round trips
+are at most MAX_OVERHEAD of it. That keeps the default target right for
+localhost and still efficient over a slow link, where batches simply
+grow.
+
+Every batch is recorded: frames, rows, seconds and throughput are
+available from stats() and as the "write_batch" profiler stage.
+
+Usage:
+    sizer = AdaptiveBatchSize(target_seconds=0.5)
+    while frames remain:
+        batch = take(sizer.size)
+        with sizer.measure(len(batch)) as batch_stats:
+            batch_stats.rows = write(batch)
+    print(sizer.stats())
+"""
+
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+import profiler
+
+DEFAULT_TARGET_SECONDS = 0.5
+DEFAULT_INITIAL_SIZE = 250
+DEFAULT_MIN_SIZE = 25
+# Bounds the frames held in memory per batch
+DEFAULT_MAX_SIZE = 5000
+# Weight of the newest batch in the seconds-per-frame average
+SMOOTHING = 0.5
+MAX_STEP = 2.0
+# Largest share of a batch's time that round trips may take
+MAX_OVERHEAD = 0.1
+ROUND_TRIP_SAMPLES = 3
+
+def measure_round_trip(cursor, samples=ROUND_TRIP_SAMPLES):
+    """Seconds for the quickest of a few trivial queries: the client-server round trip"""
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        cursor.execute("SELECT 1")
+        cursor.fetchall()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+class _BatchStats:
+    def __init__(self, items):
+        self.items = items
+        self.rows = items
+
+class AdaptiveBatchSize:
+    """Batch size that follows measured write latency toward target_seconds per batch"""
+
+    def __init__(self, target_seconds=DEFAULT_TARGET_SECONDS, initial=DEFAULT_INITIAL_SIZE,
+                 minimum=DEFAULT_MIN_SIZE, maximum=DEFAULT_MAX_SIZE):
+        if not 0 < minimum <= initial <= maximum:
+            raise ValueError(f"Need 0 < minimum <= initial <= maximum, got {minimum}, {initial}, {maximum}")
+        self.target_seconds = target_seconds
+        self.minimum = minimum
+        self.maximum = maximum
+        self.size = initial
+        self.seconds_per_item = None
+        self.round_trip_seconds = None
+        self.round_trips_per_batch = 0
+        self.batches = []
+
+    def calibrate(self, cursor, round_trips_per_batch):
+        """Measure the round trip to the server (once) for a writer making this many per batch"""
+        if self.round_trip_seconds is None:
+            self.round_trip_seconds = measure_round_trip(cursor)
+        self.round_trips_per_batch = round_trips_per_batch
+        return self.round_trip_seconds
+
+    @property
+    def effective_target_seconds(self):
+        """target_seconds, raised so round trips stay within MAX_OVERHEAD of a batch"""
+        overhead = (self.round_trip_seconds or 0.0) * self.round_trips_per_batch
+        return max(self.target_seconds, overhead / MAX_OVERHEAD)
+
+    def record(self, items, rows, seconds):
+        """Add one written batch and choose the next size"""
+        self.batches.append({"items": items, "rows": rows, "seconds": seconds, "size": self.size})
+        profiler.get().record("write_batch", seconds)
+        if items <= 0:
+            return self.size
+
+        per_item = max(seconds, 1e-6) / items
+        if self.seconds_per_item is None:
+            self.seconds_per_item = per_item
+        else:
+            self.seconds_per_item = SMOOTHING * per_item + (1 - SMOOTHING) * self.seconds_per_item
+
+        wanted = self.effective_target_seconds / self.seconds_per_item
+        wanted = min(max(wanted, self.size / MAX_STEP), self.size * MAX_STEP)
+        # A short final batch says little about larger ones, so never grow past twice what was written
+        if items < self.size:
+            wanted = min(wanted, max(self.size, items * MAX_STEP))
+        self.size = int(min(max(wanted, self.minimum), self.maximum))
+        return self.size
+
+    @contextmanager
+    def measure(self, items):
+        """Time the body of a with block as one batch of items; set .rows on the yielded object"""
+        batch = _BatchStats(items)
+        started = time.perf_counter()
+        yield batch
+        self.record(batch.items, batch.rows, time.perf_counter() - started)
+
+    def stats(self):
+        """Per-batch measurements and their summary"""
+        if not self.batches:
+            return {"batches": 0, "size": self.size, "target_seconds": self.effective_target_seconds,
+                    "round_trip_ms": (self.round_trip_seconds or 0.0) * 1000}
+        seconds = np.array([batch["seconds"] for batch in self.batches])
+        rows = sum(batch["rows"] for batch in self.batches)
+        total = float(seconds.sum())
+        return {
+            "batches": len(self.batches),
+            "size": self.size,
+            "target_seconds": self.effective_target_seconds,
+            "round_trip_ms": (self.round_trip_seconds or 0.0) * 1000,
+            "items": sum(batch["items"] for batch in self.batches),
+            "rows": rows,
+            "seconds": total,
+            "rows_per_second": rows / total if total else 0.0,
+            "p50_ms": float(np.percentile(seconds, 50) * 1000),
+            "p95_ms": float(np.percentile(seconds, 95) * 1000),
+            "max_ms": float(seconds.max() * 1000),
+            "history": self.batches,
+        }
+
+    def summary(self):
+        """One-line description of the batches written so far"""
+        stats = self.stats()
+        if not stats["batches"]:
+            return "no batches written"
+        return (f"{stats['batches']} batch(es), p50 {stats['p50_ms']:.0f}ms, p95 {stats['p95_ms']:.0f}ms "
+                f"(target {self.effective_target_seconds * 1000:.0f}ms, round trip "
+                f"{stats['round_trip_ms']:.1f}ms), {stats['rows_per_second']:,.0f} rows/s, "
+                f"next batch {self.size} frames")
+
+def batch_sizer(batch_frames):
+    """An AdaptiveBatchSize for batch_frames: None for the default, a sizer as is, or a fixed int"""
+    if batch_frames is None:
+        return AdaptiveBatchSize()
+    if isinstance(batch_frames, AdaptiveBatchSize):
+        return batch_frames
+    return AdaptiveBatchSize(initial=batch_frames, minimum=batch_frames, maximum=batch_frames)
@@ -1,22 +1,8 @@
 #!/usr/bin/env python3
-import psycopg2
-import os
-from pathlib import Path
-
-def get_db_connection():
-    database_url = os.environ.get('DATABASE_URL')
-    if not database_url:
-        env_file = Path(__file__).parent.parent / '.env'
-        if env_file.exists():
-            with open(env_file) as f:
-                for line in f:
-                    if line.startswith('DATABASE_URL='):
-                        database_url = line.strip().split('=', 1)[1].strip('"\'')
-                        break
-    return psycopg2.connect(database_url)
+import db
 
 def main():
-    conn = get_db_connection()
+    conn = db.connect()
     cursor = conn.cursor()
 
     # First check what columns exist in the users table
@@ -1,22 +1,10 @@
 #!/usr/bin/env python3
-import psycopg2
-import os
-from pathlib import Path
+import db
 
-def get_db_connection():
-    database_url = os.environ.get('DATABASE_URL')
-    if not database_url:
-        env_file = Path(__file__).parent.parent / '.env'
-        if env_file.exists():
-            with open(env_file) as f:
-                for line in f:
-                    if line.startswith('DATABASE_URL='):
-                        database_url = line.strip().split('=', 1)[1].strip('"\'')
-                        break
-    return psycopg2.connect(database_url)
+POSE_COUNT_SQL = "SELECT COUNT(*) FROM pose_sequences WHERE video_id = %s"
 
 def main():
-    conn = get_db_connection()
+    conn = db.connect()
     cursor = conn.cursor()
     
     # Check all videos in database
@@ -33,9 +21,7 @@ def main():
         print(f"   ID {video_id}: {name} ({category}) - {url}")
         
         # Check pose sequences count for each video
-        cursor.execute("""
-            SELECT COUNT(*) FROM pose_sequences WHERE video_id = %s
-        """, (video_id,))
+        db.execute_prepared(cursor, "pose_count", POSE_COUNT_SQL, (video_id,))
         pose_count = cursor.fetchone()[0]
         print(f"      └── {pose_count} pose sequences")
     
@@ -53,7 +39,7 @@ def main():
     taegeuk_videos = cursor.fetchall()
     for video in taegeuk_videos:
         video_id, name, url = video
-        cursor.execute("SELECT COUNT(*) FROM pose_sequences WHERE video_id = %s", (video_id,))
+        db.execute_prepared(cursor, "pose_count", POSE_COUNT_SQL, (video_id,))
         pose_count = cursor.fetchone()[0]
         print(f"   ID {video_id}: {name}")
         print(f"      └── File: {url}")
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Shared database access for the scripts
+
+Every script gets its connections here instead of reading .env and
+calling psycopg2.connect() itself:
+
+    get_database_url()   DATABASE_URL from the environment or ../.env,
+                         read once per process
+    connect()            a configured connection, retried with backoff
+                         while the server is unreachable
+    get_pool()           the process's shared pool, for scripts that
+                         touch the database many times or from threads
+    run()                call fn(conn) in a transaction on a pooled
+                         connection, retrying it on transient errors
+                         (lost connection, deadlock, serialization
+                         failure)
+    execute_prepared()   run a statement through a server-side prepared
+                         statement, parsed and planned once per connection
+    fetch_rows()         a cursor's remaining rows as tuples, whatever
+                         its cursor_factory
+    relation_bytes()     on-disk size of tables with their indexes and TOAST
+    latency_ms()         p50/p95/mean of query timings, for the benchmarks
+
+Each connection sets a server-side statement_timeout (DB_STATEMENT_TIMEOUT_MS,
+default 5 minutes; 0 disables it), so a stuck query fails instead of
+hanging a batch job. Prepared statements last as long as the session, so
+they pay off with pooled connections; set DB_PREPARED_STATEMENTS=0 when
+connecting through a transaction-pooling proxy such as PgBouncer, and
+execute_prepared() falls back to plain execute().
+
+Usage:
+    import db
+
+    def count_frames(conn, video_id):
+        with conn.cursor() as cursor:
+            db.execute_prepared(cursor, "frame_count",
+                                "SELECT COUNT(*) FROM pose_sequences WHERE video_id = %s", (video_id,))
+            return cursor.fetchone()[0]
+
+    frames = db.run(count_frames, 12)
+"""
+
+import os
+import random
+import re
+import statistics
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
+from psycopg2.pool import ThreadedConnectionPool
+
+ENV_FILE = Path(__file__).parent.parent / '.env'
+DEFAULT_STATEMENT_TIMEOUT_MS = 5 * 60 * 1000
+CONNECT_TIMEOUT_SECONDS = 10
+DEFAULT_POOL_SIZE = 4
+DEFAULT_RETRIES = 3
+# First retry waits this long, doubling (with jitter) each time
+RETRY_BACKOFF_SECONDS = 0.2
+MAX_BACKOFF_SECONDS = 5.0
+
+# Errors after which the same work can simply be tried again
+TRANSIENT_ERRORS = (
+    psycopg2.OperationalError,
+    psycopg2.InterfaceError,
+    psycopg2.errors.SerializationFailure,
+    psycopg2.errors.DeadlockDetected,
+)
+# OperationalErrors that are the query's own fault, not the connection's
+NON_TRANSIENT_ERRORS = (psycopg2.errors.QueryCanceled,)
+
+_database_url = None
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_database_url():
+    """DATABASE_URL from the environment, else from the repository's .env file"""
+    global _database_url
+    if _database_url:
+        return _database_url
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url and ENV_FILE.exists():
+        with open(ENV_FILE) as f:
+            for line in f:
+                if line.startswith('DATABASE_URL='):
+                    database_url = line.strip().split('=', 1)[1].strip('"\'')
+                    break
+    if not database_url:
+        raise ValueError("DATABASE_URL not found. Please set the environment variable or create a .env file.")
+    _database_url = database_url
+    return database_url
+
+def statement_timeout_ms():
+    return int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', DEFAULT_STATEMENT_TIMEOUT_MS))
+
+def prepared_statements_enabled():
+    return os.environ.get('DB_PREPARED_STATEMENTS', '1') not in ('0', 'false', 'no')
+
+class Connection(psycopg2.extensions.connection):
+    """psycopg2 connection that remembers which statements it has prepared"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+def is_transient(error):
+    return isinstance(error, TRANSIENT_ERRORS) and not isinstance(error, NON_TRANSIENT_ERRORS)
+
+def backoff_seconds(attempt):
+    """Sleep before retry number attempt (1-based): exponential with full jitter"""
+    return random.uniform(0, min(MAX_BACKOFF_SECONDS, RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1)))
+
+def _configure(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("SET statement_timeout = %s", (statement_timeout_ms(),))
+    conn.commit()
+    return conn
+
+def connect(retries=DEFAULT_RETRIES, **kwargs):
+    """Open a configured connection, retrying with backoff if the server cannot be reached"""
+    kwargs.setdefault('connect_timeout', CONNECT_TIMEOUT_SECONDS)
+    kwargs.setdefault('connection_factory', Connection)
+    for attempt in range(retries + 1):
+        try:
+            return _configure(psycopg2.connect(get_database_url(), **kwargs))
+        except psycopg2.OperationalError:
+            if attempt == retries:
+                raise
+            time.sleep(backoff_seconds(attempt + 1))
+
+@contextmanager
+def statement_timeout(cursor, milliseconds):
+    """Run the block with statement_timeout set to milliseconds (0 for none), then restore it.
+
+    For autocommit work such as VACUUM, where SET LOCAL has no
+    transaction to be local to.
+    """
+    cursor.execute("SELECT current_setting('statement_timeout')")
+    row = cursor.fetchone()
+    previous = row[0] if isinstance(row, tuple) else next(iter(row.values()))
+    cursor.execute("SET statement_timeout = %s", (milliseconds,))
+    try:
+        yield
+    finally:
+        # In an aborted transaction the rollback undoes the SET anyway
+        if cursor.connection.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_INERROR:
+            cursor.execute("SET statement_timeout = %s", (previous,))
+
+class Pool(ThreadedConnectionPool):
+    """Thread-safe pool whose connections are configured by connect() and checked on return"""
+
+    def __init__(self, minconn=1, maxconn=DEFAULT_POOL_SIZE, **kwargs):
+        super().__init__(minconn, maxconn, **kwargs)
+
+    def _connect(self, key=None):
+        conn = connect(**self._kwargs)
+        if key is not None:
+            self._used[key] = conn
+            self._rused[id(conn)] = key
+        else:
+            self._pool.append(conn)
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection; commit if the block succeeds, roll back if it raises"""
+        conn = self.getconn()
+        broken = False
+        try:
+            yield conn
+            conn.commit()
+        except BaseException as e:
+            broken = conn.closed or isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError))
+            if not conn.closed:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    broken = True
+            raise
+        finally:
+            self.putconn(conn, close=bool(broken or conn.closed))
+
+def get_pool(maxconn=DEFAULT_POOL_SIZE):
+    """The process's shared pool, created on first use with room for maxconn connections"""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.closed:
+            _pool = Pool(1, maxconn)
+        elif _pool.maxconn < maxconn:
+            # Grow rather than hand out a pool too small for the caller's threads
+            _pool.maxconn = maxconn
+        return _pool
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None and not _pool.closed:
+            _pool.closeall()
+        _pool = None
+
+def run(fn, *args, retries=DEFAULT_RETRIES, pool=None, **kwargs):
+    """Call fn(conn, *args, **kwargs) in a transaction on a pooled connection and return its result.
+
+    The transaction is committed when fn returns. On a transient error
+    it is rolled back and fn is called again on a fresh connection, up
+    to retries times, with exponential backoff, so fn must not have
+    effects outside the transaction.
+    """
+    pool = pool or get_pool()
+    for attempt in range(retries + 1):
+        try:
+            with pool.connection() as conn:
+                return fn(conn, *args, **kwargs)
+        except Exception as e:
+            if attempt == retries or not is_transient(e):
+                raise
+            time.sleep(backoff_seconds(attempt + 1))
+
+_PLACEHOLDER = re.compile(r'%s|%%')
+
+def _numbered_placeholders(sql):
+    """Rewrite psycopg2's %s placeholders as PREPARE's $1, $2, ..."""
+    count = 0
+    def number(match):
+        nonlocal count
+        if match.group() == '%%':
+            return '%'
+        count += 1
+        return f'${count}'
+    return _PLACEHOLDER.sub(number, sql), count
+
+def execute_prepared(cursor, name, sql, params=()):
+    """Execute sql (with %s placeholders) through a prepared statement called name.
+
+    The statement is prepared on first use on each connection and
+    executed by name afterwards, skipping parsing and planning. Falls
+    back to cursor.execute() when prepared statements are disabled or
+    the connection was not opened by this module.
+    """
+    prepared = getattr(cursor.connection, 'prepared', None)
+    if prepared is None or not prepared_statements_enabled():
+        cursor.execute(sql, params)
+        return
+    if name not in prepared:
+        numbered, count = _numbered_placeholders(sql)
+        cursor.execute(f"PREPARE {name} AS {numbered}")
+        prepared.add(name)
+    if params:
+        cursor.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+    else:
+        cursor.execute(f"EXECUTE {name}")
+
+def fetch_rows(cursor):
+    """cursor.fetchall() as tuples, for plain cursors and RealDictCursor alike"""
+    return [tuple(row.values()) if isinstance(row, dict) else row for row in cursor.fetchall()]
+
+def relation_bytes(cursor, relations):
+    """Total size of the named relations, indexes and TOAST included; missing ones count as 0"""
+    cursor.execute("SELECT COALESCE(sum(pg_total_relation_size(to_regclass(r))), 0) FROM unnest(%s::text[]) r",
+                   (list(relations),))
+    return int(fetch_rows(cursor)[0][0])
+
+def latency_ms(timings):
+    """p50, p95 and mean in milliseconds of timings given in seconds"""
+    timings = sorted(seconds * 1000 for seconds in timings)
+    return {"p50": statistics.median(timings), "p95": timings[int(0.95 * (len(timings) - 1))],
+            "mean": statistics.fmean(timings)}
@@ -5,6 +5,16 @@ Extract pose data from MP4 video using MediaPipe
 Usage:
     python extract_pose_data.py video.mp4 -o output.json
     python extract_pose_data.py video.mp4 --database
+    python extract_pose_data.py video.mp4 --database --stream
+    python extract_pose_data.py video.mp4 -o output.json --workers 4
+    python extract_pose_data.py video.mp4 -o output.ndjson
+    python extract_pose_data.py video.mp4 -o output.pose
+    python extract_pose_data.py video.mp4 -o output.posez
+    python extract_pose_data.py video.mp4 -o output.json --resume
+    python extract_pose_data.py video.mp4 -o segment.json --start 12.0s --end 18.5s
+    python extract_pose_data.py video.mp4 -o output.json --adaptive
+    python extract_pose_data.py video.mp4 -o output.json --roi --inference-size 640
+    python extract_pose_data.py video.mp4 -o output.json --profile extract.prof.json
 """
 
 import cv2
@@ -12,33 +22,102 @@ import mediapipe as mp
 import numpy as np
 import json
 import argparse
+import contextlib
+import multiprocessing
 import os
+import queue
 import sys
+import threading
+import time
 from pathlib import Path
-import psycopg2
 from psycopg2.extras import RealDictCursor
+import db
+import pose_cache
+import profiler
+from keyframe_index import load_keyframe_index, seek_to_frame
+from pose_checkpoint import (DEFAULT_CHECKPOINT_INTERVAL, ExtractionCheckpoint, checkpoint_path,
+                             video_fingerprint)
+from pose_array import KEYPOINT_NAMES, PoseArrayWriter, is_pose_array_path, iter_pose_array_frames
+from pose_ingest import DatabasePoseWriter, clear_pose_rows, copy_pose_frames, ensure_frame_hash_column
+from pose_codec import PoseCodecWriter, is_pose_codec_path
+from pose_io import NdjsonPoseWriter, is_ndjson_path, open_pose_file
+from pose_partitions import create_video_partitions
+from pose_roi import DEFAULT_INFERENCE_SIZE, DEFAULT_ROI_PADDING, RoiCropper, roi_settings
+from pose_sampling import (DEFAULT_MAX_SKIP, DEFAULT_MOTION_THRESHOLD, MotionSampler,
+                           interpolate_frames, sampling_settings)
 
 # MediaPipe pose detection setup
 mp_drawing = mp.solutions.drawing_utils
 mp_pose = mp.solutions.pose
 
-def get_database_connection():
-    """Get database connection using environment variable or default"""
-    database_url = os.environ.get('DATABASE_URL')
-    if not database_url:
-        # Check for .env file in parent directory
-        env_file = Path(__file__).parent.parent / '.env'
-        if env_file.exists():
-            with open(env_file) as f:
-                for line in f:
-                    if line.startswith('DATABASE_URL='):
-                        database_url = line.strip().split('=', 1)[1].strip('"\'')
-                        break
+# Settings that change extraction output; all of them are part of the
+# extraction cache key
+DEFAULT_SETTINGS = {
+    "min_detection_confidence": 0.5,
+    "min_tracking_confidence": 0.5,
+    "model_complexity": 1
+}
+POSE_SETTING_KEYS = ("min_detection_confidence", "min_tracking_confidence", "model_complexity")
+
+# Frames re-run before an inexact resume point so tracking and landmark
+# smoothing have recent history (see pose_checkpoint.py)
+RESUME_WARMUP_FRAMES = 30
+
+# Frames each parallel worker re-runs before its range, for the same reason
+SHARD_WARMUP_FRAMES = 30
+
+# Output formats written frame by frame through a writer instead of as one JSON document
+FILE_WRITERS = {
+    "ndjson": NdjsonPoseWriter,
+    "pose": PoseArrayWriter,
+    "posez": PoseCodecWriter
+}
+
+def resolve_settings(settings=None):
+    """Fill in defaults for any extraction settings not given"""
+    resolved = dict(DEFAULT_SETTINGS)
+    resolved.update({key: value for key, value in (settings or {}).items() if value is not None})
+    return resolved
+
+def create_pose(settings, static_image_mode=False):
+    """Create a MediaPipe Pose instance from extraction settings"""
+    return mp_pose.Pose(static_image_mode=static_image_mode,
+                        **{key: settings[key] for key in POSE_SETTING_KEYS})
+
+def parse_position(value):
+    """Parse a segment position: seconds ("12.0", "12.0s", "1:05.5") or a frame ("360f").
     
-    if not database_url:
-        raise ValueError("DATABASE_URL not found. Please set the environment variable or create a .env file.")
+    Returns ('frame', int) or ('seconds', float).
+    """
+    value = str(value).strip().lower()
+    if value.endswith('f'):
+        return 'frame', int(value[:-1])
+    if ':' in value:
+        minutes, seconds = value.split(':', 1)
+        return 'seconds', int(minutes) * 60 + float(seconds.rstrip('s'))
+    return 'seconds', float(value.rstrip('s'))
+
+def position_to_frame(position, fps):
+    """Frame number of a parsed position, on the same frame grid as a full extraction"""
+    unit, amount = position
+    if unit == 'frame':
+        return amount
+    return int(round(amount * fps))
+
+def resolve_segment(start, end, video_info):
+    """Turn --start/--end values into a (start_frame, end_frame) range, end exclusive.
     
-    return psycopg2.connect(database_url)
+    Returns None when neither is given. A missing end means the end of the video.
+    """
+    if start is None and end is None:
+        return None
+    
+    fps = video_info["fps"]
+    start_frame = position_to_frame(parse_position(start), fps) if start is not None else 0
+    end_frame = position_to_frame(parse_position(end), fps) if end is not None else None
+    if start_frame < 0 or (end_frame is not None and end_frame <= start_frame):
+        raise ValueError(f"Invalid segment: start {start}, end {end}")
+    return start_frame, end_frame
 
 def find_or_create_video_record(cursor, video_filename):
     """Find existing video record or create a new one"""
@@ -70,15 +149,39 @@ def find_or_create_video_record(cursor, video_filename):
     
     return cursor.fetchone()['id']
 
+def prepare_video_record(cursor, video_filename):
+    """Find or create the video record, ready for pose rows (columns and partitions)"""
+    video_id = find_or_create_video_record(cursor, video_filename)
+    print(f"Using video ID: {video_id}")
+    # Before create_video_partitions(), which would otherwise deadlock with another loader's new video
+    cursor.connection.commit()
+    ensure_frame_hash_column(cursor)
+    create_video_partitions(cursor, video_id)
+    return video_id
+
+def open_database_writer(video_filename, video_info):
+    """A DatabasePoseWriter replacing the video's pose rows (or its segment's) as frames arrive"""
+    conn = db.connect()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            video_id = prepare_video_record(cursor, video_filename)
+        # Committed so the writer's connection sees the record and its partitions
+        conn.commit()
+    finally:
+        conn.close()
+    segment = video_info.get('segment') or {}
+    return DatabasePoseWriter(video_id, video_info['fps'], start_frame=segment.get('start_frame'),
+                              end_frame=segment.get('end_frame'))
+
 def save_pose_data_to_database(video_filename, pose_data):
     """Save pose data to PostgreSQL database"""
     try:
-        conn = get_database_connection()
+        conn = db.connect()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
         # Find or create video record
-        video_id = find_or_create_video_record(cursor, video_filename)
-        print(f"Using video ID: {video_id}")
+        video_id = prepare_video_record(cursor, video_filename)
+        conn.commit()
         
         # Update video duration
         duration = pose_data['video_info']['duration_seconds']
@@ -88,61 +191,22 @@ def save_pose_data_to_database(video_filename, pose_data):
             WHERE id = %s
         """, (duration, video_id))
         
-        # Clear existing pose data for this video
-        cursor.execute("DELETE FROM pose_sequences WHERE video_id = %s", (video_id,))
+        # Clear existing pose data for this video (or just the extracted segment)
+        segment = pose_data['video_info'].get('segment')
+        if segment:
+            clear_pose_rows(cursor, video_id, segment['start_frame'], segment['end_frame'])
+        else:
+            clear_pose_rows(cursor, video_id)
         
-        # Insert pose sequences in batches for better performance
-        batch_size = 100
-        frames = pose_data['frames']
+        # Stream pose sequences and keypoints in with COPY
+        prof = profiler.get()
+        with prof.stage("db_copy"):
+            frame_total, keypoint_total = copy_pose_frames(cursor, video_id, pose_data['frames'],
+                                                           pose_data['video_info']['fps'])
         
-        for i in range(0, len(frames), batch_size):
-            batch = frames[i:i + batch_size]
-            
-            # Insert pose sequences
-            sequence_values = []
-            for frame in batch:
-                sequence_values.append((
-                    video_id,
-                    frame['frame_number'],
-                    frame['timestamp'],
-                    frame['pose_detected'],
-                    pose_data['video_info']['fps']
-                ))
-            
-            cursor.executemany("""
-                INSERT INTO pose_sequences (video_id, frame_number, timestamp_seconds, pose_detected, fps)
-                VALUES (%s, %s, %s, %s, %s)
-                RETURNING id
-            """, sequence_values)
-            
-            # Get the inserted sequence IDs
-            sequence_ids = [row['id'] for row in cursor.fetchall()]
-            
-            # Insert keypoints for this batch
-            keypoint_values = []
-            for frame, sequence_id in zip(batch, sequence_ids):
-                if frame['pose_detected']:
-                    for keypoint in frame['keypoints']:
-                        keypoint_values.append((
-                            sequence_id,
-                            keypoint['id'],
-                            keypoint['name'],
-                            keypoint['x'],
-                            keypoint['y'],
-                            keypoint['z'],
-                            keypoint['visibility']
-                        ))
-            
-            if keypoint_values:
-                cursor.executemany("""
-                    INSERT INTO pose_keypoints (sequence_id, keypoint_id, keypoint_name, x, y, z, visibility)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                """, keypoint_values)
-            
-            print(f"Processed batch {i//batch_size + 1}/{(len(frames) + batch_size - 1)//batch_size}")
-        
-        conn.commit()
-        print(f"Successfully saved {len(frames)} frames to database for video ID {video_id}")
+        with prof.stage("db_commit"):
+            conn.commit()
+        print(f"Successfully saved {frame_total} frames ({keypoint_total} keypoints) to database for video ID {video_id}")
         
     except Exception as e:
         print(f"Database error: {e}")
@@ -152,13 +216,244 @@ def save_pose_data_to_database(video_filename, pose_data):
         if 'conn' in locals():
             conn.close()
 
-def extract_pose_landmarks(video_path, output_path=None, save_to_db=False):
-    """Extract pose landmarks from video"""
+def landmarks_to_keypoints(landmarks):
+    """Convert MediaPipe pose landmarks to our keypoint format"""
+    keypoints = []
+    for idx, landmark in enumerate(landmarks.landmark):
+        keypoints.append({
+            "id": idx,
+            "name": KEYPOINT_NAMES[idx] if idx < len(KEYPOINT_NAMES) else f"landmark_{idx}",
+            "x": landmark.x,
+            "y": landmark.y,
+            "z": landmark.z,
+            "visibility": landmark.visibility
+        })
+    return keypoints
+
+def build_frame_data(frame_number, fps, results):
+    """Build the output record for a single processed frame"""
+    frame_data = {
+        "frame_number": frame_number,
+        "timestamp": frame_number / fps,
+        "pose_detected": results.pose_landmarks is not None,
+        "keypoints": []
+    }
+    
+    if results.pose_landmarks:
+        frame_data["keypoints"] = landmarks_to_keypoints(results.pose_landmarks)
+    
+    return frame_data
+
+def get_video_info(video_path):
+    """Read fps and frame count from the video container"""
+    cap = cv2.VideoCapture(video_path)
+    
+    if not cap.isOpened():
+        raise ValueError(f"Error opening video file: {video_path}")
+    
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    
+    return {
+        "filename": os.path.basename(video_path),
+        "fps": fps,
+        "total_frames": total_frames,
+        "duration_seconds": total_frames / fps
+    }
+
+def split_frame_ranges(total_frames, workers, start=0, end=None):
+    """Split [start, end) into contiguous (start, end) ranges, one per worker.
+    
+    With end=None the range runs to total_frames and the last range is
+    open-ended (end=None) so frames beyond the container's reported frame
+    count are still processed.
+    """
+    stop = min(end, total_frames) if end is not None else total_frames
+    frame_total = max(1, stop - start)
+    workers = max(1, min(workers, frame_total))
+    shard_size = -(-frame_total // workers)
+    ranges = []
+    for range_start in range(start, start + frame_total, shard_size):
+        ranges.append((range_start, range_start + shard_size))
+    ranges[-1] = (ranges[-1][0], end)
+    return ranges
+
+# Pipeline settings: decoded frames waiting for inference, and inference
+# results waiting for serialization
+FRAME_QUEUE_SIZE = 8
+RESULT_QUEUE_SIZE = 32
+_END_OF_STREAM = None
+
+def new_pipeline_stats():
+    """Busy/wait seconds for each stage of the extraction pipeline"""
+    stats = {stage: {"busy": 0.0, "wait": 0.0, "frames": 0}
+             for stage in ("decode", "inference", "serialize")}
+    # Frames adaptive sampling passed over without running inference, and
+    # frames ROI cropping sent to inference cropped
+    stats["inference"]["skipped"] = 0
+    stats["inference"]["cropped"] = 0
+    return stats
+
+def merge_pipeline_stats(total, stats):
+    """Add one pipeline's stage timings into a running total"""
+    for stage, values in stats.items():
+        for key, value in values.items():
+            total[stage][key] += value
+    return total
+
+def print_pipeline_stats(stats):
+    """Print how long each pipeline stage spent working vs waiting"""
+    print("Pipeline stage timings:")
+    for stage, values in stats.items():
+        counts = "".join(f", {values[key]} {key}" for key in ("skipped", "cropped") if values.get(key))
+        print(f"   - {stage}: busy {values['busy']:.2f}s, waiting {values['wait']:.2f}s "
+              f"({values['frames']} frames{counts})")
+
+def _put_until_stopped(q, item, stop_event):
+    """Put into a bounded queue, giving up if the pipeline is shutting down"""
+    while not stop_event.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _get_until_stopped(q, stop_event):
+    """Get from a queue, returning _END_OF_STREAM if the pipeline is shutting down"""
+    while not stop_event.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return _END_OF_STREAM
+
+def _decode_stage(cap, start, end, frame_queue, stop_event, stats, errors, sampler=None):
+    """Decoder thread: read and colour-convert frames into the frame queue.
+    
+    With a sampler, frames it decides to skip are queued as (frame, None).
+    """
+    prof = profiler.get()
+    frame_count = start
+    try:
+        while end is None or frame_count < end:
+            started = time.perf_counter()
+            success, image = cap.read()
+            if not success:
+                break
+            read = time.perf_counter()
+            
+            # Convert BGR to RGB
+            image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            converted = time.perf_counter()
+            if sampler and not sampler.should_infer(image_rgb):
+                image_rgb = None
+            decoded = time.perf_counter()
+            stats["busy"] += decoded - started
+            prof.record("decode", read - started)
+            prof.record("color_convert", converted - read)
+            if sampler:
+                prof.record("motion_check", decoded - converted)
+            
+            if not _put_until_stopped(frame_queue, (frame_count, image_rgb), stop_event):
+                return
+            stats["wait"] += time.perf_counter() - decoded
+            stats["frames"] += 1
+            frame_count += 1
+    except Exception as e:
+        errors.append(e)
+        stop_event.set()
+    finally:
+        _put_until_stopped(frame_queue, _END_OF_STREAM, stop_event)
+
+def _serialize_stage(fps, result_queue, on_frame, stop_event, stats, errors):
+    """Serializer thread: turn inference results into frame records.
+    
+    Skipped frames (results None) are held back until the next inferred
+    frame arrives and then emitted, in order, with interpolated keypoints.
+    """
+    prof = profiler.get()
+    previous = None
+    skipped = []
+    try:
+        while True:
+            started = time.perf_counter()
+            item = _get_until_stopped(result_queue, stop_event)
+            received = time.perf_counter()
+            stats["wait"] += received - started
+            if item is _END_OF_STREAM:
+                if skipped and not stop_event.is_set():
+                    for frame_data in interpolate_frames(previous, None, skipped, fps):
+                        on_frame(frame_data)
+                    prof.count("frames", len(skipped))
+                return
+            
+            frame_number, results = item
+            if results is None:
+                skipped.append(frame_number)
+                stats["frames"] += 1
+                continue
+            
+            frame_data = build_frame_data(frame_number, fps, results)
+            built = time.perf_counter()
+            if skipped:
+                for interpolated in interpolate_frames(previous, frame_data, skipped, fps):
+                    on_frame(interpolated)
+                prof.count("frames", len(skipped))
+                skipped = []
+            on_frame(frame_data)
+            previous = frame_data
+            finished = time.perf_counter()
+            stats["busy"] += finished - received
+            stats["frames"] += 1
+            prof.record("build_frame", built - received)
+            prof.record("write_frame", finished - built)
+            prof.count("frames")
+    except Exception as e:
+        errors.append(e)
+        stop_event.set()
+
+def extract_frame_range(video_path, start, end, fps, total_frames=None, stats=None, on_frame=None,
+                        settings=None, warmup=0, keyframes=None, sampling=None, roi=None):
+    """Run a dedicated Pose instance over frames [start, end) of a video.
+    
+    Decoding, inference and serialization run as a pipeline: a decoder
+    thread fills a bounded queue of RGB frames, this thread runs inference,
+    and a serializer thread builds the frame records, so decode and colour
+    conversion overlap with pose.process(). Stage busy/wait seconds are
+    added to stats when given. Progress is printed every 30 frames when
+    total_frames (the frame the range is expected to end at) is given.
+    
+    Seeking to start uses the video's keyframe index when given (see
+    keyframe_index.py). Frame numbers and timestamps are always relative
+    to the start of the video, so they line up with a full extraction.
+    
+    Frame records are collected and returned, unless on_frame is given, in
+    which case each record is handed to it as soon as it is built and an
+    empty list is returned.
+    
+    With warmup, inference starts that many frames before start so the
+    tracker has history by the time records are produced; the warm-up
+    frames themselves are not returned.
+    
+    With sampling (see pose_sampling.py), inference only runs on frames
+    that moved since the last inferred frame; the others get interpolated
+    keypoints and "interpolated": true.
+    
+    With roi (see pose_roi.py), each frame is cropped around the previous
+    pose and downscaled before inference; landmarks are still returned in
+    normalized full-frame coordinates. Frames without a previous pose run
+    full size through a second, static-image Pose instance.
+    """
+    frames = []
+    settings = resolve_settings(settings)
+    if stats is None:
+        stats = new_pipeline_stats()
     
     # Initialize MediaPipe Pose
-    with mp_pose.Pose(
-        min_detection_confidence=0.5,
-        min_tracking_confidence=0.5) as pose:
+    full_frame_pose = create_pose(settings, static_image_mode=True) if roi else contextlib.nullcontext()
+    with create_pose(settings) as pose, full_frame_pose:
         
         # Open video file
         cap = cv2.VideoCapture(video_path)
@@ -166,93 +461,419 @@ def extract_pose_landmarks(video_path, output_path=None, save_to_db=False):
         if not cap.isOpened():
             raise ValueError(f"Error opening video file: {video_path}")
         
-        # Get video properties
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        duration = total_frames / fps
+        decode_start = max(0, start - warmup)
+        seek_to_frame(cap, decode_start, keyframes)
         
-        print(f"Processing {total_frames} frames from {video_path}")
+        frame_queue = queue.Queue(maxsize=FRAME_QUEUE_SIZE)
+        result_queue = queue.Queue(maxsize=RESULT_QUEUE_SIZE)
+        stop_event = threading.Event()
+        errors = []
         
-        # Store results
-        pose_data = {
-            "video_info": {
-                "filename": os.path.basename(video_path),
-                "fps": fps,
-                "total_frames": total_frames,
-                "duration_seconds": duration
-            },
-            "frames": []
-        }
+        decoder = threading.Thread(
+            target=_decode_stage,
+            args=(cap, decode_start, end, frame_queue, stop_event, stats["decode"], errors,
+                  MotionSampler(**sampling) if sampling else None),
+            daemon=True)
+        serializer = threading.Thread(
+            target=_serialize_stage,
+            args=(fps, result_queue, on_frame or frames.append, stop_event, stats["serialize"], errors),
+            daemon=True)
+        decoder.start()
+        serializer.start()
         
-        frame_count = 0
+        cropper = RoiCropper(**roi) if roi else None
+        inference = stats["inference"]
+        prof = profiler.get()
+        try:
+            while True:
+                started = time.perf_counter()
+                item = _get_until_stopped(frame_queue, stop_event)
+                received = time.perf_counter()
+                inference["wait"] += received - started
+                if item is _END_OF_STREAM:
+                    break
+                
+                # Process the frame (skipped frames pass straight through)
+                frame_count, image_rgb = item
+                process_started = received
+                if image_rgb is None:
+                    results = None
+                    inference["skipped"] += 1
+                elif cropper:
+                    image_roi, region = cropper.crop(image_rgb)
+                    process_started = time.perf_counter()
+                    prof.record("roi_crop", process_started - received)
+                    detector = pose if region else full_frame_pose
+                    results = cropper.restore(detector.process(image_roi), region)
+                    inference["cropped"] += region is not None
+                else:
+                    results = pose.process(image_rgb)
+                processed = time.perf_counter()
+                inference["busy"] += processed - received
+                if results is not None:
+                    prof.record("pose_process", processed - process_started)
+                
+                # Warm-up frames only build tracking history
+                if frame_count < start:
+                    continue
+                
+                if not _put_until_stopped(result_queue, (frame_count, results), stop_event):
+                    break
+                inference["wait"] += time.perf_counter() - processed
+                inference["frames"] += 1
+                
+                # Progress indicator
+                if total_frames and (frame_count + 1) % 30 == 0:
+                    progress = ((frame_count + 1 - start) / max(1, total_frames - start)) * 100
+                    print(f"Progress: {progress:.1f}% ({frame_count + 1}/{total_frames})")
+        except BaseException:
+            stop_event.set()
+            raise
+        finally:
+            _put_until_stopped(result_queue, _END_OF_STREAM, stop_event)
+            serializer.join()
+            stop_event.set()
+            decoder.join()
+            cap.release()
         
-        while cap.isOpened():
-            success, image = cap.read()
-            if not success:
-                break
-            
-            # Convert BGR to RGB
-            image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-            
-            # Process the frame
-            results = pose.process(image_rgb)
-            
-            # Extract landmarks
-            frame_data = {
-                "frame_number": frame_count,
-                "timestamp": frame_count / fps,
-                "pose_detected": results.pose_landmarks is not None,
-                "keypoints": []
-            }
-            
-            if results.pose_landmarks:
-                # Convert landmarks to our format
-                for idx, landmark in enumerate(results.pose_landmarks.landmark):
-                    # MediaPipe pose landmark names
-                    landmark_names = [
-                        "nose", "left_eye_inner", "left_eye", "left_eye_outer",
-                        "right_eye_inner", "right_eye", "right_eye_outer",
-                        "left_ear", "right_ear", "mouth_left", "mouth_right",
-                        "left_shoulder", "right_shoulder", "left_elbow", "right_elbow",
-                        "left_wrist", "right_wrist", "left_pinky", "right_pinky",
-                        "left_index", "right_index", "left_thumb", "right_thumb",
-                        "left_hip", "right_hip", "left_knee", "right_knee",
-                        "left_ankle", "right_ankle", "left_heel", "right_heel",
-                        "left_foot_index", "right_foot_index"
-                    ]
-                    
-                    keypoint = {
-                        "id": idx,
-                        "name": landmark_names[idx] if idx < len(landmark_names) else f"landmark_{idx}",
-                        "x": landmark.x,
-                        "y": landmark.y,
-                        "z": landmark.z,
-                        "visibility": landmark.visibility
-                    }
-                    frame_data["keypoints"].append(keypoint)
-            
-            pose_data["frames"].append(frame_data)
-            frame_count += 1
-            
-            # Progress indicator
-            if frame_count % 30 == 0:
-                progress = (frame_count / total_frames) * 100
-                print(f"Progress: {progress:.1f}% ({frame_count}/{total_frames})")
+        if errors:
+            raise errors[0]
+    
+    return frames
+
+def _extract_frame_range_task(task):
+    """Pool entry point for extract_frame_range"""
+    video_path, start, end, fps, part_path, settings, warmup, keyframes, sampling, roi, profile = task
+    stats = new_pipeline_stats()
+    # Each worker profiles into its own profiler and sends the samples back
+    prof = profiler.enable("extract_worker") if profile else None
+    
+    if part_path:
+        with NdjsonPoseWriter(part_path) as writer:
+            extract_frame_range(video_path, start, end, fps, stats=stats, on_frame=writer.write_frame,
+                                settings=settings, warmup=warmup, keyframes=keyframes, sampling=sampling,
+                                roi=roi)
+        frames, frame_count = [], writer.frame_count
+    else:
+        frames = extract_frame_range(video_path, start, end, fps, stats=stats, settings=settings,
+                                     warmup=warmup, keyframes=keyframes, sampling=sampling, roi=roi)
+        frame_count = len(frames)
+    
+    return start, frames, frame_count, stats, prof.snapshot() if prof else None
+
+def extract_frames_parallel(video_path, video_info, workers, stats=None, writer=None, settings=None,
+                            segment=None, keyframes=None, sampling=None, roi=None):
+    """Extract frames using one process per frame range, merged in frame order.
+    
+    Each worker seeks to its range and runs its own Pose instance. Every
+    range after the first starts inference SHARD_WARMUP_FRAMES early and
+    discards those frames, so the tracker has history at the boundary.
+    Tracking state is rebuilt rather than carried over, though, so
+    landmarks in every range but the first still differ slightly from a
+    single-process run (most by well under 1% of the frame, in testing).
+    With a writer, each worker
+    streams its range to a part file which is appended to the writer in
+    order, and an empty list is returned. With a segment, only its
+    (start, end) frames are split across the workers.
+    """
+    segment_start, segment_end = segment or (0, None)
+    ranges = split_frame_ranges(video_info["total_frames"], workers, segment_start, segment_end)
+    tasks = []
+    for index, (start, end) in enumerate(ranges):
+        part_path = f"{writer.path}.part{index}" if writer else None
+        # The first range starts where a single-process run would, without warm-up
+        warmup = SHARD_WARMUP_FRAMES if index else 0
+        tasks.append((video_path, start, end, video_info["fps"], part_path, settings, warmup, keyframes,
+                      sampling, roi, profiler.get().enabled))
+    
+    frame_total = (segment_end or video_info["total_frames"]) - segment_start
+    print(f"Splitting {frame_total} frames across {len(tasks)} workers")
+    
+    shards = {}
+    try:
+        with multiprocessing.Pool(processes=len(tasks)) as pool:
+            for start, frames, frame_count, shard_stats, shard_profile in pool.imap_unordered(
+                    _extract_frame_range_task, tasks):
+                shards[start] = (frames, frame_count)
+                if stats is not None:
+                    merge_pipeline_stats(stats, shard_stats)
+                if shard_profile:
+                    profiler.get().merge(shard_profile)
+                print(f"Finished frames {start}-{start + frame_count - 1} ({len(shards)}/{len(tasks)} ranges)")
         
-        cap.release()
+        frames = []
+        for task in tasks:
+            start, part_path = task[1], task[4]
+            shard_frames, frame_count = shards[start]
+            if writer:
+                writer.append_part(part_path, frame_count)
+            else:
+                frames.extend(shard_frames)
+        return frames
+    finally:
+        for task in tasks:
+            if task[4] and os.path.exists(task[4]):
+                os.remove(task[4])
+
+def _tee(*callbacks):
+    """An on_frame callback handing each frame to every callback that is not None"""
+    callbacks = [callback for callback in callbacks if callback]
+    if len(callbacks) == 1:
+        return callbacks[0]
+    def on_frame(frame_data):
+        for callback in callbacks:
+            callback(frame_data)
+    return on_frame
+
+def _passing_through(frames, on_frame):
+    """Yield frames, handing each one to on_frame first"""
+    for frame in frames:
+        on_frame(frame)
+        yield frame
+
+def _emit_frames(frames, pose_data, writer_class, output_path):
+    """Write frames through a streaming writer, or collect them into pose_data"""
+    if writer_class is None:
+        pose_data["frames"] = list(frames)
+        return
+    
+    with writer_class(output_path, pose_data["video_info"]) as writer:
+        for frame in frames:
+            writer.write_frame(frame)
+    pose_data["frame_count"] = writer.frame_count
+
+def extract_pose_landmarks(video_path, output_path=None, save_to_db=False, workers=1,
+                           output_format='json', settings=None, use_cache=True, cache_dir=None,
+                           checkpoint_interval=0, resume=False,
+                           start=None, end=None, sampling=None, roi=None, stream_to_db=False):
+    """Extract pose landmarks from video
+    
+    With output_format='ndjson' frames are streamed to output_path as they
+    are processed instead of being collected, so memory use does not grow
+    with video length; the returned dict then has an empty "frames" list
+    and the number of frames written in "frame_count". output_format='pose'
+    writes a columnar pose array (see pose_array.py) the same way, and
+    'posez' the quantized, compressed codec (see pose_codec.py).
+    
+    Results are cached by video content and extraction settings (see
+    pose_cache.py), so re-running on an unchanged video skips MediaPipe.
+    
+    With a checkpoint_interval (not supported with workers > 1), runs
+    record progress in a checkpoint next to the output every
+    checkpoint_interval frames. Frames then go to the checkpoint first and
+    are copied to the output at the end, so it is off by default. resume=True checkpoints every
+    DEFAULT_CHECKPOINT_INTERVAL frames unless told otherwise, and an
+    interrupted run seeks to its checkpoint and carries on. Landmarks match
+    an uninterrupted run exactly when the checkpoint can restart from a
+    frame where tracking was lost (see pose_checkpoint.py); otherwise
+    inference restarts RESUME_WARMUP_FRAMES early to rebuild tracking state.
+    
+    start and end limit extraction to a segment, given in seconds ("12.0s")
+    or as a frame number ("360f"); see parse_position(). The capture seeks
+    to the nearest keyframe before start using a cached keyframe index,
+    decoding stops at end, and frame numbers and timestamps match those of
+    a full extraction. The segment is recorded in video_info["segment"].
+    
+    sampling (see pose_sampling.sampling_settings()) turns on motion-adaptive
+    sampling: still frames skip inference and get interpolated keypoints.
+    roi (see pose_roi.roi_settings()) crops and downscales frames around the
+    previous pose before inference.
+    
+    With save_to_db and stream_to_db, frames are copied into the database
+    in batches while extraction runs (see pose_ingest.DatabasePoseWriter)
+    instead of in one go at the end, so the upload overlaps inference; the
+    video's old rows are replaced and its duration set in one transaction
+    committed when extraction is done. Not supported with workers > 1.
+    """
+    
+    settings = resolve_settings(settings)
+    if checkpoint_interval and workers > 1:
+        raise ValueError("--checkpoint-interval is not supported with --workers")
+    if resume and not checkpoint_interval:
+        checkpoint_interval = DEFAULT_CHECKPOINT_INTERVAL
+    video_info = get_video_info(video_path)
+    fps = video_info["fps"]
+    total_frames = video_info["total_frames"]
+    segment = resolve_segment(start, end, video_info)
+    first_frame, end_frame = segment or (0, None)
+    run_settings = settings
+    if segment:
+        video_info["segment"] = {
+            "start_frame": first_frame,
+            "end_frame": end_frame,
+            "start_seconds": first_frame / fps,
+            "end_seconds": end_frame / fps if end_frame is not None else None
+        }
+        run_settings = {**run_settings, "segment": [first_frame, end_frame]}
+    if sampling:
+        run_settings = {**run_settings, "sampling": sampling}
+    if roi:
+        run_settings = {**run_settings, "roi": roi}
+    streaming = output_format in FILE_WRITERS
+    writer_class = FILE_WRITERS.get(output_format)
+    
+    if streaming and not output_path:
+        raise ValueError(f"{output_format} output requires an output path")
+    stream_to_db = save_to_db and stream_to_db
+    if stream_to_db and workers > 1:
+        raise ValueError("--stream is not supported with --workers")
+    
+    # Store results
+    pose_data = {
+        "video_info": video_info,
+        "frames": []
+    }
+    
+    prof = profiler.get()
+    cached = None
+    if use_cache:
+        key_settings = {**run_settings, "workers": workers, "mediapipe_version": mp.__version__}
+        with prof.stage("cache_lookup"):
+            key = pose_cache.cache_key(video_path, key_settings)
+            cached = pose_cache.lookup(key, cache_dir)
+    
+    db_writer = open_database_writer(video_path, video_info) if stream_to_db else None
+    db_write = db_writer.write_frame if db_writer else None
+    # A streamed output is written as it goes and may be lossy (.pose, .posez), so
+    # the cache entry is filled from the same frames rather than read back from it
+    cache_writer = None
+    if use_cache and cached is None and streaming:
+        cache_writer = pose_cache.CacheEntryWriter(key, video_info, cache_dir=cache_dir, meta={
+            "video_filename": video_info["filename"],
+            "settings": key_settings
+        })
+    cache_write = cache_writer.write_frame if cache_writer else None
+    
+    checkpoint = None
+    # The cache entry is discarded if extraction fails
+    with db_writer or contextlib.nullcontext(), cache_writer or contextlib.nullcontext():
+        if cached is not None:
+            print(f"Cache hit for {video_path} ({key[:12]}), skipping extraction")
+            frames = iter_pose_array_frames(cached)
+            if db_writer:
+                frames = _passing_through(frames, db_write)
+            _emit_frames(frames, pose_data, writer_class if streaming else None, output_path)
+        else:
+            # Frame the extraction is expected to stop at, for progress
+            stop_frame = min(end_frame, total_frames) if end_frame is not None else total_frames
+            if segment:
+                print(f"Processing frames {first_frame}-{stop_frame - 1} of {total_frames} from {video_path}")
+            else:
+                print(f"Processing {total_frames} frames from {video_path}")
         
-        # Save results
-        if save_to_db:
-            save_pose_data_to_database(video_path, pose_data)
-            print(f"Pose data saved to database")
+            # Anything that seeks builds (or reuses) the video's keyframe index
+            keyframes = None
+            if first_frame > 0 or workers > 1 or resume:
+                keyframes = load_keyframe_index(video_path, fps, cache_dir)
         
-        if output_path:
-            with open(output_path, 'w') as f:
-                json.dump(pose_data, f, indent=2)
-            print(f"Pose data saved to {output_path}")
+            stats = new_pipeline_stats()
+            if workers > 1 and total_frames > 0:
+                if resume:
+                    raise ValueError("--resume is not supported with --workers")
+                if streaming and output_format == 'ndjson':
+                    with NdjsonPoseWriter(output_path, video_info) as writer:
+                        extract_frames_parallel(video_path, video_info, workers, stats, writer, settings,
+                                                segment, keyframes, sampling, roi)
+                    pose_data["frame_count"] = writer.frame_count
+                    if cache_write:
+                        # The workers' frames only reach the output, and NDJSON keeps them exactly
+                        for frame in open_pose_file(output_path)[1]:
+                            cache_write(frame)
+                else:
+                    frames = extract_frames_parallel(video_path, video_info, workers, stats,
+                                                     settings=settings, segment=segment,
+                                                     keyframes=keyframes, sampling=sampling, roi=roi)
+                    if cache_write:
+                        frames = _passing_through(frames, cache_write)
+                    _emit_frames(frames, pose_data, writer_class if streaming else None, output_path)
+            elif checkpoint_interval:
+                # Frames go to the checkpoint first and are copied to the output
+                # once extraction is complete
+                checkpoint = ExtractionCheckpoint(
+                    checkpoint_path(output_path or f"{Path(video_path).stem}_pose_data"),
+                    video_fingerprint(video_path, run_settings),
+                    checkpoint_interval)
+                if resume:
+                    resume_frame, exact = checkpoint.resume(first_frame=first_frame)
+                else:
+                    resume_frame, exact = checkpoint.start(first_frame), True
+                if resume_frame > first_frame and exact:
+                    print(f"Resuming from checkpoint {checkpoint.path} at frame {resume_frame} "
+                          f"(last tracker reset)")
+                elif resume_frame > first_frame:
+                    print(f"Resuming from checkpoint {checkpoint.path} at frame {resume_frame}; no tracker "
+                          f"reset nearby, so frames just after it may differ slightly")
+                if db_writer:
+                    # The database only has what this run sends it
+                    for frame in checkpoint.iter_frames():
+                        db_write(frame)
+                extract_frame_range(video_path, resume_frame, end_frame, fps, stop_frame, stats,
+                                    on_frame=_tee(checkpoint.write_frame, db_write), settings=settings,
+                                    warmup=0 if exact else RESUME_WARMUP_FRAMES, keyframes=keyframes,
+                                    sampling=sampling, roi=roi)
+                checkpoint.finish()
+                frames = checkpoint.iter_frames()
+                if cache_write:
+                    frames = _passing_through(frames, cache_write)
+                _emit_frames(frames, pose_data, writer_class if streaming else None, output_path)
+            elif streaming:
+                with writer_class(output_path, video_info) as writer:
+                    extract_frame_range(video_path, first_frame, end_frame, fps, stop_frame, stats,
+                                        on_frame=_tee(writer.write_frame, db_write, cache_write),
+                                        settings=settings, keyframes=keyframes, sampling=sampling, roi=roi)
+                pose_data["frame_count"] = writer.frame_count
+            elif db_writer:
+                extract_frame_range(video_path, first_frame, end_frame, fps, stop_frame, stats,
+                                    on_frame=_tee(pose_data["frames"].append, db_write), settings=settings,
+                                    keyframes=keyframes, sampling=sampling, roi=roi)
+            else:
+                pose_data["frames"] = extract_frame_range(video_path, first_frame, end_frame, fps,
+                                                          stop_frame, stats, settings=settings,
+                                                          keyframes=keyframes, sampling=sampling,
+                                                          roi=roi)
+            print_pipeline_stats(stats)
+            if streaming:
+                print(f"Pose data streamed to {output_path}")
         
-        print(f"Successfully extracted pose data for {len(pose_data['frames'])} frames")
-        return pose_data
+            if cache_writer:
+                with prof.stage("cache_store"):
+                    cache_writer.close()
+            elif use_cache:
+                with prof.stage("cache_store"):
+                    pose_cache.store(key, video_info, pose_data["frames"], cache_dir=cache_dir, meta={
+                        "video_filename": video_info["filename"],
+                        "settings": key_settings
+                    })
+    
+        # Save results
+        if db_writer:
+            with prof.stage("database_save"):
+                # Only the frames still queued are left to write
+                frame_total, keypoint_total = db_writer.finish(video_info['duration_seconds'])
+            print(f"Streamed {frame_total} frames ({keypoint_total} keypoints) to the database for video ID "
+                  f"{db_writer.video_id}; {db_writer.sizer.summary()}")
+        elif save_to_db:
+            with prof.stage("database_save"):
+                if streaming:
+                    # Read the frames back lazily rather than holding them in memory
+                    _, frames = open_pose_file(output_path)
+                    save_pose_data_to_database(video_path, {"video_info": video_info, "frames": frames})
+                else:
+                    save_pose_data_to_database(video_path, pose_data)
+            print(f"Pose data saved to database")
+    
+    if output_path and not streaming:
+        with prof.stage("json_dump"), open(output_path, 'w') as f:
+            json.dump(pose_data, f, indent=2)
+        print(f"Pose data saved to {output_path}")
+    
+    # Only discard the checkpoint once every output has been written
+    if checkpoint:
+        checkpoint.remove()
+    
+    frame_count = pose_data["frame_count"] if streaming else len(pose_data["frames"])
+    print(f"Successfully extracted pose data for {frame_count} frames")
+    return pose_data
 
 def main():
     parser = argparse.ArgumentParser(description='Extract pose data from MP4 video')
@@ -260,6 +881,53 @@ def main():
     parser.add_argument('-o', '--output', help='Output JSON file path')
     parser.add_argument('-d', '--database', action='store_true', 
                        help='Save to database instead of file')
+    parser.add_argument('--stream', action='store_true',
+                       help='With --database, copy frames into the database while extraction runs '
+                            'instead of after it')
+    parser.add_argument('-f', '--format', choices=['json', *FILE_WRITERS],
+                       help='Output format; ndjson streams frames as they are processed, '
+                            'pose writes a float32 pose array directory, posez the quantized '
+                            'compressed codec '
+                            '(default: from the output extension, else json)')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                       help='Number of processes to split the video across; landmarks differ slightly '
+                            'from a single-process run (default: 1)')
+    parser.add_argument('--min-detection-confidence', type=float,
+                       help=f"MediaPipe detection confidence (default: {DEFAULT_SETTINGS['min_detection_confidence']})")
+    parser.add_argument('--min-tracking-confidence', type=float,
+                       help=f"MediaPipe tracking confidence (default: {DEFAULT_SETTINGS['min_tracking_confidence']})")
+    parser.add_argument('--model-complexity', type=int, choices=[0, 1, 2],
+                       help=f"MediaPipe model complexity (default: {DEFAULT_SETTINGS['model_complexity']})")
+    parser.add_argument('--checkpoint-interval', type=int, default=0,
+                       help='Save a resumable checkpoint every N frames '
+                            f'(default: off, or every {DEFAULT_CHECKPOINT_INTERVAL} with --resume)')
+    parser.add_argument('--resume', action='store_true',
+                       help='Checkpoint the extraction, continuing an interrupted one from its checkpoint')
+    parser.add_argument('--start',
+                       help='Start of the segment to extract, in seconds (12.0s, 1:05.5) or as a frame (360f)')
+    parser.add_argument('--end',
+                       help='End of the segment to extract (exclusive), in seconds or as a frame '
+                            '(default: end of the video)')
+    parser.add_argument('--adaptive', action='store_true',
+                       help='Skip inference on frames with little motion and interpolate their keypoints')
+    parser.add_argument('--motion-threshold', type=float, default=DEFAULT_MOTION_THRESHOLD,
+                       help='Mean pixel difference (0-255) that triggers inference in adaptive mode '
+                            f'(default: {DEFAULT_MOTION_THRESHOLD})')
+    parser.add_argument('--max-skip', type=int, default=DEFAULT_MAX_SKIP,
+                       help=f'Most consecutive frames adaptive mode may skip (default: {DEFAULT_MAX_SKIP})')
+    parser.add_argument('--roi', action='store_true',
+                       help='Crop frames around the previous pose before inference')
+    parser.add_argument('--roi-padding', type=float, default=DEFAULT_ROI_PADDING,
+                       help=f'Padding around the pose as a fraction of its size (default: {DEFAULT_ROI_PADDING})')
+    parser.add_argument('--inference-size', type=int, default=DEFAULT_INFERENCE_SIZE,
+                       help='Longest side in pixels frames are downscaled to with --roi, 0 to keep '
+                            f'full resolution (default: {DEFAULT_INFERENCE_SIZE})')
+    parser.add_argument('--profile', metavar='PATH',
+                       help='Write per-stage timings, throughput and peak memory as JSON to PATH')
+    parser.add_argument('--no-cache', action='store_true',
+                       help='Always run extraction instead of reusing cached results')
+    parser.add_argument('--cache-dir',
+                       help='Extraction cache directory (default: $POSE_CACHE_DIR or ~/.cache/coacht/pose-extraction)')
     
     args = parser.parse_args()
     
@@ -268,20 +936,58 @@ def main():
         print(f"Error: Video file '{args.video_path}' not found")
         sys.exit(1)
     
+    if not args.format:
+        if args.output and is_ndjson_path(args.output):
+            args.format = 'ndjson'
+        elif args.output and is_pose_array_path(args.output):
+            args.format = 'pose'
+        elif args.output and is_pose_codec_path(args.output):
+            args.format = 'posez'
+        else:
+            args.format = 'json'
+    
     # Set default output path if not provided and not saving to database
-    if not args.output and not args.database:
+    # (streaming always needs a file to write to)
+    if not args.output and (not args.database or args.format != 'json'):
         video_name = Path(args.video_path).stem
-        args.output = f"{video_name}_pose_data.json"
+        args.output = f"{video_name}_pose_data.{args.format}"
+    
+    if args.profile:
+        profiler.enable("extract_pose_data", args.profile, metadata={
+            "video": os.path.basename(args.video_path),
+            "format": args.format,
+            "workers": args.workers,
+            "mediapipe_version": mp.__version__,
+            "opencv_version": cv2.__version__
+        })
     
     try:
         extract_pose_landmarks(
             video_path=args.video_path,
             output_path=args.output,
-            save_to_db=args.database
+            save_to_db=args.database,
+            stream_to_db=args.stream,
+            workers=args.workers,
+            output_format=args.format,
+            settings={
+                "min_detection_confidence": args.min_detection_confidence,
+                "min_tracking_confidence": args.min_tracking_confidence,
+                "model_complexity": args.model_complexity
+            },
+            use_cache=not args.no_cache,
+            cache_dir=args.cache_dir,
+            checkpoint_interval=args.checkpoint_interval,
+            resume=args.resume,
+            start=args.start,
+            end=args.end,
+            sampling=sampling_settings(args.motion_threshold, args.max_skip) if args.adaptive else None,
+            roi=roi_settings(args.roi_padding, args.inference_size) if args.roi else None
         )
     except Exception as e:
         print(f"Error: {e}")
         sys.exit(1)
+    
+    profiler.finish()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -1,19 +1,14 @@
 #!/usr/bin/env python3
 
 import json
-import psycopg2
-import os
-from dotenv import load_dotenv
+import db
+from pose_io import load_pose_data, resolve_pose_file
+import profiler
 
 def main():
+    prof = profiler.get()
     print("🚀 FAST upload for Taegeuk 3 & 4 (JSON approach)...")
     
-    # Load environment variables
-    load_dotenv('../.env')
-    
-    # Database connection using DATABASE_URL
-    database_url = os.getenv('DATABASE_URL')
-    
     # Videos to process
     videos_to_process = [
         {
@@ -32,17 +27,18 @@ def main():
     
     try:
         # Connect to PostgreSQL
-        conn = psycopg2.connect(database_url)
+        conn = db.connect()
         cur = conn.cursor()
         
         for video_info in videos_to_process:
             print(f"\n📹 Processing {video_info['title']}...")
             
             # Load pose data
-            with open(video_info['pose_file'], 'r') as f:
-                pose_data = json.load(f)
+            with prof.stage("load"):
+                pose_data = load_pose_data(resolve_pose_file(video_info['pose_file']))
             
             frame_count = len(pose_data['frames'])
+            prof.count("frames", frame_count)
             print(f"📊 Loaded pose data: {frame_count} frames")
             
             # Check if video exists in martial_arts_videos
@@ -74,19 +70,22 @@ def main():
             
             # Insert complete pose sequence as JSON
             print("💾 Inserting pose sequence as JSON...")
-            cur.execute("""
-                INSERT INTO pose_sequences (video_id, pose_data, frame_count, created_at)
-                VALUES (%s, %s, %s, NOW())
-            """, (
-                video_info['id'],
-                json.dumps(pose_data),
-                frame_count
-            ))
+            with prof.stage("insert_batch"):
+                cur.execute("""
+                    INSERT INTO pose_sequences (video_id, pose_data, frame_count, created_at)
+                    VALUES (%s, %s, %s, NOW())
+                """, (
+                    video_info['id'],
+                    json.dumps(pose_data),
+                    frame_count
+                ))
+            prof.count("rows")
             
             print(f"✅ Successfully uploaded {video_info['title']} with {frame_count} frames")
         
         # Commit all changes
-        conn.commit()
+        with prof.stage("commit"):
+            conn.commit()
         print("\n🎉 All uploads completed successfully!")
         
     except Exception as e:
@@ -101,4 +100,6 @@ def main():
             conn.close()
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    profiler.enable_from_args("fast_upload_taegeuk_34")
+    main()
+    profiler.finish()
\ No newline at end of file
@@ -1,22 +1,8 @@
 #!/usr/bin/env python3
-import psycopg2
-import os
-from pathlib import Path
-
-def get_db_connection():
-    database_url = os.environ.get('DATABASE_URL')
-    if not database_url:
-        env_file = Path(__file__).parent.parent / '.env'
-        if env_file.exists():
-            with open(env_file) as f:
-                for line in f:
-                    if line.startswith('DATABASE_URL='):
-                        database_url = line.strip().split('=', 1)[1].strip('"\'')
-                        break
-    return psycopg2.connect(database_url)
+import db
 
 def main():
-    conn = get_db_connection()
+    conn = db.connect()
     cursor = conn.cursor()
     
     print("🔧 UPDATING VIDEO FILE PATHS IN DATABASE...")
@@ -36,11 +22,8 @@ def main():
     
     # Update each video's file path
     for video_id, file_path in video_path_updates.items():
-        cursor.execute("""
-            UPDATE martial_arts_videos 
-            SET youtube_url = %s 
-            WHERE id = %s
-        """, (file_path, video_id))
+        db.execute_prepared(cursor, "set_video_path",
+                            "UPDATE martial_arts_videos SET youtube_url = %s WHERE id = %s", (file_path, video_id))
         
         print(f"✅ Updated video ID {video_id}: {file_path}")
     
@@ -58,11 +41,9 @@ def main():
     }
     
     for video_id, thumbnail_path in thumbnail_updates.items():
-        cursor.execute("""
-            UPDATE martial_arts_videos 
-            SET thumbnail_url = %s 
-            WHERE id = %s
-        """, (thumbnail_path, video_id))
+        db.execute_prepared(cursor, "set_thumbnail_path",
+                            "UPDATE martial_arts_videos SET thumbnail_url = %s WHERE id = %s",
+                            (thumbnail_path, video_id))
         
         print(f"🖼️  Updated thumbnail ID {video_id}: {thumbnail_path}")
     
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Benchmark pose ingestion: executemany vs execute_values vs COPY vs asyncio pipelines
+
+Loads each pose file into the database with every method the upload
+scripts have used, with pose_ingest's COPY paths and with
+pose_ingest_async's pipelined path, and reports seconds, rows per second
+and speedup over executemany. Each run inserts under scratch
+martial_arts_videos records inside transactions that are rolled back, so
+the database is left as it was.
+
+With --videos N each run loads the file under N scratch videos: the sync
+methods one video after another on one connection, the async method all
+of them at once from one event loop, one connection each.
+
+Usage:
+    python ingest_benchmark.py                          # every pose file under client/public/pose-data
+    python ingest_benchmark.py taegeuk-1-full.json --layout rows --repeat 3 --json report.json
+    python ingest_benchmark.py taegeuk-1-full.json --methods executemany copy_text async_pipeline --videos 4
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import psycopg2.extras
+
+import db
+import pose_ingest
+import pose_ingest_async
+from pose_io import load_pose_data, resolve_pose_file
+from pose_partitions import create_video_partitions, is_partitioned
+
+POSE_DATA_DIR = Path(__file__).parent.parent / "client/public/pose-data"
+METHODS = ('executemany', 'execute_values', 'copy_text', 'copy_binary', 'async_pipeline')
+
+def _sequence_rows(video_id, frames, fps, layout):
+    return [pose_ingest.sequence_row(layout, video_id, index, frame, fps) for index, frame in enumerate(frames)]
+
+def _keypoint_rows(video_id, frames, sequence_ids, partitioned):
+    prefix = (video_id,) if partitioned else ()
+    return [prefix + (sequence_id, kp['id'], kp['name'], kp['x'], kp['y'], kp['z'], kp['visibility'])
+            for frame, sequence_id in zip(frames, sequence_ids) if frame['pose_detected']
+            for kp in frame['keypoints']]
+
+def _sequence_insert_sql(layout):
+    columns = pose_ingest.SEQUENCE_JSON_COLUMNS if layout == 'json' else pose_ingest.SEQUENCE_COLUMNS[1:]
+    return f"INSERT INTO pose_sequences ({', '.join(columns)})"
+
+def _keypoint_insert_sql(partitioned):
+    columns = ('video_id',) + pose_ingest.KEYPOINT_COLUMNS if partitioned else pose_ingest.KEYPOINT_COLUMNS
+    return f"INSERT INTO pose_keypoints ({', '.join(columns)})"
+
+def _sequence_ids(cursor, video_id):
+    cursor.execute("SELECT id FROM pose_sequences WHERE video_id = %s ORDER BY frame_number", (video_id,))
+    return [row[0] for row in cursor.fetchall()]
+
+def run_executemany(cursor, video_id, frames, fps, layout, partitioned):
+    sequence_rows = _sequence_rows(video_id, frames, fps, layout)
+    placeholders = ', '.join(['%s'] * len(sequence_rows[0])) if sequence_rows else ''
+    cursor.executemany(f"{_sequence_insert_sql(layout)} VALUES ({placeholders})", sequence_rows)
+    if layout == 'json':
+        return len(sequence_rows)
+    keypoint_rows = _keypoint_rows(video_id, frames, _sequence_ids(cursor, video_id), partitioned)
+    placeholders = ', '.join(['%s'] * len(keypoint_rows[0])) if keypoint_rows else ''
+    cursor.executemany(f"{_keypoint_insert_sql(partitioned)} VALUES ({placeholders})", keypoint_rows)
+    return len(sequence_rows) + len(keypoint_rows)
+
+def run_execute_values(cursor, video_id, frames, fps, layout, partitioned):
+    sequence_rows = _sequence_rows(video_id, frames, fps, layout)
+    if layout == 'json':
+        psycopg2.extras.execute_values(cursor, f"{_sequence_insert_sql(layout)} VALUES %s", sequence_rows,
+                                       page_size=1000)
+        return len(sequence_rows)
+    sequence_ids = [row[0] for row in psycopg2.extras.execute_values(
+        cursor, f"{_sequence_insert_sql(layout)} VALUES %s RETURNING id", sequence_rows,
+        page_size=1000, fetch=True)]
+    keypoint_rows = _keypoint_rows(video_id, frames, sequence_ids, partitioned)
+    psycopg2.extras.execute_values(cursor, f"{_keypoint_insert_sql(partitioned)} VALUES %s", keypoint_rows,
+                                   page_size=5000)
+    return len(sequence_rows) + len(keypoint_rows)
+
+def run_copy(copy_format):
+    def run(cursor, video_id, frames, fps, layout, partitioned):
+        sequences, keypoints = pose_ingest.copy_pose_frames(cursor, video_id, frames, fps, layout, copy_format,
+                                                            partitioned=partitioned)
+        return sequences + keypoints
+    return run
+
+async def run_async_pipeline(video_ids, frames, fps, layout, partitioned):
+    """Write every video concurrently, one connection each, rolling back; returns (seconds, rows)"""
+    connections = [await pose_ingest_async.connect() for _ in video_ids]
+    try:
+        started = time.perf_counter()
+        counts = await asyncio.gather(*(
+            pose_ingest_async.write_pose_frames(conn, video_id, frames, fps, layout, partitioned=partitioned)
+            for conn, video_id in zip(connections, video_ids)))
+        seconds = time.perf_counter() - started
+    finally:
+        for conn in connections:
+            await conn.rollback()
+            await conn.close()
+    return seconds, sum(sequences + keypoints for sequences, keypoints in counts)
+
+RUNNERS = {
+    'executemany': run_executemany,
+    'execute_values': run_execute_values,
+    'copy_text': run_copy('text'),
+    'copy_binary': run_copy('binary'),
+}
+ASYNC_RUNNERS = {
+    'async_pipeline': run_async_pipeline,
+}
+
+def time_method(conn, method, frames, fps, layout, videos=1):
+    """Run one method for videos scratch videos, rolling their rows back; returns (seconds, rows).
+
+    Async methods write on connections of their own, which must see the
+    scratch records, so those are committed and removed afterwards.
+    """
+    cursor = conn.cursor()
+    video_ids = []
+    try:
+        if layout == 'json':
+            pose_ingest.ensure_keypoints_json_column(cursor)
+        pose_ingest.ensure_frame_hash_column(cursor)
+        partitioned = is_partitioned(cursor)
+        for _ in range(videos):
+            cursor.execute("""
+                INSERT INTO martial_arts_videos (name, description, category, difficulty)
+                VALUES ('ingest benchmark', 'scratch record, rolled back', 'benchmark', 'none')
+                RETURNING id
+            """)
+            video_ids.append(cursor.fetchone()[0])
+            create_video_partitions(cursor, video_ids[-1])
+        if method in ASYNC_RUNNERS:
+            conn.commit()
+            seconds, rows = asyncio.run(ASYNC_RUNNERS[method](video_ids, frames, fps, layout, partitioned))
+        else:
+            started = time.perf_counter()
+            rows = sum(RUNNERS[method](cursor, video_id, frames, fps, layout, partitioned) for video_id in video_ids)
+            seconds = time.perf_counter() - started
+    finally:
+        conn.rollback()
+        if method in ASYNC_RUNNERS:
+            for video_id in video_ids:
+                pose_ingest.remove_video(cursor, video_id)
+            conn.commit()
+        cursor.close()
+    return seconds, rows
+
+def benchmark_file(conn, pose_file, methods, layout, repeat, max_frames=None, videos=1):
+    pose_data = load_pose_data(resolve_pose_file(pose_file))
+    frames = pose_data['frames'][:max_frames]
+    fps = pose_data['video_info'].get('fps') or 30.0
+    print(f"📊 {Path(pose_file).name}: {len(frames)} frames, {layout} layout"
+          + (f", {videos} videos per run" if videos > 1 else ""))
+
+    results = []
+    for method in methods:
+        timings = []
+        for _ in range(repeat):
+            seconds, rows = time_method(conn, method, frames, fps, layout, videos)
+            timings.append(seconds)
+        seconds = statistics.median(timings)
+        results.append({"method": method, "rows": rows, "seconds": seconds,
+                        "rows_per_second": rows / seconds if seconds else 0.0})
+
+    baseline = results[0]["seconds"]
+    for result in results:
+        result["speedup"] = baseline / result["seconds"] if result["seconds"] else 0.0
+        print(f"   {result['method']:>15}: {result['seconds']:7.3f}s  {result['rows_per_second']:>10.0f} rows/s  "
+              f"{result['speedup']:5.1f}x")
+    return {"file": Path(pose_file).name, "frames": len(frames), "layout": layout, "repeat": repeat,
+            "videos": videos, "results": results}
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark executemany, execute_values, COPY and async pipeline ingestion')
+    parser.add_argument('pose_files', nargs='*',
+                        help=f'Pose files to load (default: every .json under {POSE_DATA_DIR})')
+    parser.add_argument('--layout', choices=pose_ingest.LAYOUTS, default='rows',
+                        help='Keypoints as pose_keypoints rows or as keypoints_json (default: rows)')
+    parser.add_argument('--methods', nargs='+', choices=METHODS, default=list(METHODS),
+                        help='Methods to compare; the first is the speedup baseline')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per method; the median is reported')
+    parser.add_argument('--max-frames', type=int, help='Only load the first N frames of each file')
+    parser.add_argument('--videos', type=int, default=1,
+                        help='Scratch videos loaded per run; async methods load them concurrently (default: 1)')
+    parser.add_argument('--json', help='Also write the report to this JSON file')
+
+    args = parser.parse_args()
+
+    pose_files = args.pose_files or sorted(str(path) for path in POSE_DATA_DIR.glob('*.json'))
+    if not pose_files:
+        print(f"❌ No pose files given and none found under {POSE_DATA_DIR}")
+        return 1
+
+    conn = db.connect()
+    try:
+        report = [benchmark_file(conn, pose_file, args.methods, args.layout, args.repeat, args.max_frames,
+                                  args.videos)
+                  for pose_file in pose_files]
+    finally:
+        conn.close()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"📄 Report written to {args.json}")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Keyframe index for seeking into videos
+
+Lists the frame numbers of a video's keyframes so a segment extraction can
+seek straight to the keyframe at or before its first frame and decode
+forward from there. The index comes from ffprobe when it is installed,
+otherwise from OpenCV reading the container's packets without decoding
+them. Indexes are cached as JSON under the extraction cache directory
+(see pose_cache.py), keyed by the video's path, size and modification
+time, so each video is only scanned once.
+
+Usage:
+    python keyframe_index.py video.mp4
+    python keyframe_index.py video.mp4 --rebuild
+"""
+
+import argparse
+import bisect
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+import cv2
+
+import pose_cache
+
+INDEX_FORMAT_VERSION = 1
+
+def _index_path(video_path, cache_dir=None):
+    stat = os.stat(video_path)
+    identity = f"{os.path.abspath(video_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    key = hashlib.sha256(identity.encode()).hexdigest()
+    return pose_cache.get_cache_dir(cache_dir) / 'keyframes' / f"{key}.json"
+
+def _times_to_frames(keyframe_times, fps):
+    """Convert keyframe timestamps (seconds from the first frame) to frame numbers"""
+    return sorted({int(round(seconds * fps)) for seconds in keyframe_times})
+
+def _probe_keyframe_times(video_path):
+    """Keyframe timestamps from ffprobe's packet list, or None without ffprobe.
+
+    Packets are listed in decode order, so timestamps are made relative to
+    the smallest one rather than the first.
+    """
+    if not shutil.which('ffprobe'):
+        return None
+
+    result = subprocess.run([
+        'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+        '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', video_path
+    ], capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+
+    first_pts = None
+    keyframe_times = []
+    for line in result.stdout.splitlines():
+        pts_time, _, flags = line.partition(',')
+        if pts_time in ('', 'N/A'):
+            continue
+        pts_time = float(pts_time)
+        first_pts = pts_time if first_pts is None else min(first_pts, pts_time)
+        if 'K' in flags:
+            keyframe_times.append(pts_time)
+    return [pts_time - first_pts for pts_time in keyframe_times]
+
+def _scan_keyframe_times(video_path):
+    """Keyframe timestamps from OpenCV reading raw packets (no decoding).
+
+    Returns None on OpenCV builds that cannot report keyframe flags.
+    """
+    if not hasattr(cv2, 'CAP_PROP_LRF_HAS_KEY_FRAME'):
+        return None
+
+    cap = cv2.VideoCapture(video_path, cv2.CAP_FFMPEG, [cv2.CAP_PROP_FORMAT, -1])
+    if not cap.isOpened():
+        raise ValueError(f"Error opening video file: {video_path}")
+
+    keyframe_times = []
+    try:
+        while cap.grab():
+            if cap.get(cv2.CAP_PROP_LRF_HAS_KEY_FRAME):
+                keyframe_times.append(cap.get(cv2.CAP_PROP_POS_MSEC) / 1000)
+    finally:
+        cap.release()
+    return keyframe_times
+
+def build_keyframe_index(video_path, fps):
+    """Scan a video for the sorted frame numbers of its keyframes.
+
+    Returns None if neither ffprobe nor OpenCV can list keyframes.
+    """
+    keyframe_times = _probe_keyframe_times(video_path)
+    source = 'ffprobe'
+    if keyframe_times is None:
+        keyframe_times = _scan_keyframe_times(video_path)
+        source = 'opencv'
+    if keyframe_times is None:
+        return None
+    return {
+        "version": INDEX_FORMAT_VERSION,
+        "filename": os.path.basename(video_path),
+        "fps": fps,
+        "source": source,
+        "keyframes": _times_to_frames(keyframe_times, fps)
+    }
+
+def load_keyframe_index(video_path, fps, cache_dir=None, rebuild=False):
+    """Return the keyframe frame numbers for a video, building and caching the index if needed.
+
+    Returns None if the keyframes cannot be listed, in which case
+    seek_to_frame() falls back to OpenCV's own seeking.
+    """
+    path = _index_path(video_path, cache_dir)
+    if path.exists() and not rebuild:
+        with open(path) as f:
+            index = json.load(f)
+        if index.get("version") == INDEX_FORMAT_VERSION and index.get("fps") == fps:
+            return index["keyframes"]
+
+    index = build_keyframe_index(video_path, fps)
+    if index is None:
+        return None
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.tmp-{os.getpid()}")
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f)
+    os.replace(tmp_path, path)
+    return index["keyframes"]
+
+def keyframe_before(keyframes, frame_number):
+    """The last keyframe at or before frame_number (0 if there is none)"""
+    position = bisect.bisect_right(keyframes, frame_number)
+    return keyframes[position - 1] if position else 0
+
+def seek_to_frame(cap, frame_number, keyframes=None):
+    """Position a capture so the next read() returns frame_number.
+
+    With a keyframe index the capture seeks to the keyframe at or before
+    the frame and grabs forward, which skips the colour conversion of the
+    frames in between. Without one OpenCV does its own seek.
+    """
+    if frame_number <= 0:
+        return
+    if keyframes is None:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
+        return
+
+    keyframe = keyframe_before(keyframes, frame_number)
+    if keyframe > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, keyframe)
+    for _ in range(frame_number - keyframe):
+        if not cap.grab():
+            break
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or show the keyframe index of a video')
+    parser.add_argument('video_path', help='Path to input video')
+    parser.add_argument('--rebuild', action='store_true', help='Rescan the video even if an index is cached')
+    parser.add_argument('--cache-dir', help='Cache directory (default: $POSE_CACHE_DIR or ~/.cache/coacht/pose-extraction)')
+
+    args = parser.parse_args()
+
+    cap = cv2.VideoCapture(args.video_path)
+    if not cap.isOpened():
+        print(f"Error: cannot open {args.video_path}")
+        return 1
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    cap.release()
+
+    keyframes = load_keyframe_index(args.video_path, fps, args.cache_dir, rebuild=args.rebuild)
+    if keyframes is None:
+        print("Error: install ffprobe or a newer OpenCV to list keyframes")
+        return 1
+    gaps = [b - a for a, b in zip(keyframes, keyframes[1:])]
+    print(f"🎞️  {len(keyframes)} keyframes in {args.video_path}")
+    if gaps:
+        print(f"   Keyframe interval: {min(gaps)}-{max(gaps)} frames "
+              f"(avg {sum(gaps) / len(gaps):.1f})")
+    print(f"   First keyframes: {keyframes[:10]}")
+
+if __name__ == "__main__":
+    sys.exit(main())
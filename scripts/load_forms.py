@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Load reference forms listed in forms.json into the database
+
+Each manifest entry gives a form's video record (name, description,
+category, difficulty, video path), its pose file and how its keypoints are
+stored (see pose_ingest.py). fps and duration are read from the pose file.
+
+Forms are loaded concurrently over the shared connection pool (db.py), one
+transaction per form, so a full catalogue reload takes about as long as the
+largest form rather than the sum of all of them. A form that fails is
+rolled back and reported without stopping the others.
+
+Usage:
+    python load_forms.py                                # every form in forms.json
+    python load_forms.py taegeuk-5 heian-nidan
+    python load_forms.py --workers 2 --format binary --profile load.prof.json
+    python load_forms.py taegeuk-1 --staged            # reload while the app is serving it
+    python load_forms.py taegeuk-1 --diff              # only write frames that changed since the last load
+    python load_forms.py --remove heian-sandan          # delete a form's video and its pose data
+"""
+
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import db
+import profiler
+from batch_sizer import DEFAULT_TARGET_SECONDS, AdaptiveBatchSize
+from pose_ingest import (COPY_FORMATS, LAYOUTS, ensure_frame_hash_column, ensure_keypoints_json_column,
+                         remove_video, upload_form, vacuum_pose_tables)
+from pose_partitions import is_partitioned
+
+MANIFEST_PATH = Path(__file__).parent / "forms.json"
+DEFAULT_WORKERS = 4
+
+def load_manifest(path=MANIFEST_PATH):
+    """Read a forms manifest, resolving each form's pose_file to a path"""
+    with open(path) as f:
+        manifest = json.load(f)
+    pose_data_dir = Path(path).parent / manifest.get("pose_data_dir", ".")
+    forms = []
+    for form in manifest["forms"]:
+        form = dict(form)
+        form["pose_file"] = pose_data_dir / form["pose_file"]
+        forms.append(form)
+    return forms
+
+def select_forms(forms, keys=None):
+    """The manifest entries for the given keys, in the order given (all forms if None)"""
+    if not keys:
+        return forms
+    by_key = {form["key"]: form for form in forms}
+    unknown = [key for key in keys if key not in by_key]
+    if unknown:
+        raise ValueError(f"Unknown form(s) {', '.join(unknown)}; known forms: {', '.join(by_key)}")
+    return [by_key[key] for key in keys]
+
+def load_form(pool, form, layout=None, copy_format='text', staged=False, diff=False,
+              target_seconds=DEFAULT_TARGET_SECONDS, lossy=False):
+    """Upload one form on a pooled connection, returning a summary dict"""
+    sizer = AdaptiveBatchSize(target_seconds)
+    started = time.perf_counter()
+    # Through db.run so a deadlock with another worker is retried rather than failing the form
+    video_id, sequences, keypoints = db.run(
+        upload_form,
+        form["pose_file"],
+        name=form["name"],
+        description=form.get("description"),
+        category=form["category"],
+        difficulty=form["difficulty"],
+        youtube_url=form.get("video"),
+        match=form.get("match"),
+        layout=layout or form.get("layout", "json"),
+        copy_format=copy_format,
+        detected_only=form.get("detected_only", False),
+        staged=staged,
+        vacuum=False,
+        diff=diff,
+        batch_frames=sizer,
+        lossy=lossy,
+        pool=pool,
+    )
+    seconds = time.perf_counter() - started
+    rows = sequences + keypoints
+    return {"key": form["key"], "video_id": video_id, "frames": sequences, "rows": rows, "seconds": seconds,
+            "rows_per_second": rows / seconds if seconds else 0.0, "batches": sizer.stats()}
+
+def print_summary(results, errors, wall_seconds):
+    print(f"\n📊 Loaded {len(results)} form(s) in {wall_seconds:.2f}s")
+    for result in sorted(results, key=lambda result: -result["seconds"]):
+        print(f"   - {result['key']:<14} video {result['video_id']:>4}: {result['frames']:>6} frames, "
+              f"{result['rows']:>8} rows in {result['seconds']:6.2f}s ({result['rows_per_second']:,.0f} rows/s)")
+        batches = result["batches"]
+        if batches["batches"]:
+            print(f"     {batches['batches']} batch(es), p95 {batches['p95_ms']:.0f}ms, "
+                  f"settled at {batches['size']} frames/batch")
+    if results:
+        total_seconds = sum(result["seconds"] for result in results)
+        total_rows = sum(result["rows"] for result in results)
+        print(f"   Total: {total_rows} rows, {total_rows / wall_seconds if wall_seconds else 0:,.0f} rows/s "
+              f"(sum of form times {total_seconds:.2f}s)")
+    for key, error in errors:
+        print(f"❌ {key}: {error}")
+
+def load_forms(keys=None, manifest_path=MANIFEST_PATH, workers=DEFAULT_WORKERS, layout=None, copy_format='text',
+               staged=False, diff=False, target_seconds=DEFAULT_TARGET_SECONDS, lossy=False):
+    """Load forms from the manifest concurrently; returns (results, errors).
+
+    With staged=True each form is copied into staging tables and swapped
+    in with a short transaction (see pose_ingest.upload_form()), and the
+    pose tables are vacuumed once at the end. With diff=True only frames
+    that changed since the last load are written, and a result's frames
+    and rows count what was written. Each form's writes are batched to
+    take about target_seconds per batch (see batch_sizer.py); a result's
+    "batches" holds the measurements. lossy=True also reads a float32
+    .pose or a .posez file next to a form's JSON (see
+    pose_io.resolve_pose_file()).
+    """
+    forms = select_forms(load_manifest(manifest_path), keys)
+    workers = max(1, min(workers, len(forms)))
+    pool = db.get_pool(workers)
+
+    started = time.perf_counter()
+    results = []
+    errors = []
+    try:
+        # Add columns up front rather than have the first form lock the table
+        with pool.connection() as conn, conn.cursor() as cursor:
+            ensure_frame_hash_column(cursor)
+            if any((layout or form.get("layout", "json")) == "json" for form in forms):
+                ensure_keypoints_json_column(cursor)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [(form["key"], executor.submit(load_form, pool, form, layout, copy_format, staged, diff,
+                                                     target_seconds, lossy))
+                       for form in forms]
+            for key, future in futures:
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    errors.append((key, e))
+
+        if staged and results:
+            with pool.connection() as conn:
+                with conn.cursor() as cursor:
+                    partitioned = is_partitioned(cursor)
+                conn.rollback()
+                # Partition swaps leave no dead rows to vacuum
+                if not partitioned:
+                    vacuum_pose_tables(conn)
+    finally:
+        db.close_pool()
+
+    print_summary(results, errors, time.perf_counter() - started)
+    return results, errors
+
+def remove_forms(keys, manifest_path=MANIFEST_PATH):
+    """Delete the video records of the given forms with all their pose data; returns the removed keys"""
+    forms = select_forms(load_manifest(manifest_path), keys)
+
+    def remove(conn):
+        removed = []
+        with conn.cursor() as cursor:
+            for form in forms:
+                cursor.execute("SELECT id FROM martial_arts_videos WHERE name LIKE %s ORDER BY id LIMIT 1",
+                               (form.get("match") or form["name"],))
+                row = cursor.fetchone()
+                if row is None:
+                    print(f"⚠️  No video record for {form['key']}")
+                    continue
+                remove_video(cursor, row[0])
+                removed.append((form["key"], row[0]))
+        return removed
+
+    # One transaction for every form, retried as a whole if the connection drops
+    removed = db.run(remove)
+    for key, video_id in removed:
+        print(f"🗑️  Removed {key} (video {video_id})")
+    return [key for key, _ in removed]
+
+def main():
+    parser = argparse.ArgumentParser(description='Load reference forms from the forms manifest')
+    parser.add_argument('forms', nargs='*', help='Form keys to load (default: every form in the manifest)')
+    parser.add_argument('--manifest', default=str(MANIFEST_PATH), help=f'Forms manifest (default: {MANIFEST_PATH})')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f'Forms loaded at once, one connection each (default: {DEFAULT_WORKERS})')
+    parser.add_argument('--layout', choices=LAYOUTS, help="Override each form's keypoint layout")
+    parser.add_argument('--format', choices=COPY_FORMATS, default='text', help='COPY format (default: text)')
+    parser.add_argument('--staged', action='store_true',
+                        help='Copy into staging tables and swap each form in with a short transaction, '
+                             'so readers never see a half-loaded form')
+    parser.add_argument('--diff', action='store_true',
+                        help='Only write frames whose keypoints changed since the last load, and delete '
+                             'frames that are gone')
+    parser.add_argument('--target-latency', type=float, default=DEFAULT_TARGET_SECONDS,
+                        help=f'Seconds each write batch should take; batch sizes adapt to reach it '
+                             f'(default: {DEFAULT_TARGET_SECONDS})')
+    parser.add_argument('--list', action='store_true', help='List the forms in the manifest and exit')
+    parser.add_argument('--remove', action='store_true',
+                        help="Delete the given forms' video records and pose data instead of loading them")
+    parser.add_argument('--lossy', action='store_true',
+                        help='Also read a float32 .pose or a .posez file found next to a form\'s JSON; they '
+                             'are quantized, so --diff rewrites every frame')
+    parser.add_argument('--profile', help='Write a profile report (see profiler.py) to this path')
+
+    args = parser.parse_args()
+
+    if args.list:
+        for form in load_manifest(args.manifest):
+            print(f"{form['key']:<14} {form['name']:<22} {form.get('layout', 'json'):<5} {form['pose_file']}")
+        return 0
+
+    if args.remove:
+        if not args.forms:
+            parser.error('--remove needs the keys of the forms to remove')
+        remove_forms(args.forms, args.manifest)
+        return 0
+
+    if args.profile:
+        profiler.enable("load_forms", args.profile, {"forms": args.forms, "workers": args.workers})
+    try:
+        _, errors = load_forms(args.forms, args.manifest, args.workers, args.layout, args.format, args.staged,
+                               args.diff, args.target_latency, args.lossy)
+    finally:
+        profiler.finish()
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,476 @@
+#!/usr/bin/env python3
+"""
+Online, throttled migration of stored pose data into pose_frame_chunks
+
+The database holds pose data in three layouts, depending on which script
+uploaded it:
+    rows      pose_sequences rows with 33 pose_keypoints rows per frame
+    json      pose_sequences rows with the keypoints as keypoints_json TEXT
+              (upload_taegeuk_5.py and the other json-layout uploaders)
+    document  a single pose_sequences row per video holding the whole
+              pose file as pose_data JSON (fast_upload_taegeuk_34.py)
+
+This tool converts every video into the packed pose_frame_chunks layout
+(see pose_chunks.py) while the application keeps running:
+
+- Each video is converted batch_seconds of frames at a time, each batch
+  in its own short transaction that only takes row locks on the chunks
+  it writes. Readers of the old rows are never blocked.
+- A video's progress is recorded in pose_chunk_migration in the same
+  transaction as its chunks, so an interrupted run resumes at the first
+  batch that was not committed. If the video's source rows changed in
+  the meantime (a re-upload, or a diff upload that rewrote frames in
+  place), it starts over.
+- Source rows read (or deleted) are throttled to rows_per_second.
+- With --reclaim, the old rows of each fully converted video are then
+  deleted, in throttled batches too. That frees space the row layouts
+  were using. The API still reads pose_sequences and pose_keypoints, so
+  only reclaim once readers have moved to the chunks.
+
+Usage:
+    python migrate_pose_chunks.py status
+    python migrate_pose_chunks.py run                       # every video with pose data
+    python migrate_pose_chunks.py run 3 4 --rows-per-second 5000
+    python migrate_pose_chunks.py run --reclaim --batch-seconds 20
+"""
+
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+import db
+from pose_archive import slice_arrays
+from pose_array import frames_to_arrays
+from pose_chunks import CHUNK_TABLE, DEFAULT_CHUNK_SECONDS, ensure_chunk_table, insert_chunks, read_row_frames
+from pose_ingest import has_column, vacuum_pose_tables
+from pose_partitions import drop_video_partitions, is_partitioned, video_partitions
+
+PROGRESS_TABLE = 'pose_chunk_migration'
+DEFAULT_ROWS_PER_SECOND = 20000
+DEFAULT_BATCH_SECONDS = 10.0
+# Frames whose keypoint rows are deleted per reclaim transaction
+RECLAIM_BATCH_FRAMES = 300
+# Longest a batch waits for another session's locks before it is retried
+LOCK_TIMEOUT = '2s'
+PROGRESS_INTERVAL_SECONDS = 5.0
+
+PROGRESS_SQL = """
+CREATE TABLE IF NOT EXISTS pose_chunk_migration (
+    video_id INTEGER PRIMARY KEY REFERENCES martial_arts_videos(id) ON DELETE CASCADE,
+    source_layout VARCHAR(20) NOT NULL,
+    source_frames INTEGER NOT NULL,
+    source_fingerprint TEXT,
+    source_bytes BIGINT,
+    converted_until DOUBLE PRECISION,
+    converted_frames INTEGER NOT NULL DEFAULT 0,
+    chunks INTEGER NOT NULL DEFAULT 0,
+    converted_at TIMESTAMP,
+    reclaimed_bytes BIGINT,
+    reclaimed_at TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+class Throttle:
+    """Sleep as needed to keep the average rate of rows processed at or below rows_per_second (0: no limit)"""
+
+    def __init__(self, rows_per_second):
+        self.rows_per_second = rows_per_second
+        self.rows = 0
+        self.started = time.perf_counter()
+        self.reported = self.started
+
+    def wait(self, rows):
+        self.rows += rows
+        if self.rows_per_second > 0:
+            ahead = self.rows / self.rows_per_second - (time.perf_counter() - self.started)
+            if ahead > 0:
+                time.sleep(ahead)
+
+    def report_due(self):
+        """True at most once every PROGRESS_INTERVAL_SECONDS"""
+        now = time.perf_counter()
+        if now - self.reported < PROGRESS_INTERVAL_SECONDS:
+            return False
+        self.reported = now
+        return True
+
+    @property
+    def rate(self):
+        elapsed = time.perf_counter() - self.started
+        return self.rows / elapsed if elapsed else 0.0
+
+def _lock_timeout(cursor):
+    cursor.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+
+def ensure_progress_table(conn):
+    with conn.cursor() as cursor:
+        ensure_chunk_table(cursor)
+        cursor.execute(PROGRESS_SQL)
+        # Progress tables created before source fingerprints were recorded
+        cursor.execute(f"ALTER TABLE {PROGRESS_TABLE} ADD COLUMN IF NOT EXISTS source_fingerprint TEXT")
+
+def source_videos(cursor):
+    """{video_id: layout} for every video with pose data outside pose_frame_chunks"""
+    layouts = {}
+    if has_column(cursor, 'pose_sequences', 'pose_data'):
+        cursor.execute("SELECT DISTINCT video_id FROM pose_sequences WHERE pose_data IS NOT NULL")
+        layouts.update((video_id, 'document') for (video_id,) in db.fetch_rows(cursor))
+    json_frames = "count(keypoints_json)" if has_column(cursor, 'pose_sequences', 'keypoints_json') else "0"
+    cursor.execute(f"""
+        SELECT video_id, {json_frames} FROM pose_sequences
+        WHERE video_id IS NOT NULL AND frame_number IS NOT NULL GROUP BY video_id
+    """)
+    for video_id, json_count in db.fetch_rows(cursor):
+        layouts.setdefault(video_id, 'json' if json_count else 'rows')
+    return dict(sorted(layouts.items()))
+
+def source_size(cursor, video_id, layout):
+    """(frames, bytes) of a video's pose data in its source layout"""
+    if layout == 'document':
+        cursor.execute("""
+            SELECT COALESCE(sum(json_array_length((pose_data::json)->'frames')), 0),
+                   COALESCE(sum(pg_column_size(s.*)), 0)
+            FROM pose_sequences s WHERE video_id = %s AND pose_data IS NOT NULL
+        """, (video_id,))
+        frames, size = db.fetch_rows(cursor)[0]
+        return int(frames), int(size)
+
+    cursor.execute("""
+        SELECT count(*), COALESCE(sum(pg_column_size(s.*)), 0)
+        FROM pose_sequences s WHERE video_id = %s AND frame_number IS NOT NULL
+    """, (video_id,))
+    frames, size = db.fetch_rows(cursor)[0]
+    if is_partitioned(cursor):
+        cursor.execute("""
+            SELECT COALESCE(sum(pg_column_size(k.*)), 0) FROM pose_keypoints k WHERE video_id = %s
+        """, (video_id,))
+    else:
+        cursor.execute("""
+            SELECT COALESCE(sum(pg_column_size(k.*)), 0)
+            FROM pose_keypoints k JOIN pose_sequences s ON s.id = k.sequence_id WHERE s.video_id = %s
+        """, (video_id,))
+    return int(frames), int(size) + int(db.fetch_rows(cursor)[0][0])
+
+def source_fingerprint(cursor, video_id, layout):
+    """Fingerprint of a video's pose data in its source layout, changed by any upload that touched it
+
+    A re-upload inserts rows with new ids, and a diff upload rewrites
+    changed frames in place with a new frame_hash, so the newest id plus
+    the sum of the frame hashes tells them apart.
+    """
+    if layout == 'document':
+        cursor.execute("SELECT max(id), sum(length(pose_data::text)) FROM pose_sequences "
+                       "WHERE video_id = %s AND pose_data IS NOT NULL", (video_id,))
+    else:
+        frame_hash = "sum(frame_hash)" if has_column(cursor, 'pose_sequences', 'frame_hash') else "NULL"
+        cursor.execute(f"SELECT max(id), {frame_hash} FROM pose_sequences "
+                       "WHERE video_id = %s AND frame_number IS NOT NULL", (video_id,))
+    newest, content = db.fetch_rows(cursor)[0]
+    return f"{newest}:{content}"
+
+def _document_arrays(cursor, video_id):
+    cursor.execute("SELECT pose_data FROM pose_sequences WHERE video_id = %s AND pose_data IS NOT NULL "
+                   "ORDER BY id DESC LIMIT 1", (video_id,))
+    pose_data = db.fetch_rows(cursor)[0][0]
+    if isinstance(pose_data, str):
+        pose_data = json.loads(pose_data)
+    fps = (pose_data.get('video_info') or {}).get('fps') or 30.0
+    return fps, frames_to_arrays(pose_data['frames'])
+
+def _start_video(conn, video_id, layout, restart):
+    """Progress of the video, (re)starting it if it is new, restarted or its source changed.
+
+    A video whose rows were reclaimed but which has rows again was
+    uploaded since, so it starts over too.
+    """
+    with conn.cursor() as cursor:
+        frames, size = source_size(cursor, video_id, layout)
+        fingerprint = source_fingerprint(cursor, video_id, layout)
+        cursor.execute(f"""
+            SELECT source_layout, source_frames, source_fingerprint, converted_until, converted_frames, chunks,
+                   converted_at, reclaimed_at
+            FROM {PROGRESS_TABLE} WHERE video_id = %s FOR UPDATE
+        """, (video_id,))
+        progress = db.fetch_rows(cursor)
+        # Progress recorded before fingerprints were stored only has the layout and frame count to go by
+        if progress and not restart and progress[0][:2] == (layout, frames) \
+                and progress[0][2] in (fingerprint, None) and progress[0][7] is None:
+            if progress[0][2] is None:
+                cursor.execute(f"UPDATE {PROGRESS_TABLE} SET source_fingerprint = %s WHERE video_id = %s",
+                               (fingerprint, video_id))
+            return {"frames": frames, "bytes": size, "until": progress[0][3],
+                    "converted_frames": progress[0][4], "chunks": progress[0][5], "done": bool(progress[0][6])}
+        _lock_timeout(cursor)
+        cursor.execute(f"DELETE FROM {CHUNK_TABLE} WHERE video_id = %s", (video_id,))
+        cursor.execute(f"""
+            INSERT INTO {PROGRESS_TABLE} (video_id, source_layout, source_frames, source_fingerprint, source_bytes)
+            VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT (video_id) DO UPDATE SET
+                source_layout = EXCLUDED.source_layout, source_frames = EXCLUDED.source_frames,
+                source_fingerprint = EXCLUDED.source_fingerprint, source_bytes = EXCLUDED.source_bytes,
+                converted_until = NULL, converted_frames = 0, chunks = 0, converted_at = NULL,
+                reclaimed_bytes = NULL, reclaimed_at = NULL,
+                updated_at = CURRENT_TIMESTAMP
+        """, (video_id, layout, frames, fingerprint, size))
+        return {"frames": frames, "bytes": size, "until": None, "converted_frames": 0, "chunks": 0,
+                "done": False}
+
+def _convert_batch(conn, video_id, fps, arrays, until, chunk_seconds):
+    """Write one batch of chunks and record that the video is converted up to until"""
+    with conn.cursor() as cursor:
+        _lock_timeout(cursor)
+        chunks = insert_chunks(cursor, video_id, arrays, fps, chunk_seconds) if len(arrays["timestamps"]) else 0
+        cursor.execute(f"""
+            UPDATE {PROGRESS_TABLE} SET converted_until = %s, converted_frames = converted_frames + %s,
+                chunks = chunks + %s, updated_at = CURRENT_TIMESTAMP
+            WHERE video_id = %s
+        """, (until, len(arrays["timestamps"]), chunks, video_id))
+    return chunks
+
+def _batch_bounds(until, batch_seconds, chunk_seconds):
+    """[start, stop) of the next batch: whole chunks, so no chunk is split across batches"""
+    span = max(1, round(batch_seconds / chunk_seconds)) * chunk_seconds
+    start = until if until is not None else 0.0
+    return start, float((np.floor(start / span) + 1) * span)
+
+def _report(video_id, converted, total, throttle, force=False):
+    if throttle.report_due() or force:
+        percent = 100 * converted / total if total else 100
+        print(f"   - video {video_id}: {converted}/{total} frames ({percent:.0f}%), {throttle.rate:,.0f} rows/s")
+
+def convert_video(conn, video_id, layout, throttle, batch_seconds=DEFAULT_BATCH_SECONDS,
+                  chunk_seconds=DEFAULT_CHUNK_SECONDS, restart=False):
+    """Convert one video into pose_frame_chunks, resuming where an earlier run stopped; returns its progress"""
+    progress = db.run(_start_video, video_id, layout, restart)
+    if progress["done"]:
+        return progress
+    if progress["until"] is not None:
+        print(f"🔁 Video {video_id}: resuming at {progress['until']:.1f}s "
+              f"({progress['converted_frames']}/{progress['frames']} frames)")
+
+    if layout == 'document':
+        # One row holds the whole video, so it is read once and written in batches
+        with conn.cursor() as cursor:
+            document_fps, document = _document_arrays(cursor, video_id)
+        conn.rollback()
+        throttle.wait(1)
+        timestamps = document["timestamps"]
+        def read_batch(start, stop):
+            return document_fps, slice_arrays(document, (timestamps >= start) & (timestamps < stop)), 0
+        last_timestamp = float(timestamps.max()) if len(timestamps) else -1.0
+    else:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT max(timestamp_seconds)::float8, max(fps)::float8 FROM pose_sequences
+                WHERE video_id = %s AND frame_number IS NOT NULL
+            """, (video_id,))
+            last_timestamp, video_fps = db.fetch_rows(cursor)[0]
+        conn.rollback()
+        last_timestamp = last_timestamp if last_timestamp is not None else -1.0
+        def read_batch(start, stop):
+            with conn.cursor() as cursor:
+                fps, arrays = read_row_frames(cursor, video_id, start, stop)
+            conn.rollback()
+            rows = len(arrays["timestamps"]) + int(np.count_nonzero(~np.isnan(arrays["keypoints"][..., 0])))
+            return fps or video_fps, arrays, rows
+
+    until = progress["until"]
+    converted, chunks = progress["converted_frames"], progress["chunks"]
+    while until is None or until <= last_timestamp:
+        start, stop = _batch_bounds(until, batch_seconds, chunk_seconds)
+        fps, arrays, rows = read_batch(start, stop)
+        chunks += db.run(_convert_batch, video_id, fps, arrays, stop, chunk_seconds)
+        converted += len(arrays["timestamps"])
+        until = stop
+        throttle.wait(rows)
+        _report(video_id, converted, progress["frames"], throttle)
+
+    def finish(conn):
+        with conn.cursor() as cursor:
+            cursor.execute(f"""
+                UPDATE {PROGRESS_TABLE} SET converted_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+                WHERE video_id = %s
+            """, (video_id,))
+    db.run(finish)
+    _report(video_id, converted, progress["frames"], throttle, force=True)
+    return {**progress, "converted_frames": converted, "chunks": chunks, "done": True}
+
+def _verify(cursor, video_id, frames):
+    cursor.execute(f"SELECT COALESCE(sum(frame_count), 0) FROM {CHUNK_TABLE} WHERE video_id = %s", (video_id,))
+    stored = int(db.fetch_rows(cursor)[0][0])
+    if stored != frames:
+        raise RuntimeError(f"Video {video_id} has {stored} frames in {CHUNK_TABLE} but {frames} in its source; "
+                           f"not reclaiming (rerun with --restart)")
+
+def reclaim_video(conn, video_id, layout, frames, throttle):
+    """Delete a converted video's source rows in throttled batches; returns the bytes reclaimed.
+
+    Partitioned videos get their emptied partitions dropped, returning
+    their space to the operating system. Rows deleted from unpartitioned
+    tables are counted by size, and vacuum makes their space reusable.
+    """
+    with conn.cursor() as cursor:
+        _verify(cursor, video_id, frames)
+        partitioned = is_partitioned(cursor)
+        before = db.relation_bytes(cursor, video_partitions(video_id)) if partitioned else None
+        _, estimated = source_size(cursor, video_id, layout)
+    conn.rollback()
+
+    if layout == 'document':
+        def delete_document(conn):
+            with conn.cursor() as cursor:
+                _lock_timeout(cursor)
+                cursor.execute("DELETE FROM pose_sequences WHERE video_id = %s AND pose_data IS NOT NULL",
+                               (video_id,))
+                return cursor.rowcount
+        throttle.wait(db.run(delete_document))
+    else:
+        same_video = "AND video_id = %s" if partitioned else ""
+        def delete_batch(conn):
+            with conn.cursor() as cursor:
+                _lock_timeout(cursor)
+                cursor.execute("""
+                    SELECT id FROM pose_sequences WHERE video_id = %s AND frame_number IS NOT NULL
+                    ORDER BY id LIMIT %s
+                """, (video_id, RECLAIM_BATCH_FRAMES))
+                ids = [row[0] for row in db.fetch_rows(cursor)]
+                if not ids:
+                    return 0
+                cursor.execute(f"DELETE FROM pose_keypoints WHERE sequence_id = ANY(%s) {same_video}",
+                               (ids, video_id) if partitioned else (ids,))
+                keypoints = cursor.rowcount
+                cursor.execute("DELETE FROM pose_sequences WHERE video_id = %s AND id = ANY(%s)", (video_id, ids))
+                return keypoints + cursor.rowcount
+        while True:
+            deleted = db.run(delete_batch)
+            if not deleted:
+                break
+            throttle.wait(deleted)
+
+    reclaimed = estimated
+    if partitioned:
+        def drop(conn):
+            with conn.cursor() as cursor:
+                # Dropping a partition briefly locks the parent table, so give up rather than queue behind readers
+                _lock_timeout(cursor)
+                drop_video_partitions(cursor, video_id)
+        try:
+            db.run(drop)
+            reclaimed = before
+        except Exception as e:
+            print(f"⚠️  Video {video_id}: kept its empty partitions ({e}); vacuum will shrink them")
+
+    def record(conn):
+        with conn.cursor() as cursor:
+            cursor.execute(f"""
+                UPDATE {PROGRESS_TABLE} SET reclaimed_bytes = %s, reclaimed_at = CURRENT_TIMESTAMP,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE video_id = %s
+            """, (reclaimed, video_id))
+    db.run(record)
+    return reclaimed
+
+def run(video_ids=None, rows_per_second=DEFAULT_ROWS_PER_SECOND, batch_seconds=DEFAULT_BATCH_SECONDS,
+        chunk_seconds=DEFAULT_CHUNK_SECONDS, reclaim=False, restart=False):
+    """Convert (and optionally reclaim) every video with pose data, or just video_ids; returns a summary"""
+    db.run(ensure_progress_table)
+    with db.get_pool().connection() as conn, conn.cursor() as cursor:
+        layouts = source_videos(cursor)
+    if video_ids:
+        missing = [video_id for video_id in video_ids if video_id not in layouts]
+        if missing:
+            print(f"⚠️  No source pose data for video(s) {', '.join(map(str, missing))}")
+        layouts = {video_id: layouts[video_id] for video_id in video_ids if video_id in layouts}
+
+    throttle = Throttle(rows_per_second)
+    summary = {"videos": 0, "frames": 0, "source_bytes": 0, "chunk_bytes": 0, "reclaimed_bytes": 0}
+    conn = db.connect()
+    try:
+        for video_id, layout in layouts.items():
+            print(f"📦 Video {video_id} ({layout} layout)")
+            progress = convert_video(conn, video_id, layout, throttle, batch_seconds, chunk_seconds, restart)
+            summary["videos"] += 1
+            summary["frames"] += progress["converted_frames"]
+            summary["source_bytes"] += progress["bytes"]
+            with conn.cursor() as cursor:
+                cursor.execute(f"""
+                    SELECT COALESCE(sum(pg_column_size(frame_numbers) + pg_column_size(timestamps)
+                                        + pg_column_size(flags) + pg_column_size(keypoints)), 0)
+                    FROM {CHUNK_TABLE} WHERE video_id = %s
+                """, (video_id,))
+                summary["chunk_bytes"] += int(db.fetch_rows(cursor)[0][0])
+            conn.rollback()
+            if reclaim:
+                reclaimed = reclaim_video(conn, video_id, layout, progress["frames"], throttle)
+                summary["reclaimed_bytes"] += reclaimed
+                print(f"   ♻️  Reclaimed {reclaimed / 1e6:.2f}MB from video {video_id} ({layout} layout)")
+        if reclaim and layouts:
+            vacuum_pose_tables(conn)
+    finally:
+        conn.close()
+    return summary
+
+def print_status(cursor):
+    cursor.execute(f"SELECT to_regclass('{PROGRESS_TABLE}')")
+    progress = {}
+    if db.fetch_rows(cursor)[0][0]:
+        cursor.execute(f"""
+            SELECT video_id, source_layout, source_frames, converted_frames, chunks, source_bytes,
+                   converted_at IS NOT NULL, reclaimed_bytes
+            FROM {PROGRESS_TABLE}
+        """)
+        progress = {row[0]: row[1:] for row in db.fetch_rows(cursor)}
+    layouts = source_videos(cursor)
+    print(f"📊 {len(layouts)} video(s) with row-layout pose data, {len(progress)} tracked by the migration")
+    for video_id in sorted(set(layouts) | set(progress)):
+        if video_id not in progress:
+            print(f"   - video {video_id:>4} {layouts[video_id]:<8} not started")
+            continue
+        layout, frames, converted, chunks, size, done, reclaimed = progress[video_id]
+        state = ("reclaimed" if reclaimed is not None else "converted") if done else \
+            f"{100 * converted / frames if frames else 0:.0f}%"
+        print(f"   - video {video_id:>4} {layout:<8} {state:<9} {converted}/{frames} frames in {chunks} chunks, "
+              f"source {(size or 0) / 1e6:.2f}MB" + (f", reclaimed {reclaimed / 1e6:.2f}MB" if reclaimed else ""))
+
+def main():
+    parser = argparse.ArgumentParser(description='Migrate stored pose data into pose_frame_chunks, online')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('status', help='Show each video\'s layout and migration progress')
+    run_parser = subparsers.add_parser('run', help='Convert videos, resuming any interrupted run')
+    run_parser.add_argument('video_ids', nargs='*', type=int, help='Videos to convert (default: all)')
+    run_parser.add_argument('--rows-per-second', type=int, default=DEFAULT_ROWS_PER_SECOND,
+                            help=f'Most source rows read or deleted per second, 0 for no limit '
+                                 f'(default: {DEFAULT_ROWS_PER_SECOND})')
+    run_parser.add_argument('--batch-seconds', type=float, default=DEFAULT_BATCH_SECONDS,
+                            help=f'Seconds of video converted per transaction (default: {DEFAULT_BATCH_SECONDS})')
+    run_parser.add_argument('--chunk-seconds', type=float, default=DEFAULT_CHUNK_SECONDS,
+                            help=f'Duration of each chunk row (default: {DEFAULT_CHUNK_SECONDS})')
+    run_parser.add_argument('--reclaim', action='store_true',
+                            help='Delete each converted video\'s old rows (only once readers use the chunks)')
+    run_parser.add_argument('--restart', action='store_true', help='Convert every video again from the start')
+
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'status':
+            with db.get_pool().connection() as conn, conn.cursor() as cursor:
+                print_status(cursor)
+            return 0
+
+        started = time.perf_counter()
+        summary = run(args.video_ids, args.rows_per_second, args.batch_seconds, args.chunk_seconds,
+                      args.reclaim, args.restart)
+        print(f"\n✅ Migrated {summary['videos']} video(s), {summary['frames']} frames in "
+              f"{time.perf_counter() - started:.1f}s: {summary['source_bytes'] / 1e6:.2f}MB of rows → "
+              f"{summary['chunk_bytes'] / 1e6:.2f}MB of chunks"
+              + (f", {summary['reclaimed_bytes'] / 1e6:.2f}MB reclaimed" if args.reclaim else ""))
+    finally:
+        db.close_pool()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
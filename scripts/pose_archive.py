@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Chunked, compressed pose archive with a timestamp seek index
+
+The client asks for pose data a time window at a time
+(PoseDataService.getPoseSequence(videoId, startTime, endTime, limit)),
+but a *-full.json file has to be downloaded and parsed whole to answer
+any window. A pose archive splits a form into fixed-duration chunks so a
+window only touches the chunks that overlap it. It is a directory
+(conventionally <name>.posechunks) holding:
+
+    chunks.bin   the chunks back to back, each a pose_codec body (int16
+                 quantized, delta-encoded, zlib-compressed) of the frames
+                 with timestamps in [k * chunk_seconds, (k + 1) * chunk_seconds)
+    index.json   fps, video_info, keypoint names, the quantization shared
+                 by every chunk, and per chunk its first and last
+                 timestamp, first frame number, frame count, and byte
+                 offset and length in chunks.bin
+
+Reading a window binary-searches the index and reads and decodes only the
+overlapping chunks, so it costs O(window) rather than O(video); over
+HTTP, each chunk is one Range request against chunks.bin.
+
+Usage:
+    python pose_archive.py                                  # every bundled form
+    python pose_archive.py taegeuk-1-full.json --chunk-seconds 2
+    python pose_archive.py taegeuk-1-full.posechunks --window 10 14 --limit 60
+"""
+
+import argparse
+import bisect
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from pose_array import (COLUMNS as ARRAY_COLUMNS, KEYPOINT_NAMES, NUM_KEYPOINTS, OPTIONAL_COLUMNS,
+                        frames_to_arrays, iter_pose_array_frames)
+from pose_codec import VISIBILITY_LEVELS, bundled_pose_files, decode_body, encode_body, quantization_for
+
+FORMAT_NAME = "pose-chunks"
+FORMAT_VERSION = 1
+POSE_ARCHIVE_SUFFIX = ".posechunks"
+DEFAULT_CHUNK_SECONDS = 2.0
+CHUNKS_FILE = "chunks.bin"
+INDEX_FILE = "index.json"
+# Matches the server's /poses/at/:timestamp default
+DEFAULT_TOLERANCE = 0.1
+COLUMNS = ARRAY_COLUMNS + OPTIONAL_COLUMNS
+
+def is_pose_archive_path(path):
+    """True if the path is (or is meant to be) a pose archive directory"""
+    path = Path(path)
+    return path.suffix.lower() == POSE_ARCHIVE_SUFFIX or (path / INDEX_FILE).exists()
+
+def slice_arrays(arrays, selection):
+    """The pose array columns of arrays (any "header" is dropped) indexed by selection"""
+    return {name: arrays[name][selection] for name in COLUMNS if arrays.get(name) is not None}
+
+def _empty_arrays():
+    return {
+        "keypoints": np.empty((0, NUM_KEYPOINTS, 4), dtype=np.float32),
+        "timestamps": np.empty(0, dtype=np.float64),
+        "frame_numbers": np.empty(0, dtype=np.int32),
+        "detected": np.empty(0, dtype=bool)
+    }
+
+def chunk_slices(timestamps, chunk_seconds):
+    """Slices of timestamps (sorted) falling in each [k * chunk_seconds, (k + 1) * chunk_seconds)"""
+    if chunk_seconds <= 0:
+        raise ValueError(f"chunk_seconds must be positive, got {chunk_seconds}")
+    chunk_numbers = np.floor(np.asarray(timestamps, dtype=np.float64) / chunk_seconds).astype(np.int64)
+    boundaries = [0, *(np.flatnonzero(np.diff(chunk_numbers)) + 1), len(chunk_numbers)]
+    return [slice(int(first), int(stop)) for first, stop in zip(boundaries, boundaries[1:]) if stop > first]
+
+def sort_by_timestamp(arrays):
+    return slice_arrays(arrays, np.argsort(arrays["timestamps"], kind='stable'))
+
+def select_window(chunks, start=0.0, end=None, limit=None):
+    """Concatenate the frames of consecutive chunks with start <= timestamp <= end, at most limit of them.
+
+    Chunks are consumed lazily, so with a limit the ones after it are never read.
+    """
+    parts = []
+    remaining = limit
+    for arrays in chunks:
+        timestamps = arrays["timestamps"]
+        selected = timestamps >= start
+        if end is not None:
+            selected &= timestamps <= end
+        part = slice_arrays(arrays, selected)
+        if remaining is not None:
+            part = slice_arrays(part, slice(0, remaining))
+            remaining -= len(part["timestamps"])
+        parts.append(part)
+        if remaining is not None and remaining <= 0:
+            break
+
+    parts = parts or [_empty_arrays()]
+    window = {name: np.concatenate([part[name] for part in parts]) for name in ARRAY_COLUMNS}
+    if any("interpolated" in part for part in parts):
+        window["interpolated"] = np.concatenate([
+            part.get("interpolated", np.zeros(len(part["timestamps"]), dtype=bool)) for part in parts
+        ])
+    return window
+
+def write_pose_archive(path, video_info, arrays, chunk_seconds=DEFAULT_CHUNK_SECONDS):
+    """Write pose array columns as a chunked archive; returns the index"""
+    arrays = sort_by_timestamp(arrays)
+    timestamps = np.asarray(arrays["timestamps"], dtype=np.float64)
+    # One quantization for the whole form, so chunks decode independently
+    quantization = quantization_for(np.asarray(arrays["keypoints"]))
+
+    os.makedirs(path, exist_ok=True)
+    chunks = []
+    offset = 0
+    with open(os.path.join(path, CHUNKS_FILE), 'wb') as f:
+        for chunk in chunk_slices(timestamps, chunk_seconds):
+            body = encode_body(slice_arrays(arrays, chunk), quantization)
+            f.write(body)
+            chunks.append({
+                "start": float(timestamps[chunk.start]),
+                "end": float(timestamps[chunk.stop - 1]),
+                "first_frame": int(arrays["frame_numbers"][chunk.start]),
+                "frames": chunk.stop - chunk.start,
+                "offset": offset,
+                "length": len(body)
+            })
+            offset += len(body)
+
+    index = {
+        "format": FORMAT_NAME,
+        "version": FORMAT_VERSION,
+        "fps": video_info["fps"],
+        "video_info": video_info,
+        "keypoint_names": KEYPOINT_NAMES,
+        "frame_count": int(len(timestamps)),
+        "chunk_seconds": chunk_seconds,
+        "quantization": quantization,
+        "visibility_levels": VISIBILITY_LEVELS,
+        "chunks": chunks
+    }
+    # Index last, so a directory with an index is always complete
+    with open(os.path.join(path, INDEX_FILE), 'w') as f:
+        json.dump(index, f, indent=2)
+    return index
+
+def export_pose_file(source, output=None, chunk_seconds=DEFAULT_CHUNK_SECONDS):
+    """Write a pose file of any supported format as an archive next to it (or at output)"""
+    # Imported here because pose_io depends on this module
+    from pose_io import open_pose_file
+
+    output = output or Path(source).with_suffix(POSE_ARCHIVE_SUFFIX)
+    video_info, frames = open_pose_file(source)
+    index = write_pose_archive(output, video_info, frames_to_arrays(frames), chunk_seconds)
+    return output, index
+
+class PoseArchive:
+    """Read time windows of a pose archive, decoding only the chunks they overlap.
+
+    chunks_read and bytes_read count the chunks fetched so far.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path / INDEX_FILE) as f:
+            self.index = json.load(f)
+        if self.index.get("format") != FORMAT_NAME or self.index.get("version") != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a pose archive")
+        self.chunks = self.index["chunks"]
+        self._ends = [chunk["end"] for chunk in self.chunks]
+        self._file = None
+        self.chunks_read = 0
+        self.bytes_read = 0
+
+    @property
+    def total_bytes(self):
+        return sum(chunk["length"] for chunk in self.chunks)
+
+    def chunk_range(self, start=0.0, end=None):
+        """Indexes of the chunks holding frames with start <= timestamp <= end"""
+        first = bisect.bisect_left(self._ends, start)
+        stop = first
+        while stop < len(self.chunks) and (end is None or self.chunks[stop]["start"] <= end):
+            stop += 1
+        return range(first, stop)
+
+    def read_chunk(self, number):
+        """Pose array columns of one chunk"""
+        chunk = self.chunks[number]
+        if self._file is None:
+            self._file = open(self.path / CHUNKS_FILE, 'rb')
+        self._file.seek(chunk["offset"])
+        data = self._file.read(chunk["length"])
+        self.chunks_read += 1
+        self.bytes_read += len(data)
+        return decode_body(data, chunk["frames"], self.index["quantization"], self.index["visibility_levels"])
+
+    def window_arrays(self, start=0.0, end=None, limit=None):
+        """Pose array columns (with "header") of frames with start <= timestamp <= end, at most limit of them"""
+        chunks = (self.read_chunk(number) for number in self.chunk_range(start, end))
+        return {"header": self.index, **select_window(chunks, start, end, limit)}
+
+    def window(self, start=0.0, end=None, limit=None):
+        """Frame dicts with start <= timestamp <= end, in timestamp order, at most limit of them"""
+        return list(iter_pose_array_frames(self.window_arrays(start, end, limit)))
+
+    def frame_at(self, timestamp, tolerance=DEFAULT_TOLERANCE):
+        """The detected frame nearest timestamp within tolerance, or None"""
+        window = self.window_arrays(timestamp - tolerance, timestamp + tolerance)
+        candidates = np.flatnonzero(window["detected"])
+        if not len(candidates):
+            return None
+        nearest = candidates[np.argmin(np.abs(window["timestamps"][candidates] - timestamp))]
+        frame = slice_arrays(window, slice(nearest, nearest + 1))
+        return next(iter_pose_array_frames({"header": self.index, **frame}))
+
+    def iter_frames(self):
+        """Every frame, a chunk at a time"""
+        for number in range(len(self.chunks)):
+            yield from iter_pose_array_frames({"header": self.index, **self.read_chunk(number)})
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Write pose files as chunked archives, or read a window of one')
+    parser.add_argument('path', nargs='?',
+                        help='Pose file to export, or archive to read with --window (default: export every bundled form)')
+    parser.add_argument('-o', '--output', help='Archive path (default: next to the input, .posechunks)')
+    parser.add_argument('--chunk-seconds', type=float, default=DEFAULT_CHUNK_SECONDS,
+                        help=f'Duration of each chunk (default: {DEFAULT_CHUNK_SECONDS})')
+    parser.add_argument('--window', nargs=2, type=float, metavar=('START', 'END'),
+                        help='Read the frames between START and END seconds from an archive')
+    parser.add_argument('--limit', type=int, help='With --window, the most frames to return')
+
+    args = parser.parse_args()
+
+    if args.window:
+        if not args.path or not is_pose_archive_path(args.path):
+            parser.error("--window needs an archive path")
+        started = time.perf_counter()
+        with PoseArchive(args.path) as archive:
+            frames = archive.window(*args.window, limit=args.limit)
+            elapsed = time.perf_counter() - started
+            print(f"📦 {len(frames)} frames in [{args.window[0]}s, {args.window[1]}s] from "
+                  f"{archive.chunks_read} of {len(archive.chunks)} chunks "
+                  f"({archive.bytes_read / 1e3:.1f}KB of {archive.total_bytes / 1e3:.1f}KB) "
+                  f"in {elapsed * 1000:.1f}ms")
+        return 0
+
+    sources = [args.path] if args.path else bundled_pose_files()
+    if not sources:
+        print("No pose files found")
+        return 1
+    if args.output and len(sources) > 1:
+        parser.error("--output needs a single input")
+    for source in sources:
+        output, index = export_pose_file(source, args.output, args.chunk_seconds)
+        size = sum(chunk["length"] for chunk in index["chunks"])
+        print(f"✅ {source} → {output}: {index['frame_count']} frames in {len(index['chunks'])} "
+              f"chunks of {args.chunk_seconds}s ({size / 1e3:.1f}KB)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
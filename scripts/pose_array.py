@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Columnar float32 pose array format
+
+A pose array is a directory (conventionally named <name>.pose) holding:
+    header.json        fps, video_info, keypoint names and frame count
+    keypoints.npy      float32 [frames, 33, 4] of x, y, z, visibility
+                       (NaN where a keypoint or the whole pose is missing;
+                       float64 in lossless arrays such as pose_cache.py's)
+    timestamps.npy     float64 [frames] timestamp in seconds
+    frame_numbers.npy  int32 [frames] source frame number
+    detected.npy       bool [frames] pose_detected flag
+    interpolated.npy   bool [frames] frames filled in by adaptive sampling
+                       (optional, absent in older arrays)
+
+The .npy files can be opened with np.load(mmap_mode='r'), so loading a
+form only maps the files instead of parsing a JSON tree.
+
+Usage:
+    python pose_array.py taegeuk-1-full.json taegeuk-1-full.pose
+    python pose_array.py taegeuk-1-full.json taegeuk-1-full.pose --lossless
+    python pose_array.py taegeuk-1-full.pose taegeuk-1-full.json
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+from pathlib import Path
+
+import numpy as np
+
+FORMAT_NAME = "pose-array"
+FORMAT_VERSION = 1
+NUM_KEYPOINTS = 33
+POSE_ARRAY_SUFFIX = ".pose"
+COLUMNS = ("keypoints", "timestamps", "frame_numbers", "detected")
+OPTIONAL_COLUMNS = ("interpolated",)
+
+# MediaPipe pose landmark names
+KEYPOINT_NAMES = [
+    "nose", "left_eye_inner", "left_eye", "left_eye_outer",
+    "right_eye_inner", "right_eye", "right_eye_outer",
+    "left_ear", "right_ear", "mouth_left", "mouth_right",
+    "left_shoulder", "right_shoulder", "left_elbow", "right_elbow",
+    "left_wrist", "right_wrist", "left_pinky", "right_pinky",
+    "left_index", "right_index", "left_thumb", "right_thumb",
+    "left_hip", "right_hip", "left_knee", "right_knee",
+    "left_ankle", "right_ankle", "left_heel", "right_heel",
+    "left_foot_index", "right_foot_index"
+]
+
+def is_pose_array_path(path):
+    """True if the path is (or is meant to be) a pose array directory"""
+    path = Path(path)
+    return path.suffix.lower() == POSE_ARRAY_SUFFIX or (path / "header.json").exists()
+
+def frame_to_row(frame_data, dtype=np.float32):
+    """Convert one frame dict to a [33, 4] keypoint array, float32 by default"""
+    row = np.full((NUM_KEYPOINTS, 4), np.nan, dtype=dtype)
+    for kp in frame_data.get('keypoints') or []:
+        kp_id = kp.get('id')
+        if kp_id is None or not 0 <= kp_id < NUM_KEYPOINTS:
+            continue
+        row[kp_id] = (
+            kp['x'],
+            kp['y'],
+            kp['z'] if kp.get('z') is not None else np.nan,
+            kp['visibility'] if kp.get('visibility') is not None else np.nan
+        )
+    return row
+
+def row_to_keypoints(row, names=KEYPOINT_NAMES):
+    """Convert a [33, 4] keypoint array back to keypoint dicts, skipping missing ones"""
+    keypoints = []
+    for kp_id in range(row.shape[0]):
+        x, y, z, visibility = (float(v) for v in row[kp_id])
+        if np.isnan(x) or np.isnan(y):
+            continue
+        keypoints.append({
+            "id": kp_id,
+            "name": names[kp_id] if kp_id < len(names) else f"landmark_{kp_id}",
+            "x": x,
+            "y": y,
+            "z": None if np.isnan(z) else z,
+            "visibility": None if np.isnan(visibility) else visibility
+        })
+    return keypoints
+
+class PoseArrayWriter:
+    """Collect frames as compact arrays and write a pose array on close.
+
+    Has the same write_frame() interface as pose_io.NdjsonPoseWriter so it
+    can be used as an extraction sink. Each frame costs 528 bytes of
+    float32 instead of 33 keypoint dicts; dtype=np.float64 keeps the
+    coordinates exactly, at twice the size.
+    """
+
+    def __init__(self, path, video_info, dtype=np.float32):
+        self.path = str(path)
+        self.video_info = video_info
+        self.dtype = dtype
+        self.frame_count = 0
+        self._keypoints = []
+        self._timestamps = []
+        self._frame_numbers = []
+        self._detected = []
+        self._interpolated = []
+
+    def write_frame(self, frame_data):
+        self._keypoints.append(frame_to_row(frame_data, self.dtype))
+        self._timestamps.append(frame_data['timestamp'])
+        self._frame_numbers.append(frame_data['frame_number'])
+        self._detected.append(bool(frame_data['pose_detected']))
+        self._interpolated.append(bool(frame_data.get('interpolated')))
+        self.frame_count += 1
+
+    def to_arrays(self):
+        """The frames written so far as pose array columns"""
+        if self._keypoints:
+            keypoints = np.stack(self._keypoints)
+        else:
+            keypoints = np.empty((0, NUM_KEYPOINTS, 4), dtype=self.dtype)
+        return {
+            "keypoints": keypoints,
+            "timestamps": np.asarray(self._timestamps, dtype=np.float64),
+            "frame_numbers": np.asarray(self._frame_numbers, dtype=np.int32),
+            "detected": np.asarray(self._detected, dtype=bool),
+            "interpolated": np.asarray(self._interpolated, dtype=bool)
+        }
+
+    def close(self):
+        write_pose_array(self.path, self.video_info, self.to_arrays())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+
+class PoseArraySpoolWriter:
+    """Write a pose array frame by frame, appending each column to disk as frames arrive.
+
+    Same interface as PoseArrayWriter, but memory stays flat however long
+    the video. The columns are spooled to <name>.npy.part files, and
+    close() turns them into .npy files and writes the header; a directory
+    left by a failed run has no header, so it is never read as an array.
+    """
+
+    def __init__(self, path, video_info, dtype=np.float32):
+        self.path = str(path)
+        self.video_info = video_info
+        self.dtypes = {"keypoints": np.dtype(dtype), "timestamps": np.dtype(np.float64),
+                       "frame_numbers": np.dtype(np.int32), "detected": np.dtype(bool),
+                       "interpolated": np.dtype(bool)}
+        self.frame_count = 0
+        self._any_interpolated = False
+        os.makedirs(self.path, exist_ok=True)
+        self._parts = {name: open(os.path.join(self.path, f"{name}.npy.part"), 'wb') for name in self.dtypes}
+
+    def write_frame(self, frame_data):
+        interpolated = bool(frame_data.get('interpolated'))
+        values = {
+            "keypoints": frame_to_row(frame_data, self.dtypes["keypoints"]),
+            "timestamps": frame_data['timestamp'],
+            "frame_numbers": frame_data['frame_number'],
+            "detected": bool(frame_data['pose_detected']),
+            "interpolated": interpolated
+        }
+        for name, part in self._parts.items():
+            part.write(np.asarray(values[name], dtype=self.dtypes[name]).tobytes())
+        self._any_interpolated = self._any_interpolated or interpolated
+        self.frame_count += 1
+
+    def close(self):
+        for part in self._parts.values():
+            part.close()
+        for name, dtype in self.dtypes.items():
+            part_path = os.path.join(self.path, f"{name}.npy.part")
+            column_path = os.path.join(self.path, f"{name}.npy")
+            if name in OPTIONAL_COLUMNS and not self._any_interpolated:
+                os.remove(part_path)
+                if os.path.exists(column_path):
+                    # Left over from an earlier array written to the same directory
+                    os.remove(column_path)
+                continue
+            shape = (self.frame_count, NUM_KEYPOINTS, 4) if name == "keypoints" else (self.frame_count,)
+            with open(column_path, 'wb') as f, open(part_path, 'rb') as part:
+                np.lib.format.write_array_header_1_0(f, {
+                    "descr": np.lib.format.dtype_to_descr(dtype), "fortran_order": False, "shape": shape
+                })
+                shutil.copyfileobj(part, f)
+            os.remove(part_path)
+        _write_header(self.path, self.video_info, self.frame_count)
+
+    def discard(self):
+        """Close the spool files without writing the array"""
+        for part in self._parts.values():
+            part.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+def frames_to_arrays(frames):
+    """Convert an iterable of frame dicts to the pose array columns"""
+    writer = PoseArrayWriter(None, None)
+    for frame in frames:
+        writer.write_frame(frame)
+    return writer.to_arrays()
+
+def write_pose_array(path, video_info, arrays):
+    """Write pose array columns and header to a directory"""
+    os.makedirs(path, exist_ok=True)
+    for name in COLUMNS:
+        np.save(os.path.join(path, f"{name}.npy"), arrays[name])
+    for name in OPTIONAL_COLUMNS:
+        column_path = os.path.join(path, f"{name}.npy")
+        if name in arrays and arrays[name].any():
+            np.save(column_path, arrays[name])
+        elif os.path.exists(column_path):
+            # Left over from an earlier array written to the same directory
+            os.remove(column_path)
+    _write_header(path, video_info, len(arrays["timestamps"]))
+
+def _write_header(path, video_info, frame_count):
+    # Written last, so a directory with a header is always complete
+    header = {
+        "format": FORMAT_NAME,
+        "version": FORMAT_VERSION,
+        "fps": video_info["fps"],
+        "video_info": video_info,
+        "keypoint_names": KEYPOINT_NAMES,
+        "frame_count": int(frame_count)
+    }
+    with open(os.path.join(path, "header.json"), 'w') as f:
+        json.dump(header, f, indent=2)
+
+def read_pose_array(path, mmap=True):
+    """Open a pose array, memory-mapping the columns by default.
+
+    Returns a dict with "header" plus the keypoints, timestamps,
+    frame_numbers and detected arrays, and interpolated if present.
+    """
+    with open(os.path.join(path, "header.json")) as f:
+        header = json.load(f)
+    if header.get("format") != FORMAT_NAME:
+        raise ValueError(f"{path} is not a pose array")
+
+    mmap_mode = 'r' if mmap else None
+    pose_array = {"header": header}
+    for name in COLUMNS:
+        pose_array[name] = np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode)
+    for name in OPTIONAL_COLUMNS:
+        column_path = os.path.join(path, f"{name}.npy")
+        if os.path.exists(column_path):
+            pose_array[name] = np.load(column_path, mmap_mode=mmap_mode)
+    return pose_array
+
+def iter_pose_array_frames(pose_array):
+    """Yield frames of an opened pose array in the standard dict format"""
+    names = pose_array["header"]["keypoint_names"]
+    interpolated = pose_array.get("interpolated")
+    for i in range(len(pose_array["timestamps"])):
+        detected = bool(pose_array["detected"][i])
+        frame_data = {
+            "frame_number": int(pose_array["frame_numbers"][i]),
+            "timestamp": float(pose_array["timestamps"][i]),
+            "pose_detected": detected,
+            "keypoints": row_to_keypoints(pose_array["keypoints"][i], names) if detected else []
+        }
+        if interpolated is not None and interpolated[i]:
+            frame_data["interpolated"] = True
+        yield frame_data
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert pose data between JSON/NDJSON and pose arrays')
+    parser.add_argument('input', help='Input .json, .ndjson or .pose path')
+    parser.add_argument('output', help='Output .json, .ndjson or .pose path')
+    parser.add_argument('--lossless', action='store_true',
+                        help='Store float64 keypoints, so the uploaders read the array in place of the JSON')
+
+    args = parser.parse_args()
+
+    # Imported here because pose_io depends on this module
+    from pose_io import NdjsonPoseWriter, is_ndjson_path, open_pose_file
+
+    video_info, frames = open_pose_file(args.input)
+
+    if is_pose_array_path(args.output):
+        with PoseArrayWriter(args.output, video_info, np.float64 if args.lossless else np.float32) as writer:
+            for frame in frames:
+                writer.write_frame(frame)
+    elif is_ndjson_path(args.output):
+        with NdjsonPoseWriter(args.output, video_info) as writer:
+            for frame in frames:
+                writer.write_frame(frame)
+    else:
+        with open(args.output, 'w') as f:
+            json.dump({"video_info": video_info, "frames": list(frames)}, f, indent=2)
+
+    print(f"Converted {args.input} → {args.output}")
+
+if __name__ == "__main__":
+    sys.exit(main())
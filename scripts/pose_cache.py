@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Content-addressed cache of pose extraction results
+
+Entries are keyed by the SHA-256 of the video file's contents plus the
+extraction settings (detection/tracking confidence, model complexity,
+mediapipe version, ...), so re-extracting an unchanged video with the same
+settings is a cache hit no matter what the file is called. Each entry is a
+pose array (see pose_array.py) with an extra meta.json. Its keypoints are
+float64, so a hit returns exactly the coordinates a miss produced. The
+cache is kept under a size cap by evicting the least recently used entries.
+
+Usage:
+    python pose_cache.py list
+    python pose_cache.py prune --max-size 500M
+    python pose_cache.py prune --all
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from pose_array import PoseArraySpoolWriter, read_pose_array
+
+# 2: float64 keypoints (version 1 entries were float32)
+CACHE_FORMAT_VERSION = 2
+DEFAULT_CACHE_DIR = Path.home() / '.cache' / 'coacht' / 'pose-extraction'
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+HASH_CHUNK_SIZE = 1024 * 1024
+# Unfinished entries untouched for this long were left by a process that died
+STALE_TMP_SECONDS = 24 * 3600
+
+def get_cache_dir(cache_dir=None):
+    """Cache directory from the argument, POSE_CACHE_DIR, or the default"""
+    return Path(cache_dir or os.environ.get('POSE_CACHE_DIR') or DEFAULT_CACHE_DIR)
+
+def get_max_bytes(max_bytes=None):
+    """Size cap from the argument, POSE_CACHE_MAX_SIZE, or the default"""
+    if max_bytes is not None:
+        return max_bytes
+    if os.environ.get('POSE_CACHE_MAX_SIZE'):
+        return parse_size(os.environ['POSE_CACHE_MAX_SIZE'])
+    return DEFAULT_MAX_BYTES
+
+def parse_size(value):
+    """Parse sizes like 500M, 2G or 1048576 into bytes"""
+    value = str(value).strip().upper().rstrip('B')
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
+def format_size(num_bytes):
+    """Human readable byte count"""
+    for unit in ('B', 'KB', 'MB'):
+        if num_bytes < 1024:
+            return f"{num_bytes:.1f}{unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:.1f}GB"
+
+def hash_file(path):
+    """SHA-256 of a file's contents, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def cache_key(video_path, settings):
+    """Cache key for a video's contents plus the settings that affect extraction"""
+    key_data = {
+        "cache_format": CACHE_FORMAT_VERSION,
+        "video_sha256": hash_file(video_path),
+        "settings": settings
+    }
+    encoded = json.dumps(key_data, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+def _entry_path(cache_dir, key):
+    return get_cache_dir(cache_dir) / f"{key}.pose"
+
+def _entry_size(path):
+    return sum(f.stat().st_size for f in Path(path).iterdir() if f.is_file())
+
+def lookup(key, cache_dir=None):
+    """Return the cached pose array for a key, or None on a miss.
+
+    A hit refreshes the entry's last-used time for LRU eviction.
+    """
+    path = _entry_path(cache_dir, key)
+    meta_path = path / 'meta.json'
+    if not meta_path.exists():
+        return None
+
+    os.utime(meta_path)
+    return read_pose_array(path)
+
+class CacheEntryWriter:
+    """Write a cache entry frame by frame, e.g. as an extraction sink alongside the output file.
+
+    Frames go straight to disk (see pose_array.PoseArraySpoolWriter), so
+    caching a streamed extraction keeps its memory flat. close() puts
+    the entry in place and prunes the cache to its size cap; leaving the
+    with block on an exception discards it instead. The entry is written
+    to a temporary directory and renamed into place, so concurrent
+    readers never see a partial entry.
+    """
+
+    def __init__(self, key, video_info, meta=None, cache_dir=None, max_bytes=None):
+        self.key = key
+        self.meta = meta
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.path = _entry_path(cache_dir, key)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._tmp_path = self.path.with_name(f"{self.path.name}.tmp-{os.getpid()}")
+        if self._tmp_path.exists():
+            shutil.rmtree(self._tmp_path)
+        self._writer = PoseArraySpoolWriter(self._tmp_path, video_info, dtype=np.float64)
+        self._closed = False
+
+    @property
+    def frame_count(self):
+        return self._writer.frame_count
+
+    def write_frame(self, frame_data):
+        self._writer.write_frame(frame_data)
+
+    def close(self):
+        if self._closed:
+            return self.path
+        self._closed = True
+        self._writer.close()
+        with open(self._tmp_path / 'meta.json', 'w') as f:
+            json.dump({
+                "key": self.key,
+                "created_at": time.time(),
+                "frame_count": self.frame_count,
+                **(self.meta or {})
+            }, f, indent=2)
+
+        try:
+            os.rename(self._tmp_path, self.path)
+        except OSError:
+            # Another process stored the same entry first
+            shutil.rmtree(self._tmp_path, ignore_errors=True)
+
+        prune(max_bytes=get_max_bytes(self.max_bytes), cache_dir=self.cache_dir)
+        return self.path
+
+    def __enter__(self):
+        return self
+
+    def discard(self):
+        if not self._closed:
+            self._closed = True
+            self._writer.discard()
+            shutil.rmtree(self._tmp_path, ignore_errors=True)
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+def store(key, video_info, frames, meta=None, cache_dir=None, max_bytes=None):
+    """Write frames to the cache under key, then prune the cache to its size cap (see CacheEntryWriter)"""
+    with CacheEntryWriter(key, video_info, meta, cache_dir, max_bytes) as writer:
+        for frame in frames:
+            writer.write_frame(frame)
+    return writer.path
+
+def list_entries(cache_dir=None):
+    """Cache entries, most recently used first"""
+    root = get_cache_dir(cache_dir)
+    if not root.exists():
+        return []
+
+    entries = []
+    for path in root.glob('*.pose'):
+        meta_path = path / 'meta.json'
+        if not meta_path.exists():
+            continue
+        with open(meta_path) as f:
+            meta = json.load(f)
+        entries.append({
+            "path": path,
+            "key": path.stem,
+            "size": _entry_size(path),
+            "last_used": meta_path.stat().st_mtime,
+            "meta": meta
+        })
+    entries.sort(key=lambda entry: entry["last_used"], reverse=True)
+    return entries
+
+def _remove_stale_tmp(cache_dir=None):
+    root = get_cache_dir(cache_dir)
+    for path in root.glob('*.pose.tmp-*') if root.exists() else []:
+        last_written = max((f.stat().st_mtime for f in path.iterdir()), default=path.stat().st_mtime)
+        if time.time() - last_written > STALE_TMP_SECONDS:
+            shutil.rmtree(path, ignore_errors=True)
+
+def prune(max_bytes=None, cache_dir=None):
+    """Evict least recently used entries until the cache fits in max_bytes.
+
+    Also removes unfinished entries that killed processes left behind.
+    Returns the list of evicted entries.
+    """
+    _remove_stale_tmp(cache_dir)
+    max_bytes = get_max_bytes(max_bytes)
+    entries = list_entries(cache_dir)
+    total = sum(entry["size"] for entry in entries)
+
+    evicted = []
+    while entries and total > max_bytes:
+        entry = entries.pop()
+        shutil.rmtree(entry["path"], ignore_errors=True)
+        total -= entry["size"]
+        evicted.append(entry)
+    return evicted
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect and prune the pose extraction cache')
+    parser.add_argument('--cache-dir', help=f'Cache directory (default: $POSE_CACHE_DIR or {DEFAULT_CACHE_DIR})')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('list', help='List cached extractions, most recently used first')
+
+    prune_parser = subparsers.add_parser('prune', help='Evict least recently used entries')
+    prune_parser.add_argument('--max-size', type=parse_size,
+                              help='Size to prune down to, e.g. 500M (default: $POSE_CACHE_MAX_SIZE or 2G)')
+    prune_parser.add_argument('--all', action='store_true', help='Remove every entry')
+
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        entries = list_entries(args.cache_dir)
+        print(f"📦 {len(entries)} cached extractions in {get_cache_dir(args.cache_dir)}")
+        for entry in entries:
+            meta = entry["meta"]
+            last_used = time.strftime('%Y-%m-%d %H:%M', time.localtime(entry["last_used"]))
+            print(f"   - {entry['key'][:12]}  {format_size(entry['size']):>8}  {last_used}  "
+                  f"{meta.get('video_filename', '?')} ({meta.get('frame_count', '?')} frames)")
+        print(f"📊 Total: {format_size(sum(entry['size'] for entry in entries))}")
+    else:
+        max_bytes = 0 if args.all else args.max_size
+        evicted = prune(max_bytes=max_bytes, cache_dir=args.cache_dir)
+        freed = sum(entry["size"] for entry in evicted)
+        print(f"🧹 Evicted {len(evicted)} entries, freed {format_size(freed)}")
+
+if __name__ == "__main__":
+    sys.exit(main())
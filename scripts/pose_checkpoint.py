@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Checkpoints for long pose extractions
+
+A checkpoint is a directory next to the output (<output>.ckpt) holding:
+    frames.ndjson  every frame processed so far, one compact JSON per line
+    state.json     the next frame to process, the byte length of
+                   frames.ndjson at that point, and a fingerprint of the
+                   video and extraction settings
+
+state.json is only rewritten after frames.ndjson has been flushed to disk,
+so after a crash the checkpoint always describes a consistent prefix of
+the extraction. Resuming truncates frames.ndjson back to that prefix.
+
+MediaPipe's tracking state cannot be saved, but after a frame with no pose
+detected the tracker starts over exactly like a fresh Pose instance. The
+state therefore also records the last such reset point; resuming from it
+reproduces the landmark coordinates of an uninterrupted run exactly, at
+the cost of replaying the frames since then. Visibility scores are
+low-pass filtered across that reset, so they start out slightly different
+and converge back within a few seconds of video.
+"""
+
+import json
+import os
+import shutil
+from pathlib import Path
+
+DEFAULT_CHECKPOINT_INTERVAL = 300
+DEFAULT_MAX_REPLAY_FRAMES = 900
+
+def checkpoint_path(output_path):
+    """Checkpoint directory for an output path"""
+    return Path(f"{output_path}.ckpt")
+
+def video_fingerprint(video_path, settings):
+    """Identify the video and settings a checkpoint was made with"""
+    stat = os.stat(video_path)
+    return {
+        "filename": os.path.basename(video_path),
+        "size": stat.st_size,
+        "mtime": int(stat.st_mtime),
+        "settings": settings
+    }
+
+class ExtractionCheckpoint:
+    """Append processed frames to a checkpoint and periodically record progress.
+
+    Use as an extraction sink via write_frame(); call start() or resume()
+    first and finish() once extraction completes.
+    """
+
+    def __init__(self, path, fingerprint, interval=DEFAULT_CHECKPOINT_INTERVAL):
+        self.path = Path(path)
+        self.fingerprint = fingerprint
+        self.interval = interval
+        self.next_frame = 0
+        self.frame_count = 0
+        self._frames_path = self.path / 'frames.ndjson'
+        self._state_path = self.path / 'state.json'
+        self._file = None
+        self._since_save = 0
+        # (next frame, frames.ndjson bytes, frame count) right after the last
+        # frame without a detected pose
+        self._reset_point = (0, 0, 0)
+
+    def _load_state(self):
+        if not self._state_path.exists():
+            return None
+        with open(self._state_path) as f:
+            return json.load(f)
+
+    def _save_state(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        state = {
+            "fingerprint": self.fingerprint,
+            "next_frame": self.next_frame,
+            "frame_count": self.frame_count,
+            "frames_bytes": self._file.tell(),
+            "reset_point": list(self._reset_point)
+        }
+        tmp_path = self._state_path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, self._state_path)
+        self._since_save = 0
+
+    def start(self, first_frame=0):
+        """Start a fresh checkpoint at first_frame, discarding any previous one"""
+        self.remove()
+        self.path.mkdir(parents=True)
+        self._file = open(self._frames_path, 'w')
+        # A fresh Pose instance starts there, so it is a reset point too
+        self.next_frame = first_frame
+        self._reset_point = (first_frame, 0, 0)
+        self._save_state()
+        return first_frame
+
+    def resume(self, max_replay=DEFAULT_MAX_REPLAY_FRAMES, first_frame=0):
+        """Reopen an existing checkpoint and return (next frame, exact).
+
+        If the last tracker reset point is within max_replay frames of the
+        checkpoint, frames after it are discarded and exact is True: a fresh
+        Pose instance started there reproduces the uninterrupted landmarks.
+        Otherwise the checkpoint is resumed as saved and exact is False.
+
+        Raises ValueError if the checkpoint was made from a different video
+        or with different settings. Starts fresh at first_frame if there is
+        no checkpoint.
+        """
+        state = self._load_state()
+        if state is None:
+            return self.start(first_frame), True
+        if state["fingerprint"] != self.fingerprint:
+            raise ValueError(f"Checkpoint {self.path} was made from a different video or settings; "
+                             f"remove it or run without --resume")
+
+        self._reset_point = tuple(state["reset_point"])
+        reset_frame, reset_bytes, reset_frame_count = self._reset_point
+        exact = state["next_frame"] - reset_frame <= max_replay
+        if exact:
+            self.next_frame, frames_bytes, self.frame_count = self._reset_point
+        else:
+            self.next_frame = state["next_frame"]
+            self.frame_count = state["frame_count"]
+            frames_bytes = state["frames_bytes"]
+
+        # Drop any frames written after the resume point
+        self._file = open(self._frames_path, 'r+')
+        self._file.truncate(frames_bytes)
+        self._file.seek(frames_bytes)
+        return self.next_frame, exact
+
+    def write_frame(self, frame_data):
+        self._file.write(json.dumps(frame_data, separators=(',', ':')))
+        self._file.write('\n')
+        self.next_frame = frame_data['frame_number'] + 1
+        self.frame_count += 1
+        if not frame_data['pose_detected'] and not frame_data.get('interpolated'):
+            self._reset_point = (self.next_frame, self._file.tell(), self.frame_count)
+        self._since_save += 1
+        if self.interval and self._since_save >= self.interval:
+            self._save_state()
+
+    def finish(self):
+        """Record the final state and close the frames file"""
+        if self._file and not self._file.closed:
+            self._save_state()
+            self._file.close()
+
+    def iter_frames(self):
+        """Yield the checkpointed frames in order"""
+        with open(self._frames_path) as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def remove(self):
+        if self._file and not self._file.closed:
+            self._file.close()
+        if self.path.exists():
+            shutil.rmtree(self.path)
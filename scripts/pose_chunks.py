@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+Packed per-chunk storage of pose data in pose_frame_chunks
+
+The rows layout stores 33 pose_keypoints rows per frame, each with
+DECIMAL coordinates, a keypoint name and a timestamp: hundreds of
+thousands of rows per form, which the API then has to json_agg back
+together on every request. pose_frame_chunks holds about a second of
+frames per row instead, keyed by (video_id, chunk_start), with the
+frames packed little-endian into bytea columns:
+
+    frame_numbers  int32 [frames]
+    timestamps     float64 [frames]
+    flags          uint8 [frames]: 1 pose_detected, 2 interpolated
+    keypoints      float32 [frames, 33, 4] of x, y, z, visibility
+                   (NaN where a keypoint or the whole pose is missing)
+
+chunk_start and chunk_end are the timestamps of a chunk's first and last
+frame, so a time window is one index range scan returning a handful of
+rows. keypoints is stored uncompressed (STORAGE EXTERNAL): float32 noise
+barely compresses, and skipping the attempt keeps reads cheap.
+
+write_video_chunks() and read_chunk_window() are the write and read
+helpers; read_row_frames() reads a video back out of the row tables.
+
+Usage:
+    python pose_chunks.py load                      # every form in forms.json
+    python pose_chunks.py load taegeuk-1 taegeuk-2
+    python pose_chunks.py load --from-rows          # every video with pose rows
+    python pose_chunks.py benchmark 12 --windows 2 30 --repeat 50
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+
+import numpy as np
+import psycopg2
+import psycopg2.extras
+
+import db
+from load_forms import MANIFEST_PATH, load_manifest, select_forms
+from pose_archive import chunk_slices, select_window, slice_arrays, sort_by_timestamp
+from pose_array import KEYPOINT_NAMES, NUM_KEYPOINTS, frame_to_row, frames_to_arrays, iter_pose_array_frames
+from pose_frame_json import API_WINDOW_SQL, api_sql
+from pose_ingest import find_or_create_video, has_column
+from pose_io import open_pose_file, resolve_pose_file
+from pose_partitions import is_partitioned, video_partitions
+
+CHUNK_TABLE = 'pose_frame_chunks'
+DEFAULT_CHUNK_SECONDS = 1.0
+FLAG_DETECTED = 1
+FLAG_INTERPOLATED = 2
+CHUNK_COLUMNS = ('video_id', 'chunk_start', 'chunk_end', 'frame_count', 'fps',
+                 'frame_numbers', 'timestamps', 'flags', 'keypoints')
+DEFAULT_WINDOWS = (2.0, 30.0)
+DEFAULT_REPEAT = 20
+
+POSE_CHUNKS_SQL = """
+-- About a second of frames per row, packed little-endian (see scripts/pose_chunks.py)
+CREATE TABLE IF NOT EXISTS pose_frame_chunks (
+    video_id INTEGER NOT NULL REFERENCES martial_arts_videos(id) ON DELETE CASCADE,
+    chunk_start DOUBLE PRECISION NOT NULL,
+    chunk_end DOUBLE PRECISION NOT NULL,
+    frame_count INTEGER NOT NULL,
+    fps DECIMAL(8,2),
+    frame_numbers BYTEA NOT NULL,
+    timestamps BYTEA NOT NULL,
+    flags BYTEA NOT NULL,
+    keypoints BYTEA NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (video_id, chunk_start)
+);
+ALTER TABLE pose_frame_chunks ALTER COLUMN keypoints SET STORAGE EXTERNAL;
+"""
+
+def ensure_chunk_table(cursor):
+    cursor.execute("SELECT to_regclass(%s)", (CHUNK_TABLE,))
+    if db.fetch_rows(cursor)[0][0] is None:
+        cursor.execute(POSE_CHUNKS_SQL)
+
+def pack_chunk(arrays):
+    """The (frame_numbers, timestamps, flags, keypoints) bytea values of pose array columns"""
+    flags = np.asarray(arrays["detected"], dtype=np.uint8) * FLAG_DETECTED
+    if arrays.get("interpolated") is not None:
+        flags |= np.asarray(arrays["interpolated"], dtype=np.uint8) * FLAG_INTERPOLATED
+    return (
+        np.asarray(arrays["frame_numbers"], dtype='<i4').tobytes(),
+        np.asarray(arrays["timestamps"], dtype='<f8').tobytes(),
+        flags.tobytes(),
+        np.asarray(arrays["keypoints"], dtype='<f4').tobytes(),
+    )
+
+def unpack_chunk(frame_count, frame_numbers, timestamps, flags, keypoints):
+    """Pose array columns of one pose_frame_chunks row"""
+    flags = np.frombuffer(flags, dtype=np.uint8)
+    arrays = {
+        "keypoints": np.frombuffer(keypoints, dtype='<f4').reshape(frame_count, NUM_KEYPOINTS, 4),
+        "timestamps": np.frombuffer(timestamps, dtype='<f8'),
+        "frame_numbers": np.frombuffer(frame_numbers, dtype='<i4'),
+        "detected": (flags & FLAG_DETECTED).astype(bool),
+    }
+    interpolated = (flags & FLAG_INTERPOLATED).astype(bool)
+    if interpolated.any():
+        arrays["interpolated"] = interpolated
+    return arrays
+
+def insert_chunks(cursor, video_id, arrays, fps, chunk_seconds=DEFAULT_CHUNK_SECONDS):
+    """Write pose array columns as pose_frame_chunks rows, replacing chunks with the same start.
+
+    Chunks cover [k * chunk_seconds, (k + 1) * chunk_seconds), so frames
+    written in batches split on those boundaries give the same rows as
+    one write. Returns the number of chunks.
+    """
+    arrays = sort_by_timestamp(arrays)
+    timestamps = arrays["timestamps"]
+    rows = []
+    for chunk in chunk_slices(timestamps, chunk_seconds):
+        packed = pack_chunk(slice_arrays(arrays, chunk))
+        rows.append((video_id, float(timestamps[chunk.start]), float(timestamps[chunk.stop - 1]),
+                     chunk.stop - chunk.start, fps, *map(psycopg2.Binary, packed)))
+    updates = ', '.join(f"{column} = EXCLUDED.{column}" for column in CHUNK_COLUMNS[2:])
+    psycopg2.extras.execute_values(cursor, f"""
+        INSERT INTO {CHUNK_TABLE} ({', '.join(CHUNK_COLUMNS)}) VALUES %s
+        ON CONFLICT (video_id, chunk_start) DO UPDATE SET {updates}
+    """, rows, page_size=50)
+    return len(rows)
+
+def write_video_chunks(cursor, video_id, arrays, fps, chunk_seconds=DEFAULT_CHUNK_SECONDS):
+    """Replace a video's pose_frame_chunks rows with pose array columns; returns the number of chunks"""
+    cursor.execute(f"DELETE FROM {CHUNK_TABLE} WHERE video_id = %s", (video_id,))
+    return insert_chunks(cursor, video_id, arrays, fps, chunk_seconds)
+
+def iter_window_chunks(cursor, video_id, start=0.0, end=None):
+    """Pose array columns of each chunk overlapping [start, end], in order, decoded as they are consumed"""
+    before_end = "AND chunk_start <= %s" if end is not None else ""
+    cursor.execute(f"""
+        SELECT frame_count, frame_numbers, timestamps, flags, keypoints FROM {CHUNK_TABLE}
+        WHERE video_id = %s {before_end} AND chunk_end >= %s
+        ORDER BY chunk_start
+    """, (video_id, end, start) if end is not None else (video_id, start))
+    for frame_count, *columns in db.fetch_rows(cursor):
+        yield unpack_chunk(frame_count, *columns)
+
+def read_chunk_window(cursor, video_id, start=0.0, end=None, limit=None):
+    """Pose array columns (with a "header" of keypoint names) of frames with start <= timestamp <= end"""
+    window = select_window(iter_window_chunks(cursor, video_id, start, end), start, end, limit)
+    return {"header": {"keypoint_names": KEYPOINT_NAMES}, **window}
+
+def read_chunk_frames(cursor, video_id, start=0.0, end=None, limit=None):
+    """Frame dicts with start <= timestamp <= end, in timestamp order, at most limit of them"""
+    return list(iter_pose_array_frames(read_chunk_window(cursor, video_id, start, end, limit)))
+
+def read_row_frames(cursor, video_id, start=None, stop=None):
+    """A video's frames from pose_sequences and pose_keypoints (or keypoints_json) as (fps, pose array columns).
+
+    With start and stop, only the frames with start <= timestamp < stop.
+    """
+    json_column = "keypoints_json" if has_column(cursor, 'pose_sequences', 'keypoints_json') else "NULL"
+    # Per-frame rows only: whole-video rows (pose_data) have no frame number
+    in_range = "s.video_id = %s AND s.frame_number IS NOT NULL"
+    params = (video_id,)
+    if start is not None:
+        in_range += " AND s.timestamp_seconds >= %s AND s.timestamp_seconds < %s"
+        params += (start, stop)
+    cursor.execute(f"""
+        SELECT id, frame_number, timestamp_seconds::float8, pose_detected, fps::float8, {json_column}
+        FROM pose_sequences s WHERE {in_range} ORDER BY frame_number
+    """, params)
+    sequences = db.fetch_rows(cursor)
+    keypoints = np.full((len(sequences), NUM_KEYPOINTS, 4), np.nan, dtype=np.float32)
+    for index, sequence in enumerate(sequences):
+        if sequence[5]:
+            keypoints[index] = frame_to_row({"keypoints": json.loads(sequence[5])})
+
+    same_video = "AND k.video_id = s.video_id" if is_partitioned(cursor) else ""
+    cursor.execute(f"""
+        SELECT k.sequence_id, k.keypoint_id, k.x::float8, k.y::float8, k.z::float8, k.visibility::float8
+        FROM pose_keypoints k JOIN pose_sequences s ON s.id = k.sequence_id {same_video}
+        WHERE {in_range} AND k.keypoint_id >= 0 AND k.keypoint_id < %s
+    """, params + (NUM_KEYPOINTS,))
+    keypoint_rows = db.fetch_rows(cursor)
+    if keypoint_rows:
+        values = np.array(keypoint_rows, dtype=np.float64)
+        sequence_ids = np.array([sequence[0] for sequence in sequences])
+        order = np.argsort(sequence_ids)
+        frames = order[np.searchsorted(sequence_ids, values[:, 0].astype(np.int64), sorter=order)]
+        keypoints[frames, values[:, 1].astype(np.int64)] = values[:, 2:]
+
+    fps = next((sequence[4] for sequence in sequences if sequence[4]), None)
+    return fps, {
+        "keypoints": keypoints,
+        "timestamps": np.array([sequence[2] for sequence in sequences], dtype=np.float64),
+        "frame_numbers": np.array([sequence[1] for sequence in sequences], dtype=np.int32),
+        "detected": np.array([bool(sequence[3]) for sequence in sequences], dtype=bool),
+    }
+
+def load_form_chunks(conn, form, chunk_seconds=DEFAULT_CHUNK_SECONDS, lossy=False):
+    """Fill pose_frame_chunks for one manifest form from its pose file; returns (video_id, frames, chunks)
+
+    lossy is passed on to pose_io.resolve_pose_file().
+    """
+    video_info, frames = open_pose_file(resolve_pose_file(form["pose_file"], lossy))
+    arrays = frames_to_arrays(frames)
+    with conn.cursor() as cursor:
+        ensure_chunk_table(cursor)
+        video_id, _ = find_or_create_video(cursor, form["name"], form.get("description"), form["category"],
+                                           form["difficulty"], video_info.get("duration_seconds"),
+                                           form.get("video"), form.get("match"))
+        chunks = write_video_chunks(cursor, video_id, arrays, video_info.get("fps") or 30.0, chunk_seconds)
+    conn.commit()
+    return video_id, len(arrays["timestamps"]), chunks
+
+def load_row_chunks(conn, video_id, chunk_seconds=DEFAULT_CHUNK_SECONDS):
+    """Fill pose_frame_chunks for a video from its pose rows; returns (frames, chunks)"""
+    with conn.cursor() as cursor:
+        ensure_chunk_table(cursor)
+        fps, arrays = read_row_frames(cursor, video_id)
+        chunks = write_video_chunks(cursor, video_id, arrays, fps, chunk_seconds)
+    conn.commit()
+    return len(arrays["timestamps"]), chunks
+
+def storage_sizes(cursor, video_id):
+    """Bytes a video takes in the row tables and in pose_frame_chunks"""
+    cursor.execute("SELECT count(*) FROM pose_sequences WHERE video_id = %s", (video_id,))
+    frames = db.fetch_rows(cursor)[0][0]
+    partitioned = is_partitioned(cursor)
+    if partitioned:
+        row_bytes = db.relation_bytes(cursor, video_partitions(video_id))
+    else:
+        # Without partitions, only the video's own row bytes can be counted
+        cursor.execute("SELECT COALESCE(sum(pg_column_size(s.*)), 0) FROM pose_sequences s WHERE video_id = %s",
+                       (video_id,))
+        row_bytes = int(db.fetch_rows(cursor)[0][0])
+        cursor.execute("""
+            SELECT COALESCE(sum(pg_column_size(k.*)), 0)
+            FROM pose_keypoints k JOIN pose_sequences s ON s.id = k.sequence_id WHERE s.video_id = %s
+        """, (video_id,))
+        row_bytes += int(db.fetch_rows(cursor)[0][0])
+    cursor.execute(f"""
+        SELECT count(*), COALESCE(sum(pg_column_size(frame_numbers) + pg_column_size(timestamps)
+                                      + pg_column_size(flags) + pg_column_size(keypoints)), 0)
+        FROM {CHUNK_TABLE} WHERE video_id = %s
+    """, (video_id,))
+    chunks, payload_bytes = db.fetch_rows(cursor)[0]
+    return {
+        "frames": frames,
+        "row_bytes": row_bytes,
+        "row_bytes_include_indexes": partitioned,
+        "chunks": chunks,
+        "chunk_payload_bytes": int(payload_bytes),
+        "chunk_table_bytes": db.relation_bytes(cursor, [CHUNK_TABLE]),
+    }
+
+def benchmark(conn, video_id, windows=DEFAULT_WINDOWS, repeat=DEFAULT_REPEAT, limit=1000):
+    """Time window reads of one video through the row tables' API query and through pose_frame_chunks"""
+    with conn.cursor() as cursor:
+        sizes = storage_sizes(cursor, video_id)
+        cursor.execute("SELECT max(timestamp_seconds)::float8 FROM pose_sequences WHERE video_id = %s", (video_id,))
+        duration = db.fetch_rows(cursor)[0][0] or 0.0
+        window_sql = api_sql(cursor, API_WINDOW_SQL)
+        results = []
+        for window in windows:
+            starts = [random.uniform(0, max(duration - window, 0)) for _ in range(repeat)]
+            timings = {"rows": [], "chunks": [], "chunk_arrays": []}
+            frames = {"rows": 0, "chunks": 0}
+            for start in starts:
+                started = time.perf_counter()
+                cursor.execute(window_sql, (video_id, start, start + window, limit))
+                frames["rows"] += len(cursor.fetchall())
+                timings["rows"].append(time.perf_counter() - started)
+
+                # Arrays are what a reader would hand on; frame dicts match the API's JSON
+                started = time.perf_counter()
+                read_chunk_window(cursor, video_id, start, start + window, limit)
+                timings["chunk_arrays"].append(time.perf_counter() - started)
+
+                started = time.perf_counter()
+                frames["chunks"] += len(read_chunk_frames(cursor, video_id, start, start + window, limit))
+                timings["chunks"].append(time.perf_counter() - started)
+            conn.rollback()
+            results.append({
+                "window_seconds": window,
+                "frames_per_read": {layout: count / repeat for layout, count in frames.items()},
+                "latency_ms": {layout: db.latency_ms(times) for layout, times in timings.items()},
+            })
+    return {"video_id": video_id, "sizes": sizes, "windows": results}
+
+def print_benchmark(report):
+    sizes = report["sizes"]
+    print(f"📊 Video {report['video_id']}: {sizes['frames']} frames")
+    print(f"   rows layout:        {sizes['row_bytes'] / 1e6:8.2f}MB (sequence and keypoint rows"
+          f"{', with indexes' if sizes['row_bytes_include_indexes'] else ' only'})")
+    print(f"   pose_frame_chunks:  {sizes['chunk_payload_bytes'] / 1e6:8.2f}MB packed in {sizes['chunks']} rows "
+          f"(whole table, every video and any dead rows: {sizes['chunk_table_bytes'] / 1e6:.2f}MB)")
+    for result in report["windows"]:
+        latency = result["latency_ms"]
+        print(f"   {result['window_seconds']:>5.1f}s window ({result['frames_per_read']['rows']:.0f} frames), "
+              f"p50 / p95: " + ", ".join(f"{layout} {latency[layout]['p50']:.1f} / {latency[layout]['p95']:.1f}ms"
+                                          for layout in ("rows", "chunk_arrays", "chunks")))
+
+def main():
+    parser = argparse.ArgumentParser(description='Fill and benchmark the packed pose_frame_chunks table')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    load_parser = subparsers.add_parser('load', help='Fill pose_frame_chunks from pose files or pose rows')
+    load_parser.add_argument('forms', nargs='*', help='Form keys from the manifest, or video ids with --from-rows')
+    load_parser.add_argument('--from-rows', action='store_true',
+                             help='Build chunks from videos already in pose_sequences/pose_keypoints')
+    load_parser.add_argument('--manifest', default=MANIFEST_PATH, help='Forms manifest (default: forms.json)')
+    load_parser.add_argument('--chunk-seconds', type=float, default=DEFAULT_CHUNK_SECONDS,
+                             help=f'Duration of each chunk row (default: {DEFAULT_CHUNK_SECONDS})')
+    load_parser.add_argument('--lossy', action='store_true',
+                             help='Also read a float32 .pose or a .posez file found next to a form\'s JSON')
+    benchmark_parser = subparsers.add_parser('benchmark', help='Compare size and window reads with the row tables')
+    benchmark_parser.add_argument('video_ids', nargs='+', type=int, help='Videos with both pose rows and chunks')
+    benchmark_parser.add_argument('--windows', nargs='+', type=float, default=list(DEFAULT_WINDOWS),
+                                  help='Window lengths in seconds (default: 2 30)')
+    benchmark_parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT,
+                                  help=f'Random windows read per length (default: {DEFAULT_REPEAT})')
+    benchmark_parser.add_argument('--json', metavar='PATH', help='Also write the results as JSON')
+
+    args = parser.parse_args()
+
+    conn = db.connect()
+    try:
+        if args.command == 'benchmark':
+            reports = [benchmark(conn, video_id, args.windows, args.repeat) for video_id in args.video_ids]
+            for report in reports:
+                print_benchmark(report)
+            if args.json:
+                with open(args.json, 'w') as f:
+                    json.dump(reports, f, indent=2)
+        elif args.from_rows:
+            video_ids = [int(video_id) for video_id in args.forms]
+            if not video_ids:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT DISTINCT video_id FROM pose_sequences WHERE frame_number IS NOT NULL "
+                                   "ORDER BY video_id")
+                    video_ids = [row[0] for row in db.fetch_rows(cursor)]
+                conn.rollback()
+            for video_id in video_ids:
+                frames, chunks = load_row_chunks(conn, video_id, args.chunk_seconds)
+                print(f"✅ Video {video_id}: {frames} frames → {chunks} chunks")
+        else:
+            for form in select_forms(load_manifest(args.manifest), args.forms or None):
+                video_id, frames, chunks = load_form_chunks(conn, form, args.chunk_seconds, args.lossy)
+                print(f"✅ {form['key']} (video {video_id}): {frames} frames → {chunks} chunks")
+    finally:
+        conn.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Quantized, delta-encoded pose codec
+
+A pose JSON file spends most of its bytes on repetition: every keypoint
+of every frame carries its name and four doubles printed to 16 digits.
+A .posez file stores the same frames as one binary blob:
+
+    magic        b"POSEZ\\x00"
+    header       uint32 length + JSON: fps, video_info, keypoint names,
+                 frame count and the quantization of each channel
+    body         zlib-compressed columns, little-endian, in order:
+                   frame_numbers  int32 [frames], delta-encoded
+                   timestamps     int64 [frames] microseconds, delta-encoded
+                   flags          uint8 [frames] bit 0 pose_detected,
+                                  bit 1 interpolated
+                   present        packed bits [frames, 33, 3]: x/y, z and
+                                  visibility present
+                   xyz            int16 [frames, 33, 3], delta-encoded
+                                  across frames per joint
+                   visibility     uint8 [frames, 33], delta-encoded
+
+x, y and z are quantized to int16 over the file's own range of each
+channel, so the worst-case error is half a step: range / 65534 / 2, about
+1.5e-5 for coordinates within [-0.5, 1.5]. Visibility is quantized to
+uint8 in [0, 1], an error of at most 1 / 255 / 2. Joints move little
+between frames, so the per-joint deltas are small and compress well.
+Missing values are recorded in the present bits and decode as NaN/None.
+
+encode_frames()/decode_frames() convert frame dicts; encode_arrays()/
+decode_arrays() work on pose_array columns. PoseCodecWriter is an
+extraction sink like pose_array.PoseArrayWriter, and pose_io.open_pose_file()
+reads .posez files, so extract_pose_data.py and the uploaders handle them
+like any other pose file.
+
+Usage:
+    python pose_codec.py taegeuk-1-full.json taegeuk-1-full.posez
+    python pose_codec.py taegeuk-1-full.posez taegeuk-1-full.json
+    python pose_codec.py --report                 # every bundled form
+    python pose_codec.py --report a.json b.json --json report.json
+"""
+
+import argparse
+import json
+import os
+import struct
+import sys
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+from pose_array import KEYPOINT_NAMES, NUM_KEYPOINTS, PoseArrayWriter, frames_to_arrays, iter_pose_array_frames
+
+FORMAT_NAME = "pose-codec"
+FORMAT_VERSION = 1
+POSE_CODEC_SUFFIX = ".posez"
+MAGIC = b"POSEZ\x00"
+COMPRESSION_LEVEL = 6
+# Quantized coordinates use [-QUANT_LEVELS, QUANT_LEVELS]
+QUANT_LEVELS = 32767
+VISIBILITY_LEVELS = 255
+TIMESTAMP_SCALE = 1_000_000
+FLAG_DETECTED = 1
+FLAG_INTERPOLATED = 2
+# Channels of keypoints[..., :3]; visibility is quantized separately
+XYZ_CHANNELS = ("x", "y", "z")
+POSE_DATA_DIR = Path(__file__).parent.parent / "client/public/pose-data"
+
+def is_pose_codec_path(path):
+    return Path(path).suffix.lower() == POSE_CODEC_SUFFIX
+
+def _delta(values, dtype):
+    """Differences along the frame axis, wrapped to dtype"""
+    wide = values.astype(np.int64)
+    wide[1:] -= values[:-1].astype(np.int64)
+    return wide.astype(dtype)
+
+def _undelta(deltas, dtype):
+    """Inverse of _delta: running sums wrapped to dtype"""
+    return np.cumsum(deltas.astype(np.int64), axis=0).astype(dtype)
+
+def _fill_forward(values, present):
+    """Replace missing entries with the previous present value along the frame axis (0 before any)"""
+    if not len(values):
+        return values
+    index = np.where(present, np.arange(len(values)).reshape((-1,) + (1,) * (values.ndim - 1)), 0)
+    np.maximum.accumulate(index, axis=0, out=index)
+    filled = np.take_along_axis(values, index, axis=0)
+    seen = np.logical_or.accumulate(present, axis=0)
+    return np.where(seen, filled, 0)
+
+def quantization_for(keypoints):
+    """Offset and step of x, y and z so the values present in keypoints span the int16 range"""
+    quantization = {}
+    for channel, name in enumerate(XYZ_CHANNELS):
+        values = keypoints[..., channel][~np.isnan(keypoints[..., channel])]
+        if len(values):
+            low, high = float(values.min()), float(values.max())
+        else:
+            low, high = 0.0, 0.0
+        step = (high - low) / (2 * QUANT_LEVELS) if high > low else 1.0
+        quantization[name] = {"offset": low + QUANT_LEVELS * step, "step": step}
+    return quantization
+
+def _present_bits(keypoints):
+    """bool [frames, 33, 3]: x and y present, z present, visibility present"""
+    xy = ~np.isnan(keypoints[..., 0]) & ~np.isnan(keypoints[..., 1])
+    return np.stack([xy, xy & ~np.isnan(keypoints[..., 2]), xy & ~np.isnan(keypoints[..., 3])], axis=-1)
+
+def _xyz_present(present):
+    """bool [frames, 33, 3]: whether each of x, y and z is present"""
+    return present[..., [0, 0, 1]]
+
+def encode_body(arrays, quantization, level=COMPRESSION_LEVEL):
+    """Compressed body for pose array columns, quantized with quantization (see quantization_for())"""
+    keypoints = np.asarray(arrays["keypoints"], dtype=np.float64)
+    frames = len(keypoints)
+    present = _present_bits(keypoints)
+
+    xyz_present = _xyz_present(present)
+    quantized = np.zeros((frames, NUM_KEYPOINTS, 3), dtype=np.int16)
+    for channel, name in enumerate(XYZ_CHANNELS):
+        offset, step = quantization[name]["offset"], quantization[name]["step"]
+        values = np.where(xyz_present[..., channel], keypoints[..., channel], offset)
+        quantized[..., channel] = np.clip(np.rint((values - offset) / step), -QUANT_LEVELS, QUANT_LEVELS)
+    visibility = np.where(present[..., 2], keypoints[..., 3], 0.0)
+    visibility = np.clip(np.rint(visibility * VISIBILITY_LEVELS), 0, VISIBILITY_LEVELS).astype(np.uint8)
+
+    quantized = _fill_forward(quantized, xyz_present)
+    visibility = _fill_forward(visibility, present[..., 2])
+
+    flags = np.asarray(arrays["detected"], dtype=np.uint8) * FLAG_DETECTED
+    if arrays.get("interpolated") is not None and len(arrays["interpolated"]):
+        flags |= np.asarray(arrays["interpolated"], dtype=np.uint8) * FLAG_INTERPOLATED
+    timestamps = np.rint(np.asarray(arrays["timestamps"], dtype=np.float64) * TIMESTAMP_SCALE)
+
+    body = b''.join([
+        _delta(np.asarray(arrays["frame_numbers"], dtype=np.int64), '<i4').tobytes(),
+        _delta(timestamps.astype(np.int64), '<i8').tobytes(),
+        flags.astype(np.uint8).tobytes(),
+        np.packbits(present.reshape(-1)).tobytes(),
+        _delta(quantized, '<i2').tobytes(),
+        _delta(visibility, np.uint8).tobytes(),
+    ])
+    return zlib.compress(body, level)
+
+def decode_body(data, frames, quantization, visibility_levels=VISIBILITY_LEVELS):
+    """Pose array columns from a body written by encode_body() for frames frames"""
+    body = memoryview(zlib.decompress(data))
+
+    def take(dtype, count):
+        nonlocal body
+        size = np.dtype(dtype).itemsize * count
+        column = np.frombuffer(body[:size], dtype=dtype)
+        body = body[size:]
+        return column
+
+    frame_numbers = _undelta(take('<i4', frames), np.int32)
+    timestamps = _undelta(take('<i8', frames), np.int64) / TIMESTAMP_SCALE
+    flags = take(np.uint8, frames)
+    present_bits = (frames * NUM_KEYPOINTS * 3 + 7) // 8
+    present = np.unpackbits(take(np.uint8, present_bits))[:frames * NUM_KEYPOINTS * 3]
+    present = present.reshape(frames, NUM_KEYPOINTS, 3).astype(bool)
+    quantized = _undelta(take('<i2', frames * NUM_KEYPOINTS * 3).reshape(frames, NUM_KEYPOINTS, 3), np.int16)
+    visibility = _undelta(take(np.uint8, frames * NUM_KEYPOINTS).reshape(frames, NUM_KEYPOINTS), np.uint8)
+
+    keypoints = np.full((frames, NUM_KEYPOINTS, 4), np.nan, dtype=np.float32)
+    xyz_present = _xyz_present(present)
+    for channel, name in enumerate(XYZ_CHANNELS):
+        quant = quantization[name]
+        values = quant["offset"] + quantized[..., channel] * quant["step"]
+        keypoints[..., channel] = np.where(xyz_present[..., channel], values, np.nan)
+    keypoints[..., 3] = np.where(present[..., 2], visibility / visibility_levels, np.nan)
+
+    arrays = {
+        "keypoints": keypoints,
+        "timestamps": timestamps,
+        "frame_numbers": frame_numbers,
+        "detected": (flags & FLAG_DETECTED).astype(bool),
+    }
+    interpolated = (flags & FLAG_INTERPOLATED).astype(bool)
+    if interpolated.any():
+        arrays["interpolated"] = interpolated
+    return arrays
+
+def encode_arrays(video_info, arrays, level=COMPRESSION_LEVEL):
+    """Encode pose array columns (see pose_array.py) as .posez bytes"""
+    quantization = quantization_for(np.asarray(arrays["keypoints"]))
+    header = {
+        "format": FORMAT_NAME,
+        "version": FORMAT_VERSION,
+        "fps": video_info["fps"],
+        "video_info": video_info,
+        "keypoint_names": KEYPOINT_NAMES,
+        "frame_count": len(arrays["keypoints"]),
+        "quantization": quantization,
+        "visibility_levels": VISIBILITY_LEVELS
+    }
+    header_bytes = json.dumps(header, separators=(',', ':')).encode()
+    return (MAGIC + struct.pack('<I', len(header_bytes)) + header_bytes
+            + encode_body(arrays, quantization, level))
+
+def read_header(data):
+    """The JSON header of .posez bytes and the offset of the body"""
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError("Not a pose codec file")
+    start = len(MAGIC) + 4
+    (length,) = struct.unpack('<I', data[len(MAGIC):start])
+    header = json.loads(data[start:start + length])
+    if header.get("format") != FORMAT_NAME or header.get("version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported pose codec version {header.get('version')}")
+    return header, start + length
+
+def decode_arrays(data):
+    """Decode .posez bytes into a dict of "header" plus pose array columns"""
+    header, offset = read_header(data)
+    arrays = decode_body(data[offset:], header["frame_count"], header["quantization"],
+                         header["visibility_levels"])
+    return {"header": header, **arrays}
+
+def encode_frames(video_info, frames, level=COMPRESSION_LEVEL):
+    """Encode frame dicts as .posez bytes"""
+    return encode_arrays(video_info, frames_to_arrays(frames), level)
+
+def decode_frames(data):
+    """Decode .posez bytes, returning (video_info, frame iterator) like pose_io.open_pose_file()"""
+    pose_array = decode_arrays(data)
+    return pose_array["header"]["video_info"], iter_pose_array_frames(pose_array)
+
+def write_pose_codec(path, video_info, arrays):
+    """Write pose array columns to a .posez file"""
+    data = encode_arrays(video_info, arrays)
+    # Written aside and renamed, so a .posez file is always complete
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+    return len(data)
+
+def read_pose_codec(path):
+    """Open a .posez file as a dict of "header" plus pose array columns"""
+    with open(path, 'rb') as f:
+        return decode_arrays(f.read())
+
+class PoseCodecWriter(PoseArrayWriter):
+    """Collect frames as compact arrays and write a .posez file on close"""
+
+    def close(self):
+        write_pose_codec(self.path, self.video_info, self.to_arrays())
+
+def max_errors(original, decoded):
+    """Largest absolute difference per channel between two keypoint arrays, over values present in both"""
+    errors = {}
+    for channel, name in enumerate(XYZ_CHANNELS + ("visibility",)):
+        a = np.asarray(original[..., channel], dtype=np.float64)
+        b = np.asarray(decoded[..., channel], dtype=np.float64)
+        if not np.array_equal(np.isnan(a), np.isnan(b)):
+            raise ValueError(f"Missing {name} values differ after decoding")
+        present = ~np.isnan(a)
+        errors[name] = float(np.abs(a[present] - b[present]).max()) if present.any() else 0.0
+    return errors
+
+def codec_report(path):
+    """Encode one pose file and measure its size and reconstruction error"""
+    # Imported here because pose_io depends on this module
+    from pose_io import open_pose_file
+
+    video_info, frames = open_pose_file(path)
+    arrays = frames_to_arrays(frames)
+    data = encode_arrays(video_info, arrays)
+    decoded = decode_arrays(data)
+    if not (np.array_equal(decoded["frame_numbers"], arrays["frame_numbers"])
+            and np.array_equal(decoded["detected"], arrays["detected"])
+            and np.allclose(decoded["timestamps"], arrays["timestamps"], rtol=0, atol=1 / TIMESTAMP_SCALE)):
+        raise ValueError(f"{path}: frame metadata did not survive encoding")
+    source_bytes = os.path.getsize(path) if os.path.isfile(path) else None
+    errors = max_errors(arrays["keypoints"], decoded["keypoints"])
+    return {
+        "path": str(path),
+        "frames": len(arrays["timestamps"]),
+        "source_bytes": source_bytes,
+        "float32_bytes": int(arrays["keypoints"].nbytes),
+        "encoded_bytes": len(data),
+        "ratio": source_bytes / len(data) if source_bytes else None,
+        "max_error": errors,
+        "error_bound": {name: quant["step"] / 2 for name, quant in
+                        decoded["header"]["quantization"].items()} | {"visibility": 0.5 / VISIBILITY_LEVELS}
+    }
+
+def bundled_pose_files():
+    """Every JSON pose file in the client's pose-data directory"""
+    return sorted(POSE_DATA_DIR.glob("*.json"))
+
+def print_report(results):
+    print(f"{'file':<28} {'frames':>7} {'source':>10} {'posez':>9} {'ratio':>6}  "
+          f"{'max error x / y / z / visibility'}")
+    for result in results:
+        source = f"{result['source_bytes'] / 1e6:.2f}MB" if result['source_bytes'] else '-'
+        ratio = f"{result['ratio']:.0f}x" if result['ratio'] else '-'
+        errors = ' / '.join(f"{result['max_error'][name]:.1e}" for name in XYZ_CHANNELS + ("visibility",))
+        print(f"{Path(result['path']).name:<28} {result['frames']:>7} {source:>10} "
+              f"{result['encoded_bytes'] / 1e3:>7.1f}KB {ratio:>6}  {errors}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert pose data to and from the quantized .posez codec')
+    parser.add_argument('paths', nargs='*', help='Input and output paths, or the files to report on')
+    parser.add_argument('--report', action='store_true',
+                        help='Report size and worst-case reconstruction error (default files: every bundled form)')
+    parser.add_argument('--json', metavar='PATH', help='With --report, also write the results as JSON')
+
+    args = parser.parse_args()
+
+    if args.report:
+        paths = args.paths or bundled_pose_files()
+        if not paths:
+            print("No pose files found")
+            return 1
+        results = [codec_report(path) for path in paths]
+        print_report(results)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(results, f, indent=2)
+        return 0
+
+    if len(args.paths) != 2:
+        parser.error("expected an input and an output path")
+    source, output = args.paths
+
+    # Imported here because pose_io depends on this module
+    from pose_io import NdjsonPoseWriter, is_ndjson_path, open_pose_file
+
+    video_info, frames = open_pose_file(source)
+    if is_pose_codec_path(output):
+        size = write_pose_codec(output, video_info, frames_to_arrays(frames))
+        print(f"Encoded {source} → {output} ({size / 1e3:.1f}KB)")
+    elif is_ndjson_path(output):
+        with NdjsonPoseWriter(output, video_info) as writer:
+            for frame in frames:
+                writer.write_frame(frame)
+        print(f"Decoded {source} → {output}")
+    else:
+        with open(output, 'w') as f:
+            json.dump({"video_info": video_info, "frames": list(frames)}, f, indent=2)
+        print(f"Decoded {source} → {output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
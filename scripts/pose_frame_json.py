@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+Precomputed per-frame keypoint JSON in pose_frame_json
+
+/api/pose-data/videos/:id/poses and /poses/at/:timestamp
+(server/routes/poseData.js) rebuild every frame's keypoints on each
+request with json_agg(json_build_object(...)) over a LEFT JOIN of
+pose_keypoints, although the result only changes when the video is
+uploaded again. pose_frame_json keeps that result: one row per frame,
+keyed by (video_id, sequence_id), holding the frame's columns and its
+keypoints as the JSON array the API returns, with the null keypoints the
+API filters out already dropped. It matches the API exactly, so
+json-layout frames, whose keypoints the API cannot see, get [] as they
+do there. A window is then an index range scan on (video_id,
+timestamp_seconds) with no join or aggregate.
+
+The loaders in pose_ingest.py and pose_ingest_async.py refresh the video
+they wrote in the transaction that writes it (refresh_frame_json(), or
+refresh_statements() on another connection), so pose_frame_json changes
+with the pose rows at commit. The refresh is
+incremental: it only rebuilds the frames whose pose_sequences row is new
+or whose frame_hash changed, and deletes those that are gone, so a diff
+upload refreshes just the frames it changed and no other video is
+touched. (A materialized view cannot be refreshed one video at a time.)
+
+Usage:
+    python pose_frame_json.py refresh                      # every video with pose rows
+    python pose_frame_json.py refresh 3 4 --full
+    python pose_frame_json.py benchmark 12 --windows 2 30 --repeat 50
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+
+import db
+from pose_partitions import POSE_TABLES, is_partitioned
+
+FRAME_JSON_TABLE = 'pose_frame_json'
+DEFAULT_WINDOWS = (2.0, 30.0)
+DEFAULT_REPEAT = 20
+# The server's defaults for limit and tolerance
+DEFAULT_LIMIT = 1000
+DEFAULT_TOLERANCE = 0.1
+
+POSE_FRAME_JSON_SQL = """
+-- Each frame's keypoints as the API's JSON, refreshed by the loaders (see scripts/pose_frame_json.py)
+CREATE TABLE IF NOT EXISTS pose_frame_json (
+    video_id INTEGER NOT NULL REFERENCES martial_arts_videos(id) ON DELETE CASCADE,
+    sequence_id INTEGER NOT NULL,
+    frame_number INTEGER NOT NULL,
+    timestamp_seconds DECIMAL(8,3) NOT NULL,
+    pose_detected BOOLEAN NOT NULL,
+    fps DECIMAL(8,2),
+    frame_hash BIGINT,
+    keypoints JSON NOT NULL,
+    refreshed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (video_id, sequence_id)
+);
+CREATE INDEX IF NOT EXISTS pose_frame_json_timestamp_idx ON pose_frame_json (video_id, timestamp_seconds);
+"""
+
+# The API's queries (server/routes/poseData.js), with an end time for /poses;
+# fill in same_video with api_sql()
+API_WINDOW_SQL = """
+    SELECT
+        ps.frame_number,
+        ps.timestamp_seconds,
+        ps.pose_detected,
+        ps.fps,
+        json_agg(
+            json_build_object(
+                'id', pk.keypoint_id,
+                'name', pk.keypoint_name,
+                'x', pk.x,
+                'y', pk.y,
+                'z', pk.z,
+                'visibility', pk.visibility
+            ) ORDER BY pk.keypoint_id
+        ) as keypoints
+    FROM pose_sequences ps
+    LEFT JOIN pose_keypoints pk ON {same_video} pk.sequence_id = ps.id
+    WHERE ps.video_id = %s AND ps.timestamp_seconds >= %s AND ps.timestamp_seconds <= %s
+    GROUP BY ps.id, ps.frame_number, ps.timestamp_seconds, ps.pose_detected, ps.fps
+    ORDER BY ps.timestamp_seconds
+    LIMIT %s
+"""
+
+API_AT_SQL = """
+    SELECT
+        ps.frame_number,
+        ps.timestamp_seconds,
+        ps.pose_detected,
+        json_agg(
+            json_build_object(
+                'id', pk.keypoint_id,
+                'name', pk.keypoint_name,
+                'x', pk.x,
+                'y', pk.y,
+                'z', pk.z,
+                'visibility', pk.visibility
+            ) ORDER BY pk.keypoint_id
+        ) as keypoints
+    FROM pose_sequences ps
+    LEFT JOIN pose_keypoints pk ON {same_video} pk.sequence_id = ps.id
+    WHERE ps.video_id = %(video_id)s
+      AND ABS(ps.timestamp_seconds - %(timestamp)s) <= %(tolerance)s
+      AND ps.pose_detected = true
+    GROUP BY ps.id, ps.frame_number, ps.timestamp_seconds, ps.pose_detected
+    ORDER BY ABS(ps.timestamp_seconds - %(timestamp)s)
+    LIMIT 1
+"""
+
+# The same two reads from pose_frame_json
+FRAME_JSON_WINDOW_SQL = """
+    SELECT frame_number, timestamp_seconds, pose_detected, fps, keypoints
+    FROM pose_frame_json
+    WHERE video_id = %s AND timestamp_seconds >= %s AND timestamp_seconds <= %s
+    ORDER BY timestamp_seconds
+    LIMIT %s
+"""
+
+# A range rather than ABS(...) <= tolerance, so the timestamp index bounds the scan
+FRAME_JSON_AT_SQL = """
+    SELECT frame_number, timestamp_seconds, pose_detected, keypoints
+    FROM pose_frame_json
+    WHERE video_id = %(video_id)s
+      AND timestamp_seconds BETWEEN %(timestamp)s - %(tolerance)s AND %(timestamp)s + %(tolerance)s
+      AND pose_detected = true
+    ORDER BY ABS(timestamp_seconds - %(timestamp)s)
+    LIMIT 1
+"""
+
+def keypoints_same_video(cursor):
+    """Join condition on video_id for pose_keypoints pk and pose_sequences ps, if pk has the column"""
+    # Unpartitioned pose_keypoints (before pose_partitions.py migrate) has no video_id
+    return "pk.video_id = ps.video_id AND" if is_partitioned(cursor) else ""
+
+def api_sql(cursor, sql):
+    """API_WINDOW_SQL or API_AT_SQL joined the way this database's pose_keypoints allows"""
+    return sql.format(same_video=keypoints_same_video(cursor))
+
+def ensure_frame_json_table(cursor):
+    cursor.execute("SELECT to_regclass(%s)", (FRAME_JSON_TABLE,))
+    if db.fetch_rows(cursor)[0][0] is None:
+        cursor.execute(POSE_FRAME_JSON_SQL)
+
+def refresh_statements(cursor, video_id, full=False, tables=POSE_TABLES):
+    """The (sql, params) pairs that refresh_frame_json() runs: the delete, then the insert.
+
+    Looks at the catalog through cursor, so a caller on another
+    connection (such as pose_ingest_async.py's psycopg 3 one) can run
+    them in its own transaction.
+    """
+    # Imported here because pose_ingest depends on this module
+    from pose_ingest import has_column
+
+    sequences, keypoints = tables
+    hashed = has_column(cursor, 'pose_sequences', 'frame_hash')
+    if full or not hashed:
+        delete = f"DELETE FROM {FRAME_JSON_TABLE} WHERE video_id = %s"
+    else:
+        delete = f"""
+            DELETE FROM {FRAME_JSON_TABLE} j WHERE j.video_id = %s AND NOT EXISTS (
+                SELECT 1 FROM {sequences} ps
+                WHERE ps.video_id = j.video_id AND ps.id = j.sequence_id
+                  AND ps.frame_hash IS NOT DISTINCT FROM j.frame_hash
+            )
+        """
+
+    frame_hash = "ps.frame_hash" if hashed else "NULL::bigint"
+    group_by = ["ps.video_id", "ps.id", "ps.frame_number", "ps.timestamp_seconds", "ps.pose_detected", "ps.fps"]
+    group_by += [frame_hash] if hashed else []
+    insert = f"""
+        INSERT INTO {FRAME_JSON_TABLE}
+            (video_id, sequence_id, frame_number, timestamp_seconds, pose_detected, fps, frame_hash, keypoints)
+        SELECT
+            ps.video_id, ps.id, ps.frame_number, ps.timestamp_seconds, ps.pose_detected, ps.fps, {frame_hash},
+            COALESCE(
+                json_agg(
+                    json_build_object(
+                        'id', pk.keypoint_id,
+                        'name', pk.keypoint_name,
+                        'x', pk.x,
+                        'y', pk.y,
+                        'z', pk.z,
+                        'visibility', pk.visibility
+                    ) ORDER BY pk.keypoint_id
+                ) FILTER (WHERE pk.keypoint_id IS NOT NULL),
+                '[]'::json
+            )
+        FROM {sequences} ps
+        LEFT JOIN {keypoints} pk ON {keypoints_same_video(cursor)} pk.sequence_id = ps.id
+        WHERE ps.video_id = %s AND ps.frame_number IS NOT NULL AND NOT EXISTS (
+            SELECT 1 FROM {FRAME_JSON_TABLE} j WHERE j.video_id = ps.video_id AND j.sequence_id = ps.id
+        )
+        GROUP BY {', '.join(group_by)}
+    """
+    return [(delete, (video_id,)), (insert, (video_id,))]
+
+def refresh_frame_json(cursor, video_id, full=False, tables=POSE_TABLES):
+    """Bring a video's pose_frame_json rows up to date with its pose rows; returns (frames deleted, frames built).
+
+    Only frames whose pose_sequences row is new or has a different
+    frame_hash are rebuilt, unless full=True (or the table has no
+    frame_hash column), which rebuilds the whole video. tables names the
+    (sequences, keypoints) tables to build from, e.g. a staged reload's
+    before it is swapped in. Runs in the caller's transaction.
+    """
+    ensure_frame_json_table(cursor)
+    counts = []
+    for sql, params in refresh_statements(cursor, video_id, full, tables):
+        cursor.execute(sql, params)
+        counts.append(cursor.rowcount)
+    return tuple(counts)
+
+def refresh_video(conn, video_id, full=False):
+    """refresh_frame_json() in a transaction of its own, e.g. through db.run()"""
+    with conn.cursor() as cursor:
+        return refresh_frame_json(cursor, video_id, full)
+
+def _same_frames(live, stored):
+    """True if pose_frame_json returned exactly what the API sends for the live rows.
+
+    The API drops keypoints with a null id (frames without keypoint rows)
+    before sending them.
+    """
+    if len(live) != len(stored):
+        return False
+    for live_row, stored_row in zip(live, stored):
+        keypoints = [keypoint for keypoint in live_row[-1] if keypoint["id"] is not None]
+        if tuple(live_row[:-1]) != tuple(stored_row[:-1]) or keypoints != stored_row[-1]:
+            return False
+    return True
+
+def _timed(cursor, sql, params):
+    started = time.perf_counter()
+    cursor.execute(sql, params)
+    rows = db.fetch_rows(cursor)
+    return time.perf_counter() - started, rows
+
+def benchmark(conn, video_id, windows=DEFAULT_WINDOWS, repeat=DEFAULT_REPEAT, limit=DEFAULT_LIMIT,
+              tolerance=DEFAULT_TOLERANCE):
+    """Replay the API's two pose queries on one video against the live aggregate and against pose_frame_json.
+
+    Every pair of results is compared too; mismatches counts the reads
+    where the two disagreed.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT count(*), COALESCE(max(timestamp_seconds)::float8, 0) FROM pose_sequences WHERE video_id = %s
+        """, (video_id,))
+        frames, duration = db.fetch_rows(cursor)[0]
+        cursor.execute(f"""
+            SELECT count(*), COALESCE(sum(pg_column_size(j.*)), 0) FROM {FRAME_JSON_TABLE} j WHERE video_id = %s
+        """, (video_id,))
+        json_frames, json_bytes = db.fetch_rows(cursor)[0]
+
+        reads = []
+        for window in windows:
+            reads.append((f"poses {window:g}s", api_sql(cursor, API_WINDOW_SQL), FRAME_JSON_WINDOW_SQL, [
+                (video_id, start, start + window, limit)
+                for start in (random.uniform(0, max(duration - window, 0)) for _ in range(repeat))
+            ]))
+        reads.append(("poses/at", api_sql(cursor, API_AT_SQL), FRAME_JSON_AT_SQL, [
+            {"video_id": video_id, "timestamp": random.uniform(0, duration), "tolerance": tolerance}
+            for _ in range(repeat)
+        ]))
+
+        results = []
+        for name, live_sql, json_sql, params in reads:
+            timings = {"live": [], "frame_json": []}
+            returned = mismatches = 0
+            for param in params:
+                elapsed, live = _timed(cursor, live_sql, param)
+                timings["live"].append(elapsed)
+                elapsed, stored = _timed(cursor, json_sql, param)
+                timings["frame_json"].append(elapsed)
+                returned += len(stored)
+                mismatches += not _same_frames(live, stored)
+            results.append({
+                "query": name,
+                "frames_per_read": returned / len(params),
+                "mismatches": mismatches,
+                "latency_ms": {form: db.latency_ms(times) for form, times in timings.items()},
+            })
+    conn.rollback()
+    return {"video_id": video_id, "frames": frames, "frame_json_frames": json_frames,
+            "frame_json_bytes": int(json_bytes), "queries": results}
+
+def print_benchmark(report):
+    print(f"📊 Video {report['video_id']}: {report['frames']} frames, {report['frame_json_frames']} in "
+          f"{FRAME_JSON_TABLE} ({report['frame_json_bytes'] / 1e6:.2f}MB)")
+    for result in report["queries"]:
+        latency = result["latency_ms"]
+        speedup = latency["live"]["p50"] / latency["frame_json"]["p50"] if latency["frame_json"]["p50"] else 0
+        print(f"   {result['query']:<12} ({result['frames_per_read']:.0f} frames), p50 / p95: "
+              + ", ".join(f"{form} {latency[form]['p50']:.1f} / {latency[form]['p95']:.1f}ms"
+                          for form in ("live", "frame_json"))
+              + f" ({speedup:.1f}x)"
+              + (f" ⚠️  {result['mismatches']} mismatched" if result["mismatches"] else ""))
+
+def main():
+    parser = argparse.ArgumentParser(description='Refresh and benchmark the precomputed pose_frame_json table')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    refresh_parser = subparsers.add_parser('refresh', help='Bring pose_frame_json up to date with the pose rows')
+    refresh_parser.add_argument('video_ids', nargs='*', type=int, help='Videos to refresh (default: all)')
+    refresh_parser.add_argument('--full', action='store_true', help='Rebuild every frame, not only changed ones')
+    benchmark_parser = subparsers.add_parser('benchmark', help='Replay the API queries against both forms')
+    benchmark_parser.add_argument('video_ids', nargs='+', type=int, help='Videos with pose rows')
+    benchmark_parser.add_argument('--windows', nargs='+', type=float, default=list(DEFAULT_WINDOWS),
+                                  help='/poses window lengths in seconds (default: 2 30)')
+    benchmark_parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT,
+                                  help=f'Random reads per query (default: {DEFAULT_REPEAT})')
+    benchmark_parser.add_argument('--json', metavar='PATH', help='Also write the results as JSON')
+
+    args = parser.parse_args()
+
+    conn = db.connect()
+    try:
+        if args.command == 'benchmark':
+            reports = [benchmark(conn, video_id, args.windows, args.repeat) for video_id in args.video_ids]
+            for report in reports:
+                print_benchmark(report)
+            if args.json:
+                with open(args.json, 'w') as f:
+                    json.dump(reports, f, indent=2)
+            return 0
+
+        video_ids = args.video_ids
+        if not video_ids:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT DISTINCT video_id FROM pose_sequences WHERE frame_number IS NOT NULL "
+                               "ORDER BY video_id")
+                video_ids = [row[0] for row in db.fetch_rows(cursor)]
+            conn.rollback()
+        for video_id in video_ids:
+            started = time.perf_counter()
+            deleted, built = db.run(refresh_video, video_id, args.full)
+            print(f"✅ Video {video_id}: {built} frames built, {deleted} removed "
+                  f"in {time.perf_counter() - started:.2f}s")
+    finally:
+        conn.close()
+        db.close_pool()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,831 @@
+#!/usr/bin/env python3
+"""
+COPY-based ingestion of pose data into Postgres
+
+Streams pose_sequences and pose_keypoints rows into the database with
+COPY FROM STDIN instead of one INSERT round trip per row. Rows are
+serialized as psycopg2 reads the stream, so memory does not grow with the
+length of the video, in either COPY's text or binary format.
+
+Sequence ids are reserved from the table's id sequence in one query before
+the copy, so keypoint rows can reference their frame without reading the
+inserted sequences back.
+
+Two row layouts are supported, matching the two kinds of upload script:
+    rows   one pose_sequences row per frame plus one pose_keypoints row
+           per keypoint
+    json   one pose_sequences row per frame with its keypoints as JSON in
+           the keypoints_json column
+
+upload_form() does the whole job for one form video: find or create its
+martial_arts_videos record (and its partitions, see pose_partitions.py),
+replace its pose rows and commit. The pose
+file is parsed one frame at a time on a background thread (see
+pose_io.read_json_stream() and prefetch()) while the main thread copies
+batches to the server, so parsing overlaps with network I/O and peak
+memory is bounded by the batch size rather than the file size.
+
+DatabasePoseWriter does the same for frames that are still being
+produced, e.g. by extract_pose_data.py --database --stream: they are
+copied in batches from a background thread while extraction carries on.
+
+Every pose_sequences row stores a hash of its frame (frame_hash), so a
+re-extraction can be uploaded with diff_pose_frames(), which only writes
+the frames whose hash changed and deletes the frames that are gone.
+
+Every write also refreshes the video's precomputed API JSON in
+pose_frame_json (see pose_frame_json.py), in the same transaction except
+after a staged swap.
+"""
+
+import hashlib
+import itertools
+import json
+import queue
+import struct
+import threading
+from decimal import Decimal
+
+import db
+import profiler
+from batch_sizer import batch_sizer
+from pose_frame_json import refresh_frame_json
+from pose_io import open_pose_file, resolve_pose_file
+from pose_partitions import (POSE_TABLES, attach_partition, create_video_partitions, drop_video_partitions,
+                             is_partitioned, prepare_partition, rename_table, video_partitions)
+
+COPY_FORMATS = ('text', 'binary')
+LAYOUTS = ('rows', 'json')
+SEQUENCE_COLUMNS = ('id', 'video_id', 'frame_number', 'timestamp_seconds', 'pose_detected', 'fps', 'frame_hash')
+SEQUENCE_JSON_COLUMNS = ('video_id', 'frame_number', 'timestamp_seconds', 'pose_detected', 'fps', 'frame_hash',
+                         'keypoints_json')
+KEYPOINT_COLUMNS = ('sequence_id', 'keypoint_id', 'keypoint_name', 'x', 'y', 'z', 'visibility')
+STAGING_PREFIX = 'pose_stage'
+# Longest the swap waits for readers' locks before giving up
+SWAP_LOCK_TIMEOUT = '5s'
+# Rows serialized per chunk handed to psycopg2
+ROWS_PER_CHUNK = 1000
+# Frames parsed ahead of the batch being copied
+PREFETCH_FRAMES = 1000
+COPY_BUFFER_SIZE = 1 << 16
+
+_TEXT_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+_TEXT_FORMATTERS = {
+    type(None): lambda value: '\\N',
+    bool: lambda value: 't' if value else 'f',
+    int: int.__repr__,
+    float: float.__repr__,
+    str: lambda value: value.translate(_TEXT_ESCAPES),
+}
+
+def _text_field(value):
+    formatter = _TEXT_FORMATTERS.get(type(value))
+    return formatter(value) if formatter else str(value).translate(_TEXT_ESCAPES)
+
+def text_chunks(rows):
+    """Serialize rows as COPY text format, ROWS_PER_CHUNK rows per bytes chunk"""
+    lines = []
+    for row in rows:
+        lines.append('\t'.join(map(_text_field, row)))
+        if len(lines) >= ROWS_PER_CHUNK:
+            yield ('\n'.join(lines) + '\n').encode()
+            lines = []
+    if lines:
+        yield ('\n'.join(lines) + '\n').encode()
+
+def _encode_numeric(value):
+    """Postgres binary numeric: base-10000 digits with weight, sign and display scale"""
+    text = repr(value) if isinstance(value, float) else str(value)
+    if text in ('nan', 'NaN'):
+        return struct.pack('>hhHH', 0, 0, 0xC000, 0)
+    if 'e' in text or 'E' in text:
+        text = format(Decimal(text), 'f')
+    negative = text.startswith('-')
+    integer, _, fraction = text.lstrip('+-').partition('.')
+    integer = integer.lstrip('0')
+    display_scale = len(fraction)
+    # Pad so the decimal point falls on a 4-digit group boundary
+    digits = '0' * (-len(integer) % 4) + integer + fraction + '0' * (-display_scale % 4)
+    weight = (len(integer) + 3) // 4 - 1
+    groups = [int(digits[i:i + 4]) for i in range(0, len(digits), 4)]
+    while groups and groups[0] == 0:
+        groups.pop(0)
+        weight -= 1
+    while groups and groups[-1] == 0:
+        groups.pop()
+    if not groups:
+        weight = 0
+        negative = False
+    return struct.pack(f'>hhHH{len(groups)}H', len(groups), weight, 0x4000 if negative else 0, display_scale,
+                       *groups)
+
+def _encode_text(value):
+    return str(value).encode()
+
+_BINARY_ENCODERS = {
+    'int2': struct.Struct('>h').pack,
+    'int4': struct.Struct('>i').pack,
+    'int8': struct.Struct('>q').pack,
+    'float4': struct.Struct('>f').pack,
+    'float8': struct.Struct('>d').pack,
+    'bool': lambda value: b'\x01' if value else b'\x00',
+    'numeric': _encode_numeric,
+    'text': _encode_text,
+    'varchar': _encode_text,
+    'json': _encode_text,
+    'jsonb': lambda value: b'\x01' + str(value).encode(),
+    'bytea': bytes,
+}
+_BINARY_HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('>ii', 0, 0)
+_BINARY_TRAILER = struct.pack('>h', -1)
+_NULL_FIELD = struct.pack('>i', -1)
+
+def column_types(cursor, table, columns):
+    """Postgres type names (pg_type.typname) of the given columns, in order"""
+    cursor.execute("""
+        SELECT a.attname, t.typname
+        FROM pg_attribute a JOIN pg_type t ON t.oid = a.atttypid
+        WHERE a.attrelid = %s::regclass AND a.attnum > 0 AND NOT a.attisdropped
+    """, (table,))
+    types = {row[0]: row[1] for row in db.fetch_rows(cursor)}
+    missing = [column for column in columns if column not in types]
+    if missing:
+        raise ValueError(f"{table} has no column(s) {', '.join(missing)}")
+    return [types[column] for column in columns]
+
+def binary_chunks(rows, types):
+    """Serialize rows as COPY binary format for columns of the given Postgres types"""
+    unsupported = [name for name in types if name not in _BINARY_ENCODERS]
+    if unsupported:
+        raise ValueError(f"No binary COPY encoder for type(s) {', '.join(unsupported)}")
+    encoders = [_BINARY_ENCODERS[name] for name in types]
+    field_count = struct.pack('>h', len(types))
+    pack_length = struct.Struct('>i').pack
+
+    parts = [_BINARY_HEADER]
+    rows_in_chunk = 0
+    for row in rows:
+        parts.append(field_count)
+        for encode, value in zip(encoders, row):
+            if value is None:
+                parts.append(_NULL_FIELD)
+            else:
+                data = encode(value)
+                parts.append(pack_length(len(data)))
+                parts.append(data)
+        rows_in_chunk += 1
+        if rows_in_chunk >= ROWS_PER_CHUNK:
+            yield b''.join(parts)
+            parts = []
+            rows_in_chunk = 0
+    parts.append(_BINARY_TRAILER)
+    yield b''.join(parts)
+
+class CopyStream:
+    """Read-only file object over an iterator of bytes chunks, for copy_expert()"""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = bytearray()
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        if size < 0 or size >= len(self._buffer):
+            data = bytes(self._buffer)
+            self._buffer.clear()
+        else:
+            data = bytes(self._buffer[:size])
+            del self._buffer[:size]
+        return data
+
+def copy_rows(cursor, table, columns, rows, copy_format='text'):
+    """COPY rows (an iterable of tuples in column order) into table, returning the row count"""
+    if copy_format not in COPY_FORMATS:
+        raise ValueError(f"copy_format must be one of {COPY_FORMATS}, got {copy_format!r}")
+
+    count = 0
+    def counted():
+        nonlocal count
+        for row in rows:
+            count += 1
+            yield row
+
+    column_list = ', '.join(columns)
+    if copy_format == 'binary':
+        chunks = binary_chunks(counted(), column_types(cursor, table, columns))
+        sql = f"COPY {table} ({column_list}) FROM STDIN WITH (FORMAT binary)"
+    else:
+        chunks = text_chunks(counted())
+        sql = f"COPY {table} ({column_list}) FROM STDIN"
+    cursor.copy_expert(sql, CopyStream(chunks), size=COPY_BUFFER_SIZE)
+    return count
+
+def reserve_sequence_ids(cursor, count, table='pose_sequences'):
+    """Take count ids from the table's id sequence in one round trip"""
+    if count <= 0:
+        return []
+    cursor.execute("SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)",
+                   (table, count))
+    return [row[0] for row in db.fetch_rows(cursor)]
+
+def has_column(cursor, table, column):
+    cursor.execute("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = %s AND column_name = %s
+    """, (table, column))
+    return bool(cursor.fetchall())
+
+def _ensure_sequence_column(cursor, column, column_type):
+    # Checked first because ALTER TABLE locks the whole table until commit,
+    # even when the column already exists
+    if not has_column(cursor, 'pose_sequences', column):
+        cursor.execute(f"ALTER TABLE pose_sequences ADD COLUMN IF NOT EXISTS {column} {column_type}")
+
+def ensure_keypoints_json_column(cursor):
+    """Add pose_sequences.keypoints_json (used by the json layout) if it is missing"""
+    _ensure_sequence_column(cursor, 'keypoints_json', 'TEXT')
+
+def ensure_frame_hash_column(cursor):
+    """Add pose_sequences.frame_hash (see frame_hash()) if it is missing"""
+    _ensure_sequence_column(cursor, 'frame_hash', 'BIGINT')
+
+def frame_hash(layout, timestamp, pose_detected, fps, keypoints_json):
+    """64-bit hash of everything a frame writes, as a signed BIGINT.
+
+    The layout is included so switching a video's layout rewrites every
+    frame.
+    """
+    data = f"{layout}\t{timestamp!r}\t{pose_detected}\t{fps!r}\t{keypoints_json}".encode()
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'big', signed=True)
+
+def find_or_create_video(cursor, name, description, category, difficulty, duration_seconds,
+                         youtube_url=None, match=None):
+    """Return (video_id, created) for the martial_arts_videos row named like match (default: name)"""
+    cursor.execute("SELECT id FROM martial_arts_videos WHERE name LIKE %s ORDER BY id LIMIT 1",
+                   (match or name,))
+    existing = db.fetch_rows(cursor)
+    if existing:
+        return existing[0][0], False
+
+    cursor.execute("""
+        INSERT INTO martial_arts_videos (name, description, category, difficulty, duration_seconds, youtube_url)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        RETURNING id
+    """, (name, description, category, difficulty, duration_seconds, youtube_url))
+    return db.fetch_rows(cursor)[0][0], True
+
+def clear_pose_rows(cursor, video_id, start_frame=None, end_frame=None, partitioned=None):
+    """Delete a video's pose sequences and keypoints, optionally only [start_frame, end_frame).
+
+    Unpartitioned keypoints go by cascade; partitioned ones have no
+    foreign key to their sequences and are deleted first.
+    """
+    if partitioned is None:
+        partitioned = is_partitioned(cursor)
+    if start_frame is None and end_frame is None:
+        if partitioned:
+            cursor.execute("DELETE FROM pose_keypoints WHERE video_id = %s", (video_id,))
+        cursor.execute("DELETE FROM pose_sequences WHERE video_id = %s", (video_id,))
+        return
+
+    in_segment = "video_id = %s AND frame_number >= %s AND (%s IS NULL OR frame_number < %s)"
+    params = (video_id, start_frame or 0, end_frame, end_frame)
+    if partitioned:
+        cursor.execute(f"""
+            DELETE FROM pose_keypoints
+            WHERE video_id = %s AND sequence_id IN (SELECT id FROM pose_sequences WHERE {in_segment})
+        """, (video_id,) + params)
+    cursor.execute(f"DELETE FROM pose_sequences WHERE {in_segment}", params)
+
+def remove_video(cursor, video_id):
+    """Delete a video record with all of its pose data, dropping its partitions"""
+    drop_video_partitions(cursor, video_id)
+    cursor.execute("DELETE FROM martial_arts_videos WHERE id = %s", (video_id,))
+
+class _PrefetchError:
+    def __init__(self, error):
+        self.error = error
+
+_PREFETCH_DONE = object()
+
+def prefetch(iterable, max_items=PREFETCH_FRAMES):
+    """Iterate over iterable on a background thread, at most max_items ahead.
+
+    Lets parsing run while the consumer is blocked sending data; errors
+    from the iterable are raised in the consumer.
+    """
+    items = queue.Queue(maxsize=max_items)
+    stopped = threading.Event()
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+        except Exception as e:
+            put(_PrefetchError(e))
+        else:
+            put(_PREFETCH_DONE)
+
+    thread = threading.Thread(target=produce, name='pose-prefetch', daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = items.get()
+            if item is _PREFETCH_DONE:
+                return
+            if isinstance(item, _PrefetchError):
+                raise item.error
+            yield item
+    finally:
+        stopped.set()
+        thread.join()
+
+def _frame_number(frame, index):
+    return frame.get('frame_number', index)
+
+def sequence_row(layout, video_id, index, frame, fps):
+    """A frame's pose_sequences row: SEQUENCE_JSON_COLUMNS, or SEQUENCE_COLUMNS without id for rows"""
+    keypoints_json = json.dumps(frame['keypoints'])
+    if layout == 'json':
+        pose_detected = bool(frame['keypoints'])
+        return (video_id, _frame_number(frame, index), frame['timestamp'], pose_detected, fps,
+                frame_hash(layout, frame['timestamp'], pose_detected, fps, keypoints_json), keypoints_json)
+    return (video_id, _frame_number(frame, index), frame['timestamp'], frame['pose_detected'], fps,
+            frame_hash(layout, frame['timestamp'], frame['pose_detected'], fps, keypoints_json))
+
+def keypoint_rows(row_prefix, frames_with_ids):
+    """pose_keypoints rows (row_prefix + KEYPOINT_COLUMNS) for (sequence id, frame) pairs"""
+    return (row_prefix + (sequence_id, kp['id'], kp['name'], kp['x'], kp['y'], kp['z'], kp['visibility'])
+            for sequence_id, frame in frames_with_ids if frame['pose_detected']
+            for kp in frame['keypoints'])
+
+def copy_pose_frames(cursor, video_id, frames, fps, layout='rows', copy_format='text', detected_only=False,
+                     batch_frames=None, tables=POSE_TABLES, partitioned=None):
+    """COPY frames into pose_sequences (and pose_keypoints for the rows layout).
+
+    frames may be any iterable, including a lazy reader from
+    pose_io.open_pose_file(). It is consumed a batch at a time, one COPY
+    per table per batch, with batches sized by batch_frames: an
+    AdaptiveBatchSize (see batch_sizer.py; a default one if None) or a
+    fixed number of frames. tables names the
+    (sequences, keypoints) tables to write, e.g. staging tables. Keypoint
+    rows carry video_id when the pose tables are partitioned (looked up
+    if partitioned is None). Returns (sequence rows, keypoint rows)
+    written.
+    """
+    if layout not in LAYOUTS:
+        raise ValueError(f"layout must be one of {LAYOUTS}, got {layout!r}")
+    if partitioned is None:
+        partitioned = is_partitioned(cursor)
+    keypoint_columns = ('video_id',) + KEYPOINT_COLUMNS if partitioned else KEYPOINT_COLUMNS
+    row_prefix = (video_id,) if partitioned else ()
+
+    prof = profiler.get()
+    sizer = batch_sizer(batch_frames)
+    # reserve ids + sequences COPY + keypoints COPY, or a single COPY
+    sizer.calibrate(cursor, 3 if layout == 'rows' else 1)
+    sequences_table, keypoints_table = tables
+    sequence_total = keypoint_total = 0
+    frames = ((index, frame) for index, frame in enumerate(frames)
+              if not detected_only or frame['keypoints'])
+    while True:
+        batch = list(itertools.islice(frames, sizer.size))
+        if not batch:
+            break
+
+        with sizer.measure(len(batch)) as measured:
+            if layout == 'json':
+                with prof.stage("copy_sequences"):
+                    sequences = copy_rows(cursor, sequences_table, SEQUENCE_JSON_COLUMNS, (
+                        sequence_row(layout, video_id, index, frame, fps) for index, frame in batch
+                    ), copy_format)
+                keypoints = 0
+            else:
+                with prof.stage("reserve_ids"):
+                    sequence_ids = reserve_sequence_ids(cursor, len(batch))
+                with prof.stage("copy_sequences"):
+                    sequences = copy_rows(cursor, sequences_table, SEQUENCE_COLUMNS, (
+                        (sequence_id,) + sequence_row(layout, video_id, index, frame, fps)
+                        for sequence_id, (index, frame) in zip(sequence_ids, batch)
+                    ), copy_format)
+                with prof.stage("copy_keypoints"):
+                    keypoints = copy_rows(cursor, keypoints_table, keypoint_columns, keypoint_rows(
+                        row_prefix, ((sequence_id, frame) for sequence_id, (_, frame) in zip(sequence_ids, batch))),
+                        copy_format)
+            measured.rows = sequences + keypoints
+        sequence_total += sequences
+        keypoint_total += keypoints
+
+    prof.count("rows", sequence_total + keypoint_total)
+    return sequence_total, keypoint_total
+
+class DatabasePoseWriter:
+    """Copy frames into a video's pose rows on a background thread while they are still being produced.
+
+    A writer for extraction's on_frame hook, like pose_io.NdjsonPoseWriter:
+    write_frame() queues a frame and copy_pose_frames() writes them in
+    batches on the writer's own connection. Everything happens in one
+    transaction: the video's old rows (only those in [start_frame,
+    end_frame) for a segment) are deleted first, and nothing is visible to
+    readers until finish() sets the video's duration and commits. Closing
+    without finish() rolls back.
+
+    write_frame() blocks once max_frames frames are waiting, and raises
+    if the upload has failed, so a broken connection stops the producer.
+    """
+
+    def __init__(self, video_id, fps, layout='rows', copy_format='text', start_frame=None, end_frame=None,
+                 batch_frames=None, max_frames=PREFETCH_FRAMES):
+        self.video_id = video_id
+        self.frame_count = 0
+        self.sizer = batch_sizer(batch_frames)
+        self._frames = queue.Queue(maxsize=max_frames)
+        self._closed = threading.Event()
+        self._finished = False
+        self._error = None
+        self._counts = (0, 0)
+        self._conn = db.connect()
+        try:
+            with self._conn.cursor() as cursor:
+                partitioned = is_partitioned(cursor)
+                clear_pose_rows(cursor, video_id, start_frame, end_frame, partitioned)
+        except Exception:
+            self._conn.close()
+            raise
+        self._thread = threading.Thread(target=self._upload, args=(fps, layout, copy_format, partitioned),
+                                        name='pose-db-writer', daemon=True)
+        self._thread.start()
+
+    def _queued_frames(self):
+        while True:
+            try:
+                frame = self._frames.get(timeout=0.1)
+            except queue.Empty:
+                if self._closed.is_set():
+                    raise RuntimeError("Pose upload abandoned before finish()")
+                continue
+            if frame is _PREFETCH_DONE:
+                return
+            yield frame
+
+    def _upload(self, fps, layout, copy_format, partitioned):
+        try:
+            with self._conn.cursor() as cursor:
+                self._counts = copy_pose_frames(cursor, self.video_id, self._queued_frames(), fps, layout,
+                                                copy_format, batch_frames=self.sizer, partitioned=partitioned)
+        except Exception as e:
+            self._error = e
+
+    def _put(self, item):
+        while self._thread.is_alive():
+            try:
+                self._frames.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+        if self._error:
+            raise self._error
+        raise RuntimeError("Pose upload stopped unexpectedly")
+
+    def write_frame(self, frame_data):
+        if self._error:
+            raise self._error
+        self._put(frame_data)
+        self.frame_count += 1
+
+    def finish(self, duration_seconds=None):
+        """Wait for the queued frames to be written, set the video's duration and commit.
+
+        Returns (sequence rows, keypoint rows) written.
+        """
+        prof = profiler.get()
+        with prof.stage("db_drain"):
+            self._put(_PREFETCH_DONE)
+            self._thread.join()
+        if self._error:
+            raise self._error
+        with self._conn.cursor() as cursor:
+            if duration_seconds is not None:
+                cursor.execute("UPDATE martial_arts_videos SET duration_seconds = %s WHERE id = %s",
+                               (duration_seconds, self.video_id))
+            with prof.stage("frame_json"):
+                refresh_frame_json(cursor, self.video_id)
+        with prof.stage("db_commit"):
+            self._conn.commit()
+        self._finished = True
+        return self._counts
+
+    def close(self):
+        if self._conn.closed:
+            return
+        self._closed.set()
+        self._thread.join()
+        if not self._finished:
+            self._conn.rollback()
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def _upsert_frames(cursor, video_id, changed, layout, copy_format, keypoint_columns, row_prefix,
+                   clear_json, partitioned):
+    """Upsert changed (sequence row, frame) pairs and replace their keypoints; returns keypoint rows written"""
+    prof = profiler.get()
+    columns = SEQUENCE_JSON_COLUMNS if layout == 'json' else SEQUENCE_COLUMNS[1:]
+    column_list = ', '.join(columns)
+    updates = ', '.join(f"{column} = EXCLUDED.{column}" for column in columns[2:])
+    if clear_json:
+        updates += ", keypoints_json = NULL"
+
+    with prof.stage("upsert_sequences"):
+        cursor.execute(f"""
+            CREATE TEMP TABLE IF NOT EXISTS pose_upsert ON COMMIT DROP AS
+            SELECT {column_list} FROM pose_sequences WITH NO DATA
+        """)
+        cursor.execute("TRUNCATE pose_upsert")
+        copy_rows(cursor, 'pose_upsert', columns, (row for row, _ in changed), copy_format)
+        cursor.execute(f"""
+            INSERT INTO pose_sequences ({column_list}) SELECT {column_list} FROM pose_upsert
+            ON CONFLICT (video_id, frame_number) DO UPDATE SET {updates}
+            RETURNING frame_number, id
+        """)
+        sequence_ids = dict(db.fetch_rows(cursor))
+
+    with prof.stage("replace_keypoints"):
+        # Updated frames may have keypoint rows from an earlier upload, whatever the layout
+        cursor.execute(f"""
+            DELETE FROM pose_keypoints WHERE sequence_id = ANY(%s){' AND video_id = %s' if partitioned else ''}
+        """, (list(sequence_ids.values()),) + ((video_id,) if partitioned else ()))
+        if layout == 'json':
+            return 0
+        return copy_rows(cursor, 'pose_keypoints', keypoint_columns, keypoint_rows(
+            row_prefix, ((sequence_ids[row[1]], frame) for row, frame in changed)
+        ), copy_format)
+
+def diff_pose_frames(cursor, video_id, frames, fps, layout='rows', copy_format='text', detected_only=False,
+                     batch_frames=None, partitioned=None):
+    """Bring a video's stored frames in line with frames, writing only what changed.
+
+    Each frame's frame_hash() is compared with the hash stored for its
+    frame number. New and changed frames are upserted with
+    INSERT ... ON CONFLICT (video_id, frame_number) DO UPDATE, in batches
+    sized as in copy_pose_frames(), and their keypoint rows replaced; stored frames missing
+    from frames are deleted. Unchanged frames are not written at all.
+    Frames stored before frame_hash existed have no hash and count as
+    changed. Returns a dict of inserted, updated, deleted and unchanged
+    frame counts plus the keypoint rows written.
+    """
+    if layout not in LAYOUTS:
+        raise ValueError(f"layout must be one of {LAYOUTS}, got {layout!r}")
+    if partitioned is None:
+        partitioned = is_partitioned(cursor)
+    keypoint_columns = ('video_id',) + KEYPOINT_COLUMNS if partitioned else KEYPOINT_COLUMNS
+    row_prefix = (video_id,) if partitioned else ()
+    clear_json = layout == 'rows' and has_column(cursor, 'pose_sequences', 'keypoints_json')
+
+    prof = profiler.get()
+    sizer = batch_sizer(batch_frames)
+    # temp table, truncate, COPY, upsert, keypoint delete (+ keypoints COPY)
+    sizer.calibrate(cursor, 6 if layout == 'rows' else 5)
+    with prof.stage("read_hashes"):
+        cursor.execute("SELECT frame_number, frame_hash FROM pose_sequences WHERE video_id = %s", (video_id,))
+        stored = dict(db.fetch_rows(cursor))
+
+    counts = {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": 0, "keypoints": 0}
+    seen = set()
+    changed = []
+
+    def flush():
+        with sizer.measure(len(changed)) as measured:
+            keypoints = _upsert_frames(cursor, video_id, changed, layout, copy_format, keypoint_columns,
+                                       row_prefix, clear_json, partitioned)
+            measured.rows = len(changed) + keypoints
+        counts["keypoints"] += keypoints
+
+    for index, frame in enumerate(frames):
+        if detected_only and not frame['keypoints']:
+            continue
+        row = sequence_row(layout, video_id, index, frame, fps)
+        frame_number = row[1]
+        seen.add(frame_number)
+        if frame_number not in stored:
+            counts["inserted"] += 1
+        elif stored[frame_number] != row[5]:
+            counts["updated"] += 1
+        else:
+            counts["unchanged"] += 1
+            continue
+        changed.append((row, frame))
+        if len(changed) >= sizer.size:
+            flush()
+            changed = []
+    if changed:
+        flush()
+
+    removed = [frame_number for frame_number in stored if frame_number not in seen]
+    if removed:
+        with prof.stage("delete_frames"):
+            if partitioned:
+                cursor.execute("""
+                    DELETE FROM pose_keypoints WHERE video_id = %s AND sequence_id IN (
+                        SELECT id FROM pose_sequences WHERE video_id = %s AND frame_number = ANY(%s))
+                """, (video_id, video_id, removed))
+            cursor.execute("DELETE FROM pose_sequences WHERE video_id = %s AND frame_number = ANY(%s)",
+                           (video_id, removed))
+    counts["deleted"] = len(removed)
+
+    for key in ("inserted", "updated", "deleted", "unchanged"):
+        prof.count(f"frames_{key}", counts[key])
+    prof.count("rows", counts["inserted"] + counts["updated"] + counts["keypoints"])
+    return counts
+
+def staging_tables(video_id):
+    """Names of the (sequences, keypoints) staging tables for a video's reload"""
+    return f"{STAGING_PREFIX}_sequences_{int(video_id)}", f"{STAGING_PREFIX}_keypoints_{int(video_id)}"
+
+def create_staging_tables(cursor, video_id, partitioned=False):
+    """Create empty staging tables shaped like the pose tables, dropping leftovers from a failed reload.
+
+    Ids come from the real tables' sequences, so staged rows keep their
+    ids when swapped in. With partitioned tables the staging tables
+    become the video's new partitions on swap, so they get the
+    partitions' indexes; otherwise they are unlogged and bare, since
+    their rows are copied into the real tables.
+    """
+    staging = staging_tables(video_id)
+    drop_staging_tables(cursor, video_id)
+    for table, stage in zip(POSE_TABLES, staging):
+        if partitioned:
+            cursor.execute(f"CREATE TABLE {stage} (LIKE {table} INCLUDING ALL)")
+        else:
+            cursor.execute(f"CREATE UNLOGGED TABLE {stage} (LIKE {table} INCLUDING DEFAULTS)")
+    return staging
+
+def prepare_staged_partitions(cursor, video_id):
+    """Constrain and analyze the staging tables so the swap can attach them without scanning them"""
+    for stage in staging_tables(video_id):
+        prepare_partition(cursor, stage, video_id)
+        cursor.execute(f"ANALYZE {stage}")
+
+def drop_staging_tables(cursor, video_id):
+    cursor.execute(f"DROP TABLE IF EXISTS {', '.join(staging_tables(video_id))}")
+
+def swap_in_staged_rows(cursor, video_id, lock_timeout=SWAP_LOCK_TIMEOUT, partitioned=False):
+    """Replace a video's pose rows with its staged rows and drop the staging tables.
+
+    Run in a transaction of its own; readers see either the old or the
+    new frames, never a mix. With partitioned tables the video's
+    partitions are dropped and the staging tables (already prepared by
+    prepare_staged_partitions()) attached in their place, which is
+    catalog work only, whatever the size of the video; the parents are
+    locked for those few statements. Otherwise the rows are copied over
+    with server-side set operations, which never block readers.
+    """
+    cursor.execute("SET LOCAL lock_timeout = %s", (lock_timeout,))
+    if partitioned:
+        for table, stage, partition in zip(POSE_TABLES, staging_tables(video_id), video_partitions(video_id)):
+            cursor.execute(f"DROP TABLE IF EXISTS {partition}")
+            rename_table(cursor, stage, partition)
+            attach_partition(cursor, table, partition, video_id)
+        return
+
+    clear_pose_rows(cursor, video_id, partitioned=False)
+    for table, stage in zip(POSE_TABLES, staging_tables(video_id)):
+        cursor.execute(f"INSERT INTO {table} SELECT * FROM {stage}")
+    drop_staging_tables(cursor, video_id)
+
+def vacuum_pose_tables(conn):
+    """VACUUM the pose tables so rows deleted by a reload do not linger as dead tuples"""
+    autocommit = conn.autocommit
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor, db.statement_timeout(cursor, 0):
+            cursor.execute(f"VACUUM (ANALYZE) {', '.join(POSE_TABLES)}")
+    finally:
+        conn.autocommit = autocommit
+
+def upload_form(conn, json_file, name, description, category, difficulty, youtube_url=None, match=None,
+                duration_seconds=None, layout='json', copy_format='text', detected_only=False, staged=False,
+                vacuum=True, diff=False, batch_frames=None, lossy=False):
+    """Replace the pose rows of one form video with the contents of a pose file.
+
+    The video record is found by name (LIKE match if given) or created,
+    then its partitions, each committed straight away. By
+    default everything else happens in one transaction, committed at the
+    end. With staged=True the rows are first copied into staging tables
+    and committed, then swapped in by swap_in_staged_rows() in a short
+    transaction. pose_frame_json is always refreshed in the transaction
+    that makes the new rows visible, so it never shows other frames than
+    the pose tables; a staged upload builds it from the staging tables,
+    before the swap takes its locks.
+    Unpartitioned pose tables are vacuumed afterwards unless
+    vacuum=False (e.g. to vacuum once after several reloads); a
+    partitioned swap leaves no dead rows behind.
+
+    With diff=True only the frames that differ from the stored ones are
+    written (see diff_pose_frames()), in one transaction, so readers
+    still switch from the old frames to the new ones at commit.
+
+    Batches are sized by batch_frames as in copy_pose_frames(); pass an
+    AdaptiveBatchSize to read its measurements afterwards. The pose file
+    goes through resolve_pose_file(), so a lossless .pose array next to
+    it is read instead; lossy=True also takes a float32 .pose or a
+    .posez file. Returns (video_id, sequence rows, keypoint rows)
+    written.
+    """
+    if diff and staged:
+        raise ValueError("diff uploads write in place and cannot be staged")
+    prof = profiler.get()
+    sizer = batch_sizer(batch_frames)
+    video_info, frames = open_pose_file(resolve_pose_file(json_file, lossy))
+    fps = video_info.get('fps') or 30.0
+    if duration_seconds is None:
+        duration_seconds = video_info.get('duration_seconds')
+
+    cursor = conn.cursor()
+    video_id = None
+    try:
+        video_id, created = find_or_create_video(cursor, name, description, category, difficulty,
+                                                 duration_seconds, youtube_url, match)
+        print(f"✅ {'Created new' if created else 'Found existing'} video record for {name} with ID: {video_id}")
+        # Before create_video_partitions(), which would otherwise deadlock with another loader's new video
+        conn.commit()
+        if layout == 'json':
+            ensure_keypoints_json_column(cursor)
+        ensure_frame_hash_column(cursor)
+        partitioned = is_partitioned(cursor)
+        if create_video_partitions(cursor, video_id):
+            conn.commit()
+        if diff:
+            print(f"🔍 Comparing pose data for {name} with the stored frames ({layout} layout)...")
+            counts = diff_pose_frames(cursor, video_id, prefetch(frames), fps, layout, copy_format, detected_only,
+                                      sizer, partitioned)
+            with prof.stage("frame_json"):
+                refresh_frame_json(cursor, video_id)
+            with prof.stage("commit"):
+                conn.commit()
+            sequences, keypoints = counts["inserted"] + counts["updated"], counts["keypoints"]
+            print(f"🎉 Uploaded {name}: {sequences} frames changed ({counts['inserted']} new, "
+                  f"{counts['updated']} updated), {counts['deleted']} deleted, {counts['unchanged']} unchanged"
+                  + (f", {keypoints} keypoints" if keypoints else ""))
+            print(f"📏 {name}: {sizer.summary()}")
+            return video_id, sequences, keypoints
+
+        if staged:
+            tables = create_staging_tables(cursor, video_id, partitioned)
+            conn.commit()
+        else:
+            tables = POSE_TABLES
+            clear_pose_rows(cursor, video_id, partitioned=partitioned)
+
+        print(f"💾 Copying pose data for {name} ({layout} layout, {copy_format} COPY"
+              f"{', staged' if staged else ''})...")
+        sequences, keypoints = copy_pose_frames(cursor, video_id, prefetch(frames), fps, layout, copy_format,
+                                                detected_only, sizer, tables, partitioned)
+        prof.count("frames", sequences)
+        if staged:
+            if partitioned:
+                with prof.stage("prepare_partitions"):
+                    prepare_staged_partitions(cursor, video_id)
+            conn.commit()
+        with prof.stage("frame_json"):
+            # Built from the staged rows, which keep their ids, so the swap does not hold its locks meanwhile
+            refresh_frame_json(cursor, video_id, tables=tables)
+        if staged:
+            with prof.stage("swap"):
+                swap_in_staged_rows(cursor, video_id, partitioned=partitioned)
+        with prof.stage("commit"):
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        if staged and video_id is not None:
+            drop_staging_tables(cursor, video_id)
+            conn.commit()
+        raise
+    finally:
+        cursor.close()
+
+    if staged and vacuum and not partitioned:
+        with prof.stage("vacuum"):
+            vacuum_pose_tables(conn)
+    print(f"🎉 Uploaded {name}: {sequences} frames" + (f", {keypoints} keypoints" if keypoints else ""))
+    print(f"📏 {name}: {sizer.summary()}")
+    return video_id, sequences, keypoints
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+asyncio ingestion of pose data over psycopg 3 pipelines
+
+The psycopg2 paths in pose_ingest.py wait for each statement's result
+before sending the next one, so every batch costs at least one round trip
+per statement. Here each batch is one INSERT per table, its rows passed
+as one array per column, sent in psycopg 3's pipeline mode: a window of
+several batches (pipeline_depth) is sent without waiting, and the
+connection only waits once per window, when it reserves the next
+window's sequence ids. Several videos are loaded at
+once from one event loop, one connection each.
+
+COPY cannot run inside a pipeline, so this is the path to use when round
+trips rather than server throughput dominate, e.g. loading many videos
+into a remote database; on localhost COPY remains the faster way to load
+one video.
+
+The rows written are the same as pose_ingest.copy_pose_frames() writes
+(same columns, frame hashes and numeric values), so the sync and async
+paths can be mixed freely, including diff uploads after an async load.
+The video record and its partitions are set up with the sync helpers, on
+a thread.
+
+Needs psycopg 3 (pip install "psycopg[binary]"); the sync scripts do not.
+
+Usage:
+    python pose_ingest_async.py                              # every form in forms.json
+    python pose_ingest_async.py taegeuk-5 heian-nidan --workers 8 --depth 8
+"""
+
+import argparse
+import asyncio
+import itertools
+import sys
+import time
+
+import psycopg
+
+import db
+import profiler
+from batch_sizer import batch_sizer
+from load_forms import MANIFEST_PATH, load_manifest, print_summary, select_forms
+from pose_ingest import (KEYPOINT_COLUMNS, LAYOUTS, SEQUENCE_COLUMNS, SEQUENCE_JSON_COLUMNS,
+                         ensure_frame_hash_column, ensure_keypoints_json_column, find_or_create_video, keypoint_rows,
+                         prefetch, sequence_row)
+from pose_frame_json import ensure_frame_json_table, refresh_statements
+from pose_io import open_pose_file, resolve_pose_file
+from pose_partitions import create_video_partitions, is_partitioned
+
+DEFAULT_BATCH_FRAMES = 250
+# Batches sent before waiting for the server
+DEFAULT_PIPELINE_DEPTH = 4
+DEFAULT_WORKERS = 4
+
+async def connect(retries=db.DEFAULT_RETRIES):
+    """Open a psycopg 3 async connection configured like db.connect()"""
+    for attempt in range(retries + 1):
+        try:
+            conn = await psycopg.AsyncConnection.connect(db.get_database_url(),
+                                                         connect_timeout=db.CONNECT_TIMEOUT_SECONDS)
+            break
+        except psycopg.OperationalError:
+            if attempt == retries:
+                raise
+            await asyncio.sleep(db.backoff_seconds(attempt + 1))
+    await conn.execute("SELECT set_config('statement_timeout', %s, false)", (str(db.statement_timeout_ms()),))
+    await conn.commit()
+    return conn
+
+async def _flush(conn):
+    """Wait until libpq has sent everything queued on the connection.
+
+    psycopg's pipeline stops flushing once its command queue is empty,
+    so a statement larger than the socket buffer can be left half sent
+    while the pipeline waits for its result, and both ends wait forever.
+    """
+    loop = asyncio.get_running_loop()
+    while conn.pgconn.flush():
+        writable = loop.create_future()
+        loop.add_writer(conn.pgconn.socket, writable.set_result, None)
+        try:
+            await writable
+        finally:
+            loop.remove_writer(conn.pgconn.socket)
+
+async def _insert_sql(conn, table, columns):
+    # One array parameter per column, cast to the column's type, so a whole batch is one statement;
+    # sent in binary, which spares psycopg escaping every JSON string
+    cursor = await conn.execute("""
+        SELECT a.attname, format_type(a.atttypid, NULL) FROM pg_attribute a
+        WHERE a.attrelid = %s::regclass AND a.attnum > 0 AND NOT a.attisdropped
+    """, (table,))
+    types = dict(await cursor.fetchall())
+    arrays = ', '.join(f"%b::{types[column]}[]" for column in columns)
+    return f"INSERT INTO {table} ({', '.join(columns)}) SELECT * FROM unnest({arrays})"
+
+def _array_params(rows, width):
+    """Transpose rows into one text array per column, formatted as COPY's text format formats them"""
+    columns = [[] for _ in range(width)]
+    for row in rows:
+        for column, value in zip(columns, row):
+            column.append(None if value is None else str(value))
+    return columns
+
+async def write_pose_frames(conn, video_id, frames, fps, layout='rows', detected_only=False,
+                            batch_frames=DEFAULT_BATCH_FRAMES, pipeline_depth=DEFAULT_PIPELINE_DEPTH,
+                            partitioned=False, sizer=None):
+    """INSERT frames into pose_sequences (and pose_keypoints for the rows layout) through a pipeline.
+
+    frames may be any iterable; it is read a window of pipeline_depth
+    batches at a time on a worker thread, so parsing does not block the
+    event loop. Each batch is one pipelined INSERT per table, its rows
+    passed as one array per column. Does
+    not commit. Pass an AdaptiveBatchSize as sizer to have each window
+    recorded in it. Returns (sequence rows, keypoint rows) written.
+    """
+    if layout not in LAYOUTS:
+        raise ValueError(f"layout must be one of {LAYOUTS}, got {layout!r}")
+    sizer = sizer or batch_sizer(batch_frames * pipeline_depth)
+    keypoint_columns = ('video_id',) + KEYPOINT_COLUMNS if partitioned else KEYPOINT_COLUMNS
+    row_prefix = (video_id,) if partitioned else ()
+    sequence_columns = SEQUENCE_JSON_COLUMNS if layout == 'json' else SEQUENCE_COLUMNS
+    sequences_sql = await _insert_sql(conn, 'pose_sequences', sequence_columns)
+    keypoints_sql = await _insert_sql(conn, 'pose_keypoints', keypoint_columns)
+
+    frames = ((index, frame) for index, frame in enumerate(frames) if not detected_only or frame['keypoints'])
+    sequence_total = keypoint_total = 0
+    cursor = conn.cursor()
+    async with conn.pipeline() as pipeline:
+        while True:
+            window = await asyncio.to_thread(list, itertools.islice(frames, batch_frames * pipeline_depth))
+            if not window:
+                break
+
+            with sizer.measure(len(window)) as measured:
+                if layout == 'json':
+                    sequence_ids = [None] * len(window)
+                else:
+                    # Fetching the ids waits for the previous window, so at most one window is in flight
+                    await cursor.execute("SELECT nextval(pg_get_serial_sequence('pose_sequences', 'id')) "
+                                         "FROM generate_series(1, %s)", (len(window),))
+                    sequence_ids = [row[0] for row in await cursor.fetchall()]
+
+                keypoints = 0
+                for start in range(0, len(window), batch_frames):
+                    batch = list(zip(sequence_ids[start:start + batch_frames], window[start:start + batch_frames]))
+                    if layout == 'json':
+                        await cursor.execute(sequences_sql, _array_params((
+                            sequence_row(layout, video_id, index, frame, fps) for _, (index, frame) in batch),
+                            len(sequence_columns)))
+                        await _flush(conn)
+                        continue
+                    await cursor.execute(sequences_sql, _array_params((
+                        (sequence_id,) + sequence_row(layout, video_id, index, frame, fps)
+                        for sequence_id, (index, frame) in batch), len(sequence_columns)))
+                    await _flush(conn)
+                    rows = list(keypoint_rows(row_prefix, ((sequence_id, frame) for sequence_id, (_, frame) in batch)))
+                    if rows:
+                        await cursor.execute(keypoints_sql, _array_params(rows, len(keypoint_columns)))
+                        await _flush(conn)
+                    keypoints += len(rows)
+                if layout == 'json':
+                    await pipeline.sync()
+                measured.rows = len(window) + keypoints
+            sequence_total += len(window)
+            keypoint_total += keypoints
+        await pipeline.sync()
+
+    profiler.get().count("rows", sequence_total + keypoint_total)
+    return sequence_total, keypoint_total
+
+def _prepare_video(conn, name, description, category, difficulty, duration_seconds, youtube_url, match, layout):
+    # Sync setup on a db.py connection: the video record, its columns and partitions, and the
+    # pose_frame_json refresh to run with the load
+    with conn.cursor() as cursor:
+        video_id, created = find_or_create_video(cursor, name, description, category, difficulty,
+                                                 duration_seconds, youtube_url, match)
+        # Before create_video_partitions(), which would otherwise deadlock with another loader's new video
+        conn.commit()
+        if layout == 'json':
+            ensure_keypoints_json_column(cursor)
+        ensure_frame_hash_column(cursor)
+        create_video_partitions(cursor, video_id)
+        ensure_frame_json_table(cursor)
+        return video_id, created, is_partitioned(cursor), refresh_statements(cursor, video_id)
+
+async def upload_form(json_file, name, description, category, difficulty, youtube_url=None, match=None,
+                      duration_seconds=None, layout='json', detected_only=False, batch_frames=DEFAULT_BATCH_FRAMES,
+                      pipeline_depth=DEFAULT_PIPELINE_DEPTH, sizer=None, lossy=False):
+    """Replace the pose rows of one form video, like pose_ingest.upload_form() without staging or diffing.
+
+    The old rows are deleted, the new ones written and pose_frame_json
+    refreshed in one transaction on a connection of its own. Returns
+    (video_id, sequence rows, keypoint rows) written.
+    """
+    video_info, frames = open_pose_file(resolve_pose_file(json_file, lossy))
+    fps = video_info.get('fps') or 30.0
+    if duration_seconds is None:
+        duration_seconds = video_info.get('duration_seconds')
+    video_id, created, partitioned, refresh = await asyncio.to_thread(
+        db.run, _prepare_video, name, description, category, difficulty, duration_seconds, youtube_url, match,
+        layout)
+    print(f"✅ {'Created new' if created else 'Found existing'} video record for {name} with ID: {video_id}")
+
+    frames = prefetch(frames)
+    conn = await connect()
+    try:
+        if partitioned:
+            await conn.execute("DELETE FROM pose_keypoints WHERE video_id = %s", (video_id,))
+        await conn.execute("DELETE FROM pose_sequences WHERE video_id = %s", (video_id,))
+        print(f"💾 Pipelining pose data for {name} ({layout} layout, {pipeline_depth} batches in flight)...")
+        sequences, keypoints = await write_pose_frames(conn, video_id, frames, fps, layout, detected_only,
+                                                       batch_frames, pipeline_depth, partitioned, sizer)
+        for sql, params in refresh:
+            await conn.execute(sql, params)
+        await conn.commit()
+    except BaseException:
+        await conn.rollback()
+        raise
+    finally:
+        frames.close()
+        await conn.close()
+    print(f"🎉 Uploaded {name}: {sequences} frames" + (f", {keypoints} keypoints" if keypoints else ""))
+    return video_id, sequences, keypoints
+
+async def _load_form(form, layout, batch_frames, pipeline_depth, slots, lossy=False):
+    async with slots:
+        sizer = batch_sizer(batch_frames * pipeline_depth)
+        started = time.perf_counter()
+        video_id, sequences, keypoints = await upload_form(
+            form["pose_file"],
+            name=form["name"],
+            description=form.get("description"),
+            category=form["category"],
+            difficulty=form["difficulty"],
+            youtube_url=form.get("video"),
+            match=form.get("match"),
+            layout=layout or form.get("layout", "json"),
+            detected_only=form.get("detected_only", False),
+            batch_frames=batch_frames,
+            pipeline_depth=pipeline_depth,
+            sizer=sizer,
+            lossy=lossy,
+        )
+        seconds = time.perf_counter() - started
+        rows = sequences + keypoints
+        return {"key": form["key"], "video_id": video_id, "frames": sequences, "rows": rows, "seconds": seconds,
+                "rows_per_second": rows / seconds if seconds else 0.0, "batches": sizer.stats()}
+
+async def load_forms(forms, workers=DEFAULT_WORKERS, layout=None, batch_frames=DEFAULT_BATCH_FRAMES,
+                     pipeline_depth=DEFAULT_PIPELINE_DEPTH, lossy=False):
+    """Load manifest forms (see load_forms.load_manifest()) concurrently; returns (results, errors).
+
+    At most workers forms are in progress at once, one connection each.
+    A result's "batches" holds one measurement per pipeline window.
+    lossy is passed on to upload_form().
+    """
+    slots = asyncio.Semaphore(max(1, workers))
+    outcomes = await asyncio.gather(*(_load_form(form, layout, batch_frames, pipeline_depth, slots, lossy)
+                                      for form in forms), return_exceptions=True)
+    results = []
+    errors = []
+    for form, outcome in zip(forms, outcomes):
+        if isinstance(outcome, BaseException):
+            errors.append((form["key"], outcome))
+        else:
+            results.append(outcome)
+    return results, errors
+
+def main():
+    parser = argparse.ArgumentParser(description='Load reference forms over asyncio pipelines')
+    parser.add_argument('forms', nargs='*', help='Form keys to load (default: every form in the manifest)')
+    parser.add_argument('--manifest', default=str(MANIFEST_PATH), help=f'Forms manifest (default: {MANIFEST_PATH})')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f'Forms loaded at once, one connection each (default: {DEFAULT_WORKERS})')
+    parser.add_argument('--layout', choices=LAYOUTS, help="Override each form's keypoint layout")
+    parser.add_argument('--batch-frames', type=int, default=DEFAULT_BATCH_FRAMES,
+                        help=f'Frames per pipelined batch (default: {DEFAULT_BATCH_FRAMES})')
+    parser.add_argument('--depth', type=int, default=DEFAULT_PIPELINE_DEPTH,
+                        help=f'Batches in flight per connection (default: {DEFAULT_PIPELINE_DEPTH})')
+    parser.add_argument('--lossy', action='store_true',
+                        help='Also read a float32 .pose or a .posez file found next to a form\'s JSON')
+    parser.add_argument('--profile', help='Write a profile report (see profiler.py) to this path')
+
+    args = parser.parse_args()
+
+    forms = select_forms(load_manifest(args.manifest), args.forms)
+    if args.profile:
+        profiler.enable("pose_ingest_async", args.profile, {"forms": args.forms, "workers": args.workers})
+    try:
+        started = time.perf_counter()
+        results, errors = asyncio.run(load_forms(forms, args.workers, args.layout, args.batch_frames, args.depth,
+                                                   args.lossy))
+        print_summary(results, errors, time.perf_counter() - started)
+    finally:
+        profiler.finish()
+        db.close_pool()
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Read and write pose data files produced by extract_pose_data.py
+
+Formats:
+    .json    {"video_info": {...}, "frames": [...]} in a single document,
+             parsed incrementally one frame at a time when video_info
+             comes first (as extract_pose_data.py writes it)
+    .ndjson  a {"video_info": {...}} header line, then one compact JSON
+             frame per line, written as frames are produced
+    .pose    a columnar float32 pose array directory (see pose_array.py)
+    .posez   a quantized, delta-encoded, compressed file (see pose_codec.py)
+    .posechunks
+             the .posez encoding split into fixed-duration chunks with a
+             timestamp index, for reading time windows (see pose_archive.py)
+"""
+
+import json
+import re
+import shutil
+from pathlib import Path
+
+from pose_array import (POSE_ARRAY_SUFFIX, is_pose_array_path, iter_pose_array_frames,
+                        read_pose_array)
+from pose_archive import PoseArchive, is_pose_archive_path
+from pose_codec import POSE_CODEC_SUFFIX, is_pose_codec_path, read_pose_codec
+
+NDJSON_SUFFIXES = ('.ndjson', '.jsonl')
+JSON_READ_SIZE = 1 << 16
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+def is_ndjson_path(path):
+    """True if the path looks like a newline-delimited pose file"""
+    return Path(path).suffix.lower() in NDJSON_SUFFIXES
+
+class NdjsonPoseWriter:
+    """Append frames to a newline-delimited JSON pose file as they arrive.
+
+    Only the frame being written is held in memory, so the writer's
+    footprint does not grow with the length of the video. The video_info
+    header is written first; pass video_info=None for a headerless part
+    file that will be appended to another writer with append_part().
+    """
+
+    def __init__(self, path, video_info=None):
+        self.path = str(path)
+        self.frame_count = 0
+        self._file = open(self.path, 'w')
+        if video_info is not None:
+            self._write_line({"video_info": video_info})
+
+    def _write_line(self, record):
+        self._file.write(json.dumps(record, separators=(',', ':')))
+        self._file.write('\n')
+
+    def write_frame(self, frame_data):
+        self._write_line(frame_data)
+        self.frame_count += 1
+
+    def append_part(self, part_path, frame_count):
+        """Append a headerless part file written by another writer"""
+        self._file.flush()
+        with open(part_path) as part:
+            shutil.copyfileobj(part, self._file)
+        self.frame_count += frame_count
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def read_ndjson(path):
+    """Open an NDJSON pose file, returning (video_info, frame iterator).
+
+    Frames are parsed lazily one line at a time.
+    """
+    f = open(path)
+    try:
+        header = json.loads(f.readline())
+    except Exception:
+        f.close()
+        raise
+
+    def frames():
+        with f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    return header['video_info'], frames()
+
+class _JsonStreamParser:
+    """Pull-parser for one JSON document, decoding a value at a time from a file.
+
+    Only the value being decoded and the unread part of the current chunk
+    are held in memory.
+    """
+
+    def __init__(self, f, read_size=JSON_READ_SIZE):
+        self._file = f
+        self._read_size = read_size
+        self._decoder = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self, size=None):
+        chunk = self._file.read(size or self._read_size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def peek(self):
+        """Next non-whitespace character, or None at end of file"""
+        while True:
+            self._pos = _WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return None
+
+    def expect(self, allowed):
+        char = self.peek()
+        if char is None or char not in allowed:
+            raise ValueError(f"Expected one of {allowed!r} in JSON stream, found {char!r}")
+        self._pos += 1
+        return char
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+                # A number at the very end of the buffer may continue in the next chunk
+                if end < len(self._buffer) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            # Read at least as much again as is pending, so a value larger
+            # than a chunk is re-parsed a logarithmic number of times
+            self._fill(max(self._read_size, len(self._buffer) - self._pos))
+
+def read_json_stream(path):
+    """Open a single-document JSON pose file, returning (video_info, frame iterator).
+
+    Frames are decoded one at a time as the iterator is consumed. If the
+    document lists frames before video_info, it is loaded whole instead.
+    """
+    f = open(path)
+    try:
+        parser = _JsonStreamParser(f)
+        parser.expect('{')
+        header = {}
+        has_frames = False
+        while parser.peek() != '}':
+            key = parser.value()
+            parser.expect(':')
+            if key == 'frames':
+                has_frames = True
+                break
+            header[key] = parser.value()
+            if parser.expect(',}') == '}':
+                break
+
+        if not has_frames:
+            f.close()
+            return header['video_info'], iter(())
+        if 'video_info' not in header:
+            f.close()
+            with open(path) as whole:
+                pose_data = json.load(whole)
+            return pose_data['video_info'], iter(pose_data['frames'])
+    except Exception:
+        f.close()
+        raise
+
+    def frames():
+        with f:
+            parser.expect('[')
+            if parser.peek() == ']':
+                return
+            while True:
+                yield parser.value()
+                if parser.expect(',]') == ']':
+                    return
+
+    return header['video_info'], frames()
+
+def resolve_pose_file(path, lossy=False):
+    """Prefer a pose array next to a JSON pose file if one has been exported without loss.
+
+    taegeuk-1-full.json resolves to taegeuk-1-full.pose when that holds
+    float64 keypoints (pose_array.py --lossless). float32 arrays and
+    .posez files round the coordinates, so their frames hash differently
+    from the JSON's and a diff upload would rewrite every frame; with
+    lossy=True they are taken too, the .pose before the .posez.
+    """
+    array_path = Path(path).with_suffix(POSE_ARRAY_SUFFIX)
+    if array_path != Path(path) and (array_path / "header.json").exists():
+        if lossy or read_pose_array(array_path)["keypoints"].dtype == 'float64':
+            return array_path
+    codec_path = Path(path).with_suffix(POSE_CODEC_SUFFIX)
+    if lossy and codec_path != Path(path) and codec_path.is_file():
+        return codec_path
+    return Path(path)
+
+def open_pose_file(path):
+    """Open a pose file of any supported format, returning (video_info, frames).
+
+    Frames are read lazily in every format.
+    """
+    if is_pose_array_path(path):
+        pose_array = read_pose_array(path)
+        return pose_array["header"]["video_info"], iter_pose_array_frames(pose_array)
+
+    if is_pose_codec_path(path):
+        pose_array = read_pose_codec(path)
+        return pose_array["header"]["video_info"], iter_pose_array_frames(pose_array)
+
+    if is_pose_archive_path(path):
+        archive = PoseArchive(path)
+        return archive.index["video_info"], archive.iter_frames()
+
+    if is_ndjson_path(path):
+        return read_ndjson(path)
+
+    return read_json_stream(path)
+
+def load_pose_data(path):
+    """Load a pose file of any supported format into the standard dict"""
+    if not (is_pose_array_path(path) or is_pose_codec_path(path) or is_pose_archive_path(path)
+            or is_ndjson_path(path)):
+        with open(path) as f:
+            return json.load(f)
+
+    video_info, frames = open_pose_file(path)
+    return {"video_info": video_info, "frames": list(frames)}
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+Per-video list partitions for pose_sequences and pose_keypoints
+
+Both pose tables are partitioned by video_id with one partition per video
+(pose_sequences_v<id>, pose_keypoints_v<id>), so each video's rows and
+indexes are their own small tables. A per-video read is pruned to its two
+partitions, and a reload only touches, vacuums and reindexes its own
+video's partitions, whatever the size of the catalogue.
+
+pose_keypoints carries video_id so it can be partitioned the same way and
+so readers can join on (video_id, sequence_id). There is no foreign key
+from keypoints to sequences: a video's two partitions are created,
+swapped and dropped together, and both tables reference
+martial_arts_videos with ON DELETE CASCADE.
+
+There is no default partition. The loaders create a video's partitions
+when they add the video (create_video_partitions()) and drop them when it
+is removed (drop_video_partitions()); a row for a video without
+partitions is rejected rather than left in a shared heap.
+
+Databases created before partitioning are migrated in place with
+migrate(), which copies the existing heaps into partitions in one
+transaction. The pose tables are locked against readers as well as
+writers until it commits, so run it when the app can be paused.
+
+Usage:
+    python pose_partitions.py status
+    python pose_partitions.py migrate [--keep-old]
+    python pose_partitions.py prune      # drop partitions of deleted videos
+"""
+
+import argparse
+import sys
+
+import db
+
+POSE_TABLES = ('pose_sequences', 'pose_keypoints')
+PARTITION_SUFFIX = '_v'
+# Suffix given to the unpartitioned tables (and their indexes) by migrate(--keep-old)
+HEAP_SUFFIX = '_heap'
+
+POSE_SCHEMA_SQL = """
+-- Pre-extracted pose sequences, one partition per video
+CREATE SEQUENCE IF NOT EXISTS pose_sequences_id_seq AS INTEGER;
+CREATE TABLE IF NOT EXISTS pose_sequences (
+    id INTEGER NOT NULL DEFAULT nextval('pose_sequences_id_seq'),
+    video_id INTEGER NOT NULL REFERENCES martial_arts_videos(id) ON DELETE CASCADE,
+    frame_number INTEGER NOT NULL,
+    timestamp_seconds DECIMAL(8,3) NOT NULL,
+    pose_detected BOOLEAN NOT NULL DEFAULT FALSE,
+    fps DECIMAL(8,2),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (video_id, id),
+    UNIQUE (video_id, frame_number)
+) PARTITION BY LIST (video_id);
+ALTER SEQUENCE pose_sequences_id_seq OWNED BY pose_sequences.id;
+
+-- Individual keypoints for each frame, partitioned like pose_sequences
+CREATE SEQUENCE IF NOT EXISTS pose_keypoints_id_seq AS INTEGER;
+CREATE TABLE IF NOT EXISTS pose_keypoints (
+    id INTEGER NOT NULL DEFAULT nextval('pose_keypoints_id_seq'),
+    video_id INTEGER NOT NULL REFERENCES martial_arts_videos(id) ON DELETE CASCADE,
+    sequence_id INTEGER NOT NULL,
+    keypoint_id INTEGER NOT NULL,
+    keypoint_name VARCHAR(50) NOT NULL,
+    x DECIMAL(10,8) NOT NULL,
+    y DECIMAL(10,8) NOT NULL,
+    z DECIMAL(10,8),
+    visibility DECIMAL(6,4),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (video_id, id)
+) PARTITION BY LIST (video_id);
+ALTER SEQUENCE pose_keypoints_id_seq OWNED BY pose_keypoints.id;
+
+-- Indexes are created on every partition
+CREATE INDEX IF NOT EXISTS idx_pose_sequences_video_timestamp
+ON pose_sequences(video_id, timestamp_seconds);
+
+CREATE INDEX IF NOT EXISTS idx_pose_keypoints_sequence
+ON pose_keypoints(video_id, sequence_id);
+
+CREATE INDEX IF NOT EXISTS idx_pose_keypoints_name
+ON pose_keypoints(keypoint_name);
+"""
+
+def partition_name(table, video_id):
+    """Name of a pose table's partition for one video, e.g. pose_sequences_v12"""
+    return f"{table}{PARTITION_SUFFIX}{int(video_id)}"
+
+def video_partitions(video_id):
+    """Names of the (sequences, keypoints) partitions for a video"""
+    return tuple(partition_name(table, video_id) for table in POSE_TABLES)
+
+def table_kind(cursor, table):
+    """'partitioned', 'table' or None if the table does not exist"""
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+    rows = db.fetch_rows(cursor)
+    if not rows:
+        return None
+    return 'partitioned' if rows[0][0] == 'p' else 'table'
+
+def is_partitioned(cursor):
+    """Whether pose_sequences is the partitioned table (rather than a pre-partitioning heap)"""
+    return table_kind(cursor, 'pose_sequences') == 'partitioned'
+
+def partitioned_videos(cursor):
+    """Video ids that have a pose_sequences partition"""
+    cursor.execute("""
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'pose_sequences'::regclass
+    """)
+    prefix = f"pose_sequences{PARTITION_SUFFIX}"
+    return sorted(int(name[len(prefix):]) for (name,) in db.fetch_rows(cursor)
+                  if name.startswith(prefix) and name[len(prefix):].isdigit())
+
+def prepare_partition(cursor, partition, video_id, video_fk=True):
+    """Turn a table created LIKE a pose table into an attachable partition for video_id.
+
+    The CHECK constraint lets ATTACH PARTITION skip scanning the table,
+    and adding the video foreign key here means ATTACH adopts it instead
+    of validating a new one while it holds its locks. Both scan the table
+    once, so call it before the rows go live.
+    """
+    cursor.execute(f"ALTER TABLE {partition} ADD CHECK (video_id = {int(video_id)})")
+    if video_fk:
+        cursor.execute(f"""
+            ALTER TABLE {partition} ADD FOREIGN KEY (video_id)
+            REFERENCES martial_arts_videos(id) ON DELETE CASCADE
+        """)
+
+def attach_partition(cursor, table, partition, video_id):
+    cursor.execute(f"ALTER TABLE {table} ATTACH PARTITION {partition} FOR VALUES IN ({int(video_id)})")
+
+def create_video_partitions(cursor, video_id):
+    """Create and attach a video's empty partitions if it does not have them.
+
+    Created standalone and attached, because ATTACH PARTITION only blocks
+    other DDL on the parent while CREATE TABLE ... PARTITION OF blocks
+    readers too. Commit soon after: the parent stays locked against other
+    loaders creating partitions until then. The video foreign key locks
+    martial_arts_videos against writes too, so commit a newly inserted
+    video row first: two loaders each holding their own insert would
+    deadlock here. Returns True if they were created; does nothing on
+    unpartitioned tables.
+    """
+    if not is_partitioned(cursor) or video_id in partitioned_videos(cursor):
+        return False
+    for table, partition in zip(POSE_TABLES, video_partitions(video_id)):
+        cursor.execute(f"CREATE TABLE {partition} (LIKE {table} INCLUDING ALL)")
+        prepare_partition(cursor, partition, video_id)
+        attach_partition(cursor, table, partition, video_id)
+    return True
+
+def drop_video_partitions(cursor, video_id):
+    """Drop a video's partitions, and with them all of its pose rows"""
+    cursor.execute(f"DROP TABLE IF EXISTS {', '.join(reversed(video_partitions(video_id)))}")
+
+def rename_table(cursor, old, new):
+    """Rename a table along with the indexes and constraints named after it"""
+    cursor.execute(f"ALTER TABLE {old} RENAME TO {new}")
+    cursor.execute("""
+        SELECT conname, contype IN ('p', 'u', 'x') FROM pg_constraint WHERE conrelid = %s::regclass
+    """, (new,))
+    constraints = db.fetch_rows(cursor)
+    cursor.execute("""
+        SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s
+    """, (new,))
+    # Renaming an index renames its constraint too
+    names = [(name, True) for (name,) in db.fetch_rows(cursor)]
+    names += [(name, False) for name, has_index in constraints if not has_index]
+    for name, is_index in names:
+        for prefix in (old, f"idx_{old}"):
+            if name.startswith(prefix):
+                renamed = (prefix.replace(old, new) + name[len(prefix):])[:63]
+                if is_index:
+                    cursor.execute(f"ALTER INDEX {name} RENAME TO {renamed}")
+                else:
+                    cursor.execute(f"ALTER TABLE {new} RENAME CONSTRAINT {name} TO {renamed}")
+                break
+
+def _columns(cursor, table):
+    cursor.execute("""
+        SELECT a.attname FROM pg_attribute a
+        WHERE a.attrelid = %s::regclass AND a.attnum > 0 AND NOT a.attisdropped
+        ORDER BY a.attnum
+    """, (table,))
+    return [row[0] for row in db.fetch_rows(cursor)]
+
+def migrate(conn, keep_old=False):
+    """Move unpartitioned pose tables into the partitioned schema, in one transaction.
+
+    Renaming the old tables needs an ACCESS EXCLUSIVE lock, so readers
+    and writers are both blocked until the commit, for as long as the
+    copy takes. Ids are kept, and so are the id sequences. Sequences with no video_id, which no reader can reach,
+    are not migrated. Returns the number of videos partitioned, or None if
+    there was nothing to migrate.
+    """
+    cursor = conn.cursor()
+    try:
+        if table_kind(cursor, 'pose_sequences') != 'table':
+            return None
+
+        # Copying every video can outlast the session's statement_timeout (see db.py)
+        cursor.execute("SET LOCAL statement_timeout = 0")
+        # Taken up front rather than upgraded from a weaker lock by the renames, which could deadlock
+        cursor.execute("LOCK TABLE pose_sequences, pose_keypoints IN ACCESS EXCLUSIVE MODE")
+        sequence_columns = _columns(cursor, 'pose_sequences')
+        keypoint_columns = _columns(cursor, 'pose_keypoints')
+
+        # Move the heaps and their id sequences out of the way of the new schema
+        for table in POSE_TABLES:
+            heap = table + HEAP_SUFFIX
+            rename_table(cursor, table, heap)
+            cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", (heap,))
+            id_sequence = db.fetch_rows(cursor)[0][0]
+            if id_sequence:
+                cursor.execute(f"ALTER SEQUENCE {id_sequence} OWNED BY NONE")
+                if id_sequence.split('.')[-1].strip('"') != f"{table}_id_seq":
+                    cursor.execute(f"ALTER SEQUENCE {id_sequence} RENAME TO {table}_id_seq")
+
+        cursor.execute(POSE_SCHEMA_SQL)
+        for table, heap_columns in zip(POSE_TABLES, (sequence_columns, keypoint_columns)):
+            # Columns added since the schema was written, e.g. keypoints_json
+            extra = [column for column in heap_columns if column not in _columns(cursor, table)]
+            for column in extra:
+                cursor.execute("""
+                    SELECT format_type(atttypid, atttypmod) FROM pg_attribute
+                    WHERE attrelid = %s::regclass AND attname = %s
+                """, (table + HEAP_SUFFIX, column))
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {db.fetch_rows(cursor)[0][0]}")
+
+        cursor.execute("SELECT DISTINCT video_id FROM pose_sequences_heap WHERE video_id IS NOT NULL")
+        video_ids = sorted(row[0] for row in db.fetch_rows(cursor))
+        for video_id in video_ids:
+            create_video_partitions(cursor, video_id)
+
+        columns = ', '.join(sequence_columns)
+        cursor.execute(f"""
+            INSERT INTO pose_sequences ({columns})
+            SELECT {columns} FROM pose_sequences_heap WHERE video_id IS NOT NULL
+        """)
+        columns = ', '.join(column for column in keypoint_columns if column != 'video_id')
+        cursor.execute(f"""
+            INSERT INTO pose_keypoints (video_id, {columns})
+            SELECT s.video_id, {', '.join(f'k.{column}' for column in columns.split(', '))}
+            FROM pose_keypoints_heap k JOIN pose_sequences_heap s ON s.id = k.sequence_id
+            WHERE s.video_id IS NOT NULL
+        """)
+
+        if not keep_old:
+            cursor.execute("DROP TABLE pose_keypoints_heap, pose_sequences_heap")
+        cursor.execute("ANALYZE pose_sequences")
+        cursor.execute("ANALYZE pose_keypoints")
+        conn.commit()
+        return len(video_ids)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+def prune_partitions(cursor):
+    """Drop partitions whose video no longer exists; returns their video ids"""
+    cursor.execute("SELECT id FROM martial_arts_videos")
+    existing = {row[0] for row in db.fetch_rows(cursor)}
+    orphans = [video_id for video_id in partitioned_videos(cursor) if video_id not in existing]
+    for video_id in orphans:
+        drop_video_partitions(cursor, video_id)
+    return orphans
+
+def print_status(cursor):
+    kind = table_kind(cursor, 'pose_sequences')
+    if kind != 'partitioned':
+        print(f"❌ pose_sequences is {'missing' if kind is None else 'not partitioned'}"
+              f"{'; run: python pose_partitions.py migrate' if kind else ''}")
+        return
+    cursor.execute("SELECT id, name FROM martial_arts_videos")
+    names = dict(db.fetch_rows(cursor))
+    video_ids = partitioned_videos(cursor)
+    print(f"📊 {len(video_ids)} video partition(s)")
+    for video_id in video_ids:
+        sizes = []
+        for partition in video_partitions(video_id):
+            cursor.execute("""
+                SELECT reltuples::bigint, pg_total_relation_size(oid) FROM pg_class WHERE oid = %s::regclass
+            """, (partition,))
+            sizes.append(db.fetch_rows(cursor)[0])
+        (frames, sequence_bytes), (keypoints, keypoint_bytes) = sizes
+        print(f"   - video {video_id:>4} {names.get(video_id, '(deleted)'):<24} ~{max(frames, 0):>6} frames, "
+              f"~{max(keypoints, 0):>8} keypoints, {(sequence_bytes + keypoint_bytes) / 1e6:7.1f}MB")
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage per-video partitions of the pose tables')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('status', help='List video partitions and their approximate sizes')
+    migrate_parser = subparsers.add_parser('migrate', help='Move unpartitioned pose tables into partitions')
+    migrate_parser.add_argument('--keep-old', action='store_true',
+                                help=f'Keep the old tables, renamed with a {HEAP_SUFFIX} suffix')
+    subparsers.add_parser('prune', help='Drop partitions of videos that no longer exist')
+
+    args = parser.parse_args()
+
+    conn = db.connect()
+    try:
+        if args.command == 'migrate':
+            videos = migrate(conn, args.keep_old)
+            if videos is None:
+                print("✅ Nothing to migrate: pose tables are already partitioned (or missing)")
+            else:
+                print(f"✅ Migrated pose data for {videos} video(s) into partitions")
+        elif args.command == 'prune':
+            with conn, conn.cursor() as cursor:
+                orphans = prune_partitions(cursor)
+            print(f"✅ Dropped partitions of {len(orphans)} deleted video(s)"
+                  + (f": {', '.join(map(str, orphans))}" if orphans else ""))
+        else:
+            with conn.cursor() as cursor:
+                print_status(cursor)
+    finally:
+        conn.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Landmark-guided region-of-interest cropping for pose inference
+
+The performer in a form video fills a box that moves slowly, so most of
+each full-resolution frame is background. RoiCropper crops each frame to a
+padded box around the previous frame's landmarks and downscales it to an
+inference size before it reaches MediaPipe, then maps the landmarks back
+to normalized full-frame coordinates. When no pose was found on the
+previous frame the whole frame is used at full resolution.
+
+MediaPipe tracks and smooths landmarks in the coordinates of the image it
+is given, so the crop only moves when the pose gets close to its edge or
+fills much less of it; between moves consecutive frames share one
+coordinate frame. Full frames should go to a separate static-image Pose
+instance: a tracking instance that sees both full frames and crops loses
+the pose on every switch, because its tracking ROI is in the wrong
+coordinates.
+"""
+
+import cv2
+import numpy as np
+
+DEFAULT_ROI_PADDING = 0.25
+DEFAULT_INFERENCE_SIZE = 640
+# Landmarks below this visibility are often guesses outside the frame
+MIN_ROI_VISIBILITY = 0.3
+# Re-crop when the pose comes within this fraction of the crop's edge...
+EDGE_MARGIN = 0.08
+# ...or when the crop is this many times larger than needed
+MAX_CROP_SLACK = 2.0
+
+def roi_settings(padding=DEFAULT_ROI_PADDING, inference_size=DEFAULT_INFERENCE_SIZE):
+    """ROI parameters as stored in extraction settings and cache keys"""
+    return {"padding": padding, "inference_size": inference_size}
+
+def _landmark_box(landmarks, region, min_visibility=MIN_ROI_VISIBILITY):
+    """Bounding box (x0, y0, x1, y1) in full-frame pixels of the visible landmarks"""
+    x0, y0, width, height = region
+    xs = [x0 + lm.x * width for lm in landmarks.landmark if lm.visibility >= min_visibility]
+    ys = [y0 + lm.y * height for lm in landmarks.landmark if lm.visibility >= min_visibility]
+    if not xs:
+        return None
+    return min(xs), min(ys), max(xs), max(ys)
+
+class RoiCropper:
+    """Crop frames around the last detected pose and map landmarks back.
+
+    For each frame call crop() to get the image to run inference on and
+    its region (None for the full frame), then pass the results to
+    restore(), which rewrites pose_landmarks in place as normalized
+    full-frame coordinates and picks the next crop.
+    """
+
+    def __init__(self, padding=DEFAULT_ROI_PADDING, inference_size=DEFAULT_INFERENCE_SIZE):
+        self.padding = padding
+        self.inference_size = inference_size
+        self._region = None
+        self._frame_size = None
+        self.full_frames = 0
+        self.cropped_frames = 0
+
+    def crop(self, image_rgb):
+        """Return (image for inference, region) where region is (x0, y0, width, height).
+
+        Full frames are returned unchanged, at full resolution so small
+        performers are still found, with region None.
+        """
+        frame_height, frame_width = image_rgb.shape[:2]
+        self._frame_size = (frame_width, frame_height)
+        region = self._region
+        if region is None:
+            self.full_frames += 1
+            return image_rgb, None
+
+        self.cropped_frames += 1
+        x0, y0, width, height = region
+        image = np.ascontiguousarray(image_rgb[y0:y0 + height, x0:x0 + width])
+        longest = max(width, height)
+        if self.inference_size and longest > self.inference_size:
+            scale = self.inference_size / longest
+            image = cv2.resize(image, (max(1, round(width * scale)), max(1, round(height * scale))),
+                               interpolation=cv2.INTER_LINEAR)
+        return image, region
+
+    def restore(self, results, region):
+        """Map landmarks from the crop back to the full frame and choose the next crop"""
+        frame_width, frame_height = self._frame_size
+        landmarks = results.pose_landmarks
+        if landmarks is None:
+            self._region = None
+            return results
+
+        if region is not None:
+            x0, y0, width, height = region
+            for lm in landmarks.landmark:
+                lm.x = (x0 + lm.x * width) / frame_width
+                lm.y = (y0 + lm.y * height) / frame_height
+                # z uses roughly the same scale as x
+                lm.z = lm.z * width / frame_width
+
+        self._region = self._next_region(landmarks)
+        return results
+
+    def _next_region(self, landmarks):
+        frame_width, frame_height = self._frame_size
+        box = _landmark_box(landmarks, (0, 0, frame_width, frame_height))
+        if box is None:
+            return None
+
+        bx0, by0, bx1, by1 = box
+        # Square box around the pose, padded on every side
+        size = max(bx1 - bx0, by1 - by0) * (1 + 2 * self.padding)
+        if self._region:
+            x0, y0, width, height = self._region
+            margin_x, margin_y = width * EDGE_MARGIN, height * EDGE_MARGIN
+            inside = (bx0 >= x0 + margin_x and by0 >= y0 + margin_y
+                      and bx1 <= x0 + width - margin_x and by1 <= y0 + height - margin_y)
+            if inside and max(width, height) <= size * MAX_CROP_SLACK:
+                return self._region
+
+        center_x, center_y = (bx0 + bx1) / 2, (by0 + by1) / 2
+        x0 = int(max(0, center_x - size / 2))
+        y0 = int(max(0, center_y - size / 2))
+        x1 = int(min(frame_width, center_x + size / 2))
+        y1 = int(min(frame_height, center_y + size / 2))
+        if x1 - x0 < 16 or y1 - y0 < 16:
+            return None
+        if (x0, y0, x1, y1) == (0, 0, frame_width, frame_height):
+            return None
+        return x0, y0, x1 - x0, y1 - y0
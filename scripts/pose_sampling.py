@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Motion-adaptive frame sampling for pose extraction
+
+Reference forms contain long still stretches (bows, ready stances) where
+running MediaPipe on every frame gains nothing. MotionSampler compares a
+small grayscale thumbnail of each decoded frame against the last frame
+that was sent to inference and only runs inference again once the mean
+pixel difference exceeds a threshold, or after max_skip frames at most.
+Keypoints for skipped frames are linearly interpolated between the
+inferred frames on either side and the frames are marked
+"interpolated": true.
+"""
+
+import cv2
+import numpy as np
+
+DEFAULT_MOTION_THRESHOLD = 2.0
+DEFAULT_MAX_SKIP = 15
+THUMBNAIL_SIZE = (64, 36)
+
+def sampling_settings(motion_threshold=DEFAULT_MOTION_THRESHOLD, max_skip=DEFAULT_MAX_SKIP):
+    """Sampling parameters as stored in extraction settings and cache keys"""
+    return {"motion_threshold": motion_threshold, "max_skip": max_skip}
+
+def frame_thumbnail(image_rgb):
+    """Small blurred grayscale copy of a frame for cheap differencing"""
+    gray = cv2.cvtColor(image_rgb, cv2.COLOR_RGB2GRAY)
+    thumbnail = cv2.resize(gray, THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+    return cv2.GaussianBlur(thumbnail, (3, 3), 0).astype(np.int16)
+
+def motion_score(thumbnail, reference):
+    """Mean absolute pixel difference (0-255) between two thumbnails"""
+    return float(np.mean(np.abs(thumbnail - reference)))
+
+class MotionSampler:
+    """Decide which decoded frames need pose inference.
+
+    should_infer() is called once per frame in order. The first frame is
+    always inferred; after that a frame is inferred when it differs enough
+    from the last inferred frame, or max_skip frames have been skipped.
+    """
+
+    def __init__(self, motion_threshold=DEFAULT_MOTION_THRESHOLD, max_skip=DEFAULT_MAX_SKIP):
+        self.motion_threshold = motion_threshold
+        self.max_skip = max_skip
+        self._reference = None
+        self._skipped = 0
+
+    def should_infer(self, image_rgb):
+        thumbnail = frame_thumbnail(image_rgb)
+        if (self._reference is None or self._skipped >= self.max_skip
+                or motion_score(thumbnail, self._reference) > self.motion_threshold):
+            self._reference = thumbnail
+            self._skipped = 0
+            return True
+        self._skipped += 1
+        return False
+
+def _interpolate_keypoints(before, after, weight):
+    after_by_id = {kp['id']: kp for kp in after}
+    keypoints = []
+    for kp in before:
+        other = after_by_id.get(kp['id'])
+        if other is None:
+            continue
+        blended = dict(kp)
+        for field in ('x', 'y', 'z', 'visibility'):
+            if kp.get(field) is not None and other.get(field) is not None:
+                blended[field] = kp[field] + (other[field] - kp[field]) * weight
+        keypoints.append(blended)
+    return keypoints
+
+def interpolate_frames(before, after, frame_numbers, fps):
+    """Build frame records for skipped frames between two inferred frames.
+
+    before/after are the inferred frame records on either side (either may
+    be None at the ends of a range). Keypoints are interpolated linearly
+    when both sides have a pose. Otherwise the frame before is repeated:
+    skipped frames were judged to look like it, not like the frame after.
+    """
+    frames = []
+    for frame_number in frame_numbers:
+        if before and after and before['pose_detected'] and after['pose_detected']:
+            span = after['frame_number'] - before['frame_number']
+            weight = (frame_number - before['frame_number']) / span
+            keypoints = _interpolate_keypoints(before['keypoints'], after['keypoints'], weight)
+        else:
+            source = before or after
+            keypoints = [dict(kp) for kp in source['keypoints']] if source else []
+        frames.append({
+            "frame_number": frame_number,
+            "timestamp": frame_number / fps,
+            "pose_detected": bool(keypoints),
+            "keypoints": keypoints,
+            "interpolated": True
+        })
+    return frames
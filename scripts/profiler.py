@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Per-stage profiling for the extraction and upload scripts
+
+Scripts call profiler.get() and record how long each stage took for every
+frame or batch, plus counters such as frames or rows processed. Profiling
+is off unless a script enables it (--profile PATH), in which case get()
+returns the active Profiler; otherwise it returns a no-op, so the hooks
+cost next to nothing in normal runs.
+
+The report is JSON: per-stage count, total, mean, p50/p95/max and a
+latency histogram in milliseconds, counters with their rate per second of
+wall time, peak RSS, and enough context (git commit, versions, argv) to
+compare runs across versions.
+
+Usage:
+    python extract_pose_data.py video.mp4 -o out.json --profile extract.prof.json
+    python upload_taegeuk_5.py --profile upload.prof.json
+    python profiler.py compare old.prof.json new.prof.json
+"""
+
+import argparse
+import json
+import platform
+import resource
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+REPORT_VERSION = 1
+# Histogram bucket upper bounds in milliseconds
+HISTOGRAM_BOUNDS_MS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500]
+
+def _peak_rss_mb(who=resource.RUSAGE_SELF):
+    peak = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def _git_commit():
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=Path(__file__).parent, timeout=5)
+        return result.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def summarize_samples(samples):
+    """count/total/mean/p50/p95/max (ms) and a histogram for a list of durations in seconds"""
+    values = np.asarray(samples, dtype=np.float64) * 1000
+    bounds = HISTOGRAM_BOUNDS_MS + [float('inf')]
+    counts = np.histogram(values, bins=[0] + bounds)[0] if len(values) else [0] * len(bounds)
+    histogram = {(f"<={bound:g}ms" if bound != float('inf') else f">{HISTOGRAM_BOUNDS_MS[-1]:g}ms"): int(count)
+                 for bound, count in zip(bounds, counts) if count}
+    if not len(values):
+        return {"count": 0, "total_seconds": 0.0, "histogram": histogram}
+    return {
+        "count": int(len(values)),
+        "total_seconds": float(values.sum() / 1000),
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "max_ms": float(values.max()),
+        "histogram": histogram
+    }
+
+class Profiler:
+    """Collect per-stage durations and counters for one run (thread-safe)"""
+
+    enabled = True
+
+    def __init__(self, name, output_path=None, metadata=None):
+        self.name = name
+        self.output_path = output_path
+        self.metadata = dict(metadata or {})
+        self.samples = defaultdict(list)
+        self.counters = defaultdict(int)
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+
+    def record(self, stage, seconds):
+        """Add one duration (seconds) for a stage"""
+        self.samples[stage].append(seconds)
+
+    @contextmanager
+    def stage(self, stage):
+        """Time the body of a with block as one sample of stage"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples[stage].append(time.perf_counter() - started)
+
+    def count(self, counter, amount=1):
+        """Add to a counter such as frames or rows"""
+        with self._lock:
+            self.counters[counter] += amount
+
+    def snapshot(self):
+        """Raw samples and counters, e.g. to send back from a worker process"""
+        return {"samples": dict(self.samples), "counters": dict(self.counters)}
+
+    def merge(self, snapshot):
+        """Add a snapshot() from another profiler (e.g. a worker process)"""
+        with self._lock:
+            for stage, samples in snapshot["samples"].items():
+                self.samples[stage].extend(samples)
+            for counter, amount in snapshot["counters"].items():
+                self.counters[counter] += amount
+
+    def report(self):
+        wall_seconds = time.perf_counter() - self._started
+        return {
+            "report_version": REPORT_VERSION,
+            "name": self.name,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "argv": sys.argv,
+            "metadata": self.metadata,
+            "wall_seconds": wall_seconds,
+            "peak_rss_mb": _peak_rss_mb(),
+            "peak_rss_children_mb": _peak_rss_mb(resource.RUSAGE_CHILDREN),
+            "counters": {
+                counter: {"count": amount, "per_second": amount / wall_seconds if wall_seconds else 0.0}
+                for counter, amount in self.counters.items()
+            },
+            "stages": {stage: summarize_samples(samples) for stage, samples in self.samples.items()}
+        }
+
+    def write(self, path=None):
+        """Write the report as JSON and print a short summary"""
+        path = path or self.output_path
+        report = self.report()
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print_report(report)
+        print(f"📄 Profile written to {path}")
+        return report
+
+class _NullProfiler:
+    """Stand-in returned by get() when profiling is off"""
+
+    enabled = False
+
+    def record(self, stage, seconds):
+        pass
+
+    @contextmanager
+    def stage(self, stage):
+        yield
+
+    def count(self, counter, amount=1):
+        pass
+
+_NULL_PROFILER = _NullProfiler()
+_active = None
+
+def enable(name, output_path=None, metadata=None):
+    """Start profiling this process; get() returns the new profiler until disable()"""
+    global _active
+    _active = Profiler(name, output_path, metadata)
+    return _active
+
+def disable():
+    global _active
+    _active = None
+
+def get():
+    """The active profiler, or a no-op one when profiling is off"""
+    return _active or _NULL_PROFILER
+
+def finish():
+    """Write the active profiler's report if it has an output path, then stop profiling"""
+    profiler = _active
+    disable()
+    if profiler and profiler.output_path:
+        return profiler.write()
+    return None
+
+def enable_from_args(name, argv=None, metadata=None):
+    """Enable profiling if --profile PATH is on the command line.
+
+    For scripts without their own argument parser; other arguments are
+    left alone.
+    """
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--profile')
+    args, _ = parser.parse_known_args(sys.argv[1:] if argv is None else argv)
+    if args.profile:
+        return enable(name, args.profile, metadata)
+    return None
+
+def print_report(report):
+    print(f"⏱️  Profile for {report['name']}: {report['wall_seconds']:.2f}s wall, "
+          f"peak RSS {report['peak_rss_mb']:.0f}MB")
+    for counter, values in report["counters"].items():
+        print(f"   - {counter}: {values['count']} ({values['per_second']:.1f}/s)")
+    for stage, summary in sorted(report["stages"].items(), key=lambda item: -item[1]["total_seconds"]):
+        if summary["count"]:
+            print(f"   - {stage}: {summary['total_seconds']:.2f}s total, n={summary['count']}, "
+                  f"p50 {summary['p50_ms']:.2f}ms, p95 {summary['p95_ms']:.2f}ms, max {summary['max_ms']:.2f}ms")
+
+def compare_reports(old, new):
+    """Print per-stage p50/p95 and counter rate changes between two reports"""
+    print(f"Comparing {old.get('git_commit') or '?'} → {new.get('git_commit') or '?'}")
+    print(f"   wall: {old['wall_seconds']:.2f}s → {new['wall_seconds']:.2f}s, "
+          f"peak RSS: {old['peak_rss_mb']:.0f}MB → {new['peak_rss_mb']:.0f}MB")
+    for counter in sorted(set(old["counters"]) | set(new["counters"])):
+        before = old["counters"].get(counter, {}).get("per_second", 0.0)
+        after = new["counters"].get(counter, {}).get("per_second", 0.0)
+        print(f"   {counter}/s: {before:.1f} → {after:.1f}")
+    for stage in sorted(set(old["stages"]) | set(new["stages"])):
+        before = old["stages"].get(stage, {})
+        after = new["stages"].get(stage, {})
+        if "p50_ms" not in before or "p50_ms" not in after:
+            print(f"   {stage}: only in {'old' if 'p50_ms' in before else 'new'} report")
+            continue
+        for key in ("p50_ms", "p95_ms"):
+            change = (after[key] - before[key]) / before[key] * 100 if before[key] else 0.0
+            print(f"   {stage} {key[:3]}: {before[key]:.2f}ms → {after[key]:.2f}ms ({change:+.1f}%)")
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect and compare profile reports')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    show_parser = subparsers.add_parser('show', help='Summarize a profile report')
+    show_parser.add_argument('report')
+    compare_parser = subparsers.add_parser('compare', help='Compare two profile reports')
+    compare_parser.add_argument('old')
+    compare_parser.add_argument('new')
+
+    args = parser.parse_args()
+
+    if args.command == 'show':
+        with open(args.report) as f:
+            print_report(json.load(f))
+    else:
+        with open(args.old) as f:
+            old = json.load(f)
+        with open(args.new) as f:
+            new = json.load(f)
+        compare_reports(old, new)
+
+if __name__ == "__main__":
+    sys.exit(main())
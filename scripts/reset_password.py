@@ -1,21 +1,7 @@
 #!/usr/bin/env python3
-import psycopg2
-import os
 import hashlib
 import secrets
-from pathlib import Path
-
-def get_db_connection():
-    database_url = os.environ.get('DATABASE_URL')
-    if not database_url:
-        env_file = Path(__file__).parent.parent / '.env'
-        if env_file.exists():
-            with open(env_file) as f:
-                for line in f:
-                    if line.startswith('DATABASE_URL='):
-                        database_url = line.strip().split('=', 1)[1].strip('"\'')
-                        break
-    return psycopg2.connect(database_url)
+import db
 
 def simple_hash_password(password: str) -> str:
     """Create a simple hash - just for testing purposes"""
@@ -28,7 +14,7 @@ def main():
     new_password = "test123"  # Simple password for testing
     username = "ojaskandy"
     
-    conn = get_db_connection()
+    conn = db.connect()
     cursor = conn.cursor()
     
     # Hash the new password
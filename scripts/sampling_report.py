@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Error-vs-speed report for motion-adaptive sampling
+
+Runs a full extraction of each video, then adaptive extractions at a range
+of motion thresholds, and reports for each threshold how many frames still
+went through inference, the wall-clock speedup, and the keypoint error of
+the adaptive output against the full extraction (in pixels, over keypoints
+the full extraction saw with visibility >= 0.5).
+
+Usage:
+    python sampling_report.py                      # every form video under client/public/videos
+    python sampling_report.py video.mp4 --thresholds 1 2 4 --json report.json
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from extract_pose_data import extract_frame_range, get_video_info, new_pipeline_stats
+from pose_sampling import DEFAULT_MAX_SKIP, sampling_settings
+
+DEFAULT_THRESHOLDS = [0.5, 1.0, 2.0, 4.0, 8.0]
+VIDEOS_DIR = Path(__file__).parent.parent / "client/public/videos"
+MIN_VISIBILITY = 0.5
+
+def _frame_size(video_path):
+    cap = cv2.VideoCapture(str(video_path))
+    size = (cap.get(cv2.CAP_PROP_FRAME_WIDTH), cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    cap.release()
+    return size
+
+def _timed_extraction(video_path, fps, sampling=None):
+    stats = new_pipeline_stats()
+    started = time.perf_counter()
+    frames = extract_frame_range(str(video_path), 0, None, fps, stats=stats, sampling=sampling)
+    return frames, time.perf_counter() - started, stats
+
+def compare_frames(reference, frames, width, height):
+    """Per-frame mean keypoint error in pixels plus detection mismatches"""
+    errors = []
+    interpolated_errors = []
+    mismatched = 0
+    for expected, actual in zip(reference, frames):
+        if expected['pose_detected'] != actual['pose_detected']:
+            mismatched += 1
+            continue
+        if not expected['pose_detected']:
+            continue
+
+        actual_by_id = {kp['id']: kp for kp in actual['keypoints']}
+        distances = []
+        for kp in expected['keypoints']:
+            other = actual_by_id.get(kp['id'])
+            if other is None or (kp['visibility'] or 0) < MIN_VISIBILITY:
+                continue
+            distances.append(np.hypot((kp['x'] - other['x']) * width, (kp['y'] - other['y']) * height))
+        if distances:
+            error = float(np.mean(distances))
+            errors.append(error)
+            if actual.get('interpolated'):
+                interpolated_errors.append(error)
+
+    def summary(values):
+        if not values:
+            return {"mean": 0.0, "p95": 0.0, "max": 0.0}
+        return {"mean": float(np.mean(values)), "p95": float(np.percentile(values, 95)),
+                "max": float(np.max(values))}
+
+    return {"all_frames": summary(errors), "interpolated_frames": summary(interpolated_errors),
+            "detection_mismatches": mismatched}
+
+def report_video(video_path, thresholds, max_skip):
+    video_info = get_video_info(str(video_path))
+    width, height = _frame_size(video_path)
+    print(f"🎬 {video_path.name}: {video_info['total_frames']} frames at {video_info['fps']:.1f} fps")
+
+    reference, full_seconds, _ = _timed_extraction(video_path, video_info["fps"])
+    print(f"   Full extraction: {full_seconds:.1f}s")
+
+    runs = []
+    for threshold in thresholds:
+        sampling = sampling_settings(threshold, max_skip)
+        frames, seconds, stats = _timed_extraction(video_path, video_info["fps"], sampling)
+        inferred = stats["inference"]["frames"] - stats["inference"]["skipped"]
+        run = {
+            "motion_threshold": threshold,
+            "max_skip": max_skip,
+            "inferred_frames": inferred,
+            "inferred_fraction": inferred / max(1, len(frames)),
+            "seconds": seconds,
+            "speedup": full_seconds / seconds if seconds else 0.0,
+            **compare_frames(reference, frames, width, height)
+        }
+        runs.append(run)
+        print(f"   threshold {threshold:>5}: inferred {run['inferred_fraction'] * 100:5.1f}%  "
+              f"speedup {run['speedup']:4.2f}x  error mean {run['all_frames']['mean']:5.2f}px  "
+              f"p95 {run['all_frames']['p95']:5.2f}px  "
+              f"interpolated p95 {run['interpolated_frames']['p95']:5.2f}px  "
+              f"mismatches {run['detection_mismatches']}")
+
+    return {
+        "video": video_path.name,
+        "frames": len(reference),
+        "width": width,
+        "height": height,
+        "full_seconds": full_seconds,
+        "runs": runs
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare adaptive sampling against full extraction')
+    parser.add_argument('videos', nargs='*', help=f'Videos to test (default: every .mp4 under {VIDEOS_DIR})')
+    parser.add_argument('--thresholds', type=float, nargs='+', default=DEFAULT_THRESHOLDS,
+                        help=f'Motion thresholds to try (default: {DEFAULT_THRESHOLDS})')
+    parser.add_argument('--max-skip', type=int, default=DEFAULT_MAX_SKIP,
+                        help=f'Most consecutive frames to skip (default: {DEFAULT_MAX_SKIP})')
+    parser.add_argument('--json', help='Also write the report to this JSON file')
+
+    args = parser.parse_args()
+
+    videos = [Path(video) for video in args.videos] or sorted(VIDEOS_DIR.glob('**/*.mp4'))
+    if not videos:
+        print(f"❌ No videos given and none found under {VIDEOS_DIR}")
+        return 1
+
+    report = [report_video(video, args.thresholds, args.max_skip) for video in videos]
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"📄 Report written to {args.json}")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -14,30 +14,70 @@ CREATE TABLE martial_arts_videos (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
--- Pre-extracted pose sequences
+-- Pre-extracted pose sequences, list-partitioned by video_id with one
+-- partition per video (pose_sequences_v<id>), created by the loaders; see
+-- scripts/pose_partitions.py, which also migrates unpartitioned tables
 CREATE TABLE pose_sequences (
-    id SERIAL PRIMARY KEY,
-    video_id INTEGER REFERENCES martial_arts_videos(id) ON DELETE CASCADE,
+    id SERIAL,
+    video_id INTEGER NOT NULL REFERENCES martial_arts_videos(id) ON DELETE CASCADE,
     frame_number INTEGER NOT NULL,
     timestamp_seconds DECIMAL(8,3) NOT NULL,
     pose_detected BOOLEAN NOT NULL DEFAULT FALSE,
     fps DECIMAL(8,2),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (video_id, id),
     UNIQUE(video_id, frame_number)
-);
+) PARTITION BY LIST (video_id);
 
--- Individual keypoints for each frame
+-- Individual keypoints for each frame, partitioned like pose_sequences
+-- (pose_keypoints_v<id>); join to sequences on (video_id, sequence_id)
 CREATE TABLE pose_keypoints (
-    id SERIAL PRIMARY KEY,
-    sequence_id INTEGER REFERENCES pose_sequences(id) ON DELETE CASCADE,
+    id SERIAL,
+    video_id INTEGER NOT NULL REFERENCES martial_arts_videos(id) ON DELETE CASCADE,
+    sequence_id INTEGER NOT NULL,
     keypoint_id INTEGER NOT NULL,
     keypoint_name VARCHAR(50) NOT NULL,
     x DECIMAL(10,8) NOT NULL,
     y DECIMAL(10,8) NOT NULL,
     z DECIMAL(10,8),
     visibility DECIMAL(6,4),
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (video_id, id)
+) PARTITION BY LIST (video_id);
+
+-- Alternative packed layout: about a second of frames per row, with frame
+-- numbers, timestamps, flags and float32 keypoints packed little-endian into
+-- bytea (see scripts/pose_chunks.py)
+CREATE TABLE pose_frame_chunks (
+    video_id INTEGER NOT NULL REFERENCES martial_arts_videos(id) ON DELETE CASCADE,
+    chunk_start DOUBLE PRECISION NOT NULL,
+    chunk_end DOUBLE PRECISION NOT NULL,
+    frame_count INTEGER NOT NULL,
+    fps DECIMAL(8,2),
+    frame_numbers BYTEA NOT NULL,
+    timestamps BYTEA NOT NULL,
+    flags BYTEA NOT NULL,
+    keypoints BYTEA NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (video_id, chunk_start)
+);
+ALTER TABLE pose_frame_chunks ALTER COLUMN keypoints SET STORAGE EXTERNAL;
+
+-- Each frame's keypoints as the JSON the pose API returns, rebuilt by the
+-- loaders for the frames they change (see scripts/pose_frame_json.py)
+CREATE TABLE pose_frame_json (
+    video_id INTEGER NOT NULL REFERENCES martial_arts_videos(id) ON DELETE CASCADE,
+    sequence_id INTEGER NOT NULL,
+    frame_number INTEGER NOT NULL,
+    timestamp_seconds DECIMAL(8,3) NOT NULL,
+    pose_detected BOOLEAN NOT NULL,
+    fps DECIMAL(8,2),
+    frame_hash BIGINT,
+    keypoints JSON NOT NULL,
+    refreshed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (video_id, sequence_id)
 );
+CREATE INDEX pose_frame_json_timestamp_idx ON pose_frame_json (video_id, timestamp_seconds);
 
 -- Shifu AI Coach data table
 CREATE TABLE shifu_data (
@@ -69,7 +109,7 @@ CREATE TABLE shifu_logs (
 
 -- Indexes for performance
 CREATE INDEX idx_pose_sequences_video_timestamp ON pose_sequences(video_id, timestamp_seconds);
-CREATE INDEX idx_pose_keypoints_sequence ON pose_keypoints(sequence_id);
+CREATE INDEX idx_pose_keypoints_sequence ON pose_keypoints(video_id, sequence_id);
 CREATE INDEX idx_pose_keypoints_name ON pose_keypoints(keypoint_name);
 CREATE INDEX idx_shifu_data_user ON shifu_data(user_id);
 CREATE INDEX idx_shifu_logs_user_date ON shifu_logs(user_id, date);
@@ -2,6 +2,27 @@ const express = require('express');
 const router = express.Router();
 const db = require('../config/database');
 
+// pose_keypoints only has video_id once partitioned (scripts/pose_partitions.py
+// migrate); joining on it as well prunes the join to the video's partition.
+// Checked once, so a database migrated while the server runs keeps the plain
+// join, which is still correct, until the next restart.
+let keypointsVideoColumn;
+function keypointsSameVideo() {
+  if (!keypointsVideoColumn) {
+    keypointsVideoColumn = db.query(`
+      SELECT 1 FROM information_schema.columns
+      WHERE table_schema = current_schema() AND table_name = 'pose_keypoints' AND column_name = 'video_id'
+    `).then(
+      result => (result.rows.length > 0 ? 'pk.video_id = ps.video_id AND' : ''),
+      error => {
+        keypointsVideoColumn = undefined;
+        throw error;
+      }
+    );
+  }
+  return keypointsVideoColumn;
+}
+
 // Get all available martial arts videos
 router.get('/videos', async (req, res) => {
   try {
@@ -45,6 +66,7 @@ router.get('/videos/:videoId/poses', async (req, res) => {
     const { videoId } = req.params;
     const { startTime = 0, endTime, limit = 1000 } = req.query;
     
+    const sameVideo = await keypointsSameVideo();
     let query = `
       SELECT 
         ps.frame_number,
@@ -62,7 +84,7 @@ router.get('/videos/:videoId/poses', async (req, res) => {
           ) ORDER BY pk.keypoint_id
         ) as keypoints
       FROM pose_sequences ps
-      LEFT JOIN pose_keypoints pk ON ps.id = pk.sequence_id
+      LEFT JOIN pose_keypoints pk ON ${sameVideo} pk.sequence_id = ps.id
       WHERE ps.video_id = $1 AND ps.timestamp_seconds >= $2
     `;
     
@@ -110,6 +132,7 @@ router.get('/videos/:videoId/poses/at/:timestamp', async (req, res) => {
     const { videoId, timestamp } = req.params;
     const tolerance = parseFloat(req.query.tolerance) || 0.1; // 100ms tolerance
     
+    const sameVideo = await keypointsSameVideo();
     const query = `
       SELECT 
         ps.frame_number,
@@ -126,7 +149,7 @@ router.get('/videos/:videoId/poses/at/:timestamp', async (req, res) => {
           ) ORDER BY pk.keypoint_id
         ) as keypoints
       FROM pose_sequences ps
-      LEFT JOIN pose_keypoints pk ON ps.id = pk.sequence_id
+      LEFT JOIN pose_keypoints pk ON ${sameVideo} pk.sequence_id = ps.id
       WHERE ps.video_id = $1 
         AND ABS(ps.timestamp_seconds - $2) <= $3
         AND ps.pose_detected = true